@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+自适应分段
+根据实测的识别耗时和队列积压在运行时调整片段长度和静音阈值:
+CPU空闲时用短片段换低延迟，负载高时用长片段摊薄每次调用的固定开销
+"""
+
+import threading
+import time
+from collections import deque, namedtuple
+
+# 一次调整: 新旧参数、触发原因和当时的测量值
+Decision = namedtuple(
+    "Decision",
+    "time reason min_duration max_duration silence_frames utilization latency backlog",
+)
+
+
+class SegmentController:
+    """按目标实时率（识别耗时/音频时长，已除以并发数）和延迟预算调整分段参数"""
+
+    def __init__(
+        self,
+        min_duration=1.0,
+        max_duration=3.0,
+        silence_frames=10,
+        workers=2,
+        target_rtf=0.7,
+        latency_budget=5.0,
+        max_duration_range=(2.0, 12.0),
+        min_duration_range=(0.5, 3.0),
+        silence_range=(6, 30),
+        step=1.25,
+        smoothing=0.3,
+        min_samples=3,
+        cooldown=5.0,
+    ):
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.silence_frames = silence_frames
+        self.workers = max(1, workers)
+        self.target_rtf = target_rtf
+        self.latency_budget = latency_budget
+        self.max_duration_range = max_duration_range
+        self.min_duration_range = min_duration_range
+        self.silence_range = silence_range
+        self.step = step
+        self.smoothing = smoothing
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+
+        # 指数滑动平均
+        self.avg_processing = None
+        self.avg_duration = None
+        self.backlog = 0
+        self._samples = 0  # 上次调整后的样本数
+        self._last_change = 0.0
+        self._lock = threading.Lock()
+
+        self.decisions = deque(maxlen=100)
+
+    def _ewma(self, average, value):
+        if average is None:
+            return value
+        return average + self.smoothing * (value - average)
+
+    def utilization(self):
+        """识别所需时间占实时的比例（所有工作线程平均），>1 表示跟不上"""
+        if not self.avg_duration:
+            return 0.0
+        return self.avg_processing / (self.avg_duration * self.workers)
+
+    def expected_latency(self):
+        """最长片段的预计字幕延迟: 片段时长 + 排队 + 识别"""
+        processing = self.avg_processing or 0.0
+        return self.max_duration + processing * (1 + self.backlog / self.workers)
+
+    def observe(self, duration, processing_time, backlog=0):
+        """记录一个片段的识别结果；需要调整时返回 Decision，否则返回None"""
+        with self._lock:
+            self.avg_duration = self._ewma(self.avg_duration, duration)
+            self.avg_processing = self._ewma(self.avg_processing, processing_time)
+            self.backlog = backlog
+            self._samples += 1
+
+            now = time.monotonic()
+            if (
+                self._samples < self.min_samples
+                or now - self._last_change < self.cooldown
+            ):
+                return None
+
+            utilization = self.utilization()
+            latency = self.expected_latency()
+            if utilization > self.target_rtf or backlog > self.workers:
+                reason = "grow"  # 跟不上: 加长片段，减少调用次数
+                changed = self._scale(self.step)
+            elif latency > self.latency_budget and utilization < self.target_rtf / 2:
+                reason = "shrink"  # 有余量但延迟超预算: 缩短片段
+                changed = self._scale(1 / self.step)
+            else:
+                return None
+            if not changed:
+                return None
+
+            self._samples = 0
+            self._last_change = now
+            decision = Decision(
+                time.time(),
+                reason,
+                self.min_duration,
+                self.max_duration,
+                self.silence_frames,
+                utilization,
+                latency,
+                backlog,
+            )
+            self.decisions.append(decision)
+            return decision
+
+    def _scale(self, factor):
+        """按比例调整三个参数并限制在范围内，返回是否有变化"""
+        before = (self.min_duration, self.max_duration, self.silence_frames)
+        self.max_duration = round(
+            clamp(self.max_duration * factor, *self.max_duration_range), 2
+        )
+        self.min_duration = round(
+            clamp(
+                self.min_duration * factor,
+                self.min_duration_range[0],
+                min(self.min_duration_range[1], self.max_duration / 2),
+            ),
+            2,
+        )
+        self.silence_frames = int(
+            clamp(round(self.silence_frames * factor), *self.silence_range)
+        )
+        return before != (self.min_duration, self.max_duration, self.silence_frames)
+
+    def stats(self):
+        return {
+            "min_duration": self.min_duration,
+            "max_duration": self.max_duration,
+            "silence_frames": self.silence_frames,
+            "utilization": self.utilization(),
+            "expected_latency": self.expected_latency(),
+            "decisions": len(self.decisions),
+        }
+
+
+def clamp(value, low, high):
+    return max(low, min(high, value))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+识别后端接口
+流水线通过同一个接口调用各种识别后端: 常驻的whisper-server、每个片段启动一次的whisper-cli
+（见 whisper_worker.py），以及在本进程中运行的transformers模型（见 transformers_backend.py）。
+识别结果统一使用whisper-server的JSON格式:
+
+    {
+        "text": 全文,
+        "segments": [{"start": 秒, "end": 秒, "text": 文本}],  # timestamps=True 时
+        "detected_language": 语种识别的语言,  # 做了语种识别时
+        "detected_language_probability": 置信度,  # 没有时为None
+        "timings": {"load": 秒, "total": 秒, "wait": 秒},  # 可选，后端报告的耗时
+    }
+"""
+
+import io
+import wave
+
+import numpy as np
+
+from audio_utils import PIPELINE_SAMPLE_RATE, pcm_to_wav_bytes
+
+
+class AsrBackend:
+    """识别后端基类"""
+
+    name = "asr"
+    # 为True时 transcribe_pcm 直接接收16kHz int16数组，不需要先封装成WAV
+    accepts_pcm = False
+    # 为True时 transcribe_batch 在一次前向计算中识别多个片段，否则只是逐个识别
+    batched = False
+    startup_time = None  # 模型加载耗时（常驻的后端）
+
+    def start(self):
+        """加载模型或启动进程；返回自身"""
+        return self
+
+    def stop(self):
+        pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def transcribe_wav(self, wav_bytes, language="auto", timestamps=False):
+        """识别一段WAV数据，返回结果字典"""
+        raise NotImplementedError
+
+    def transcribe_pcm(self, audio, language="auto", timestamps=False):
+        """识别一段16kHz int16音频"""
+        return self.transcribe_wav(
+            pcm_to_wav_bytes(audio, PIPELINE_SAMPLE_RATE), language, timestamps
+        )
+
+    def transcribe_batch(self, audios, language="auto", timestamps=False):
+        """识别几段16kHz int16音频，按顺序返回各自的结果字典"""
+        return [self.transcribe_pcm(audio, language, timestamps) for audio in audios]
+
+    def stats(self):
+        return {}
+
+
+def wav_to_pcm(wav_bytes):
+    """WAV字节 → (int16单声道数组, 采样率)；多声道时取平均"""
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wav_file:
+        channels = wav_file.getnchannels()
+        if wav_file.getsampwidth() != 2:
+            raise ValueError("只支持16位WAV")
+        audio = np.frombuffer(
+            wav_file.readframes(wav_file.getnframes()), dtype=np.int16
+        )
+        sample_rate = wav_file.getframerate()
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return audio, sample_rate
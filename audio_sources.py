@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+采集源
+统一的音频输入接口: 声卡设备、音频文件、标准输入和合成信号，
+都按固定块长产生float32单声道样本，流水线不再依赖BlackHole设备。
+多声道设备可以按声道拆成多个采集源，每路各自识别
+"""
+
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+
+from capture_ring import CaptureRing
+
+
+class CaptureSource:
+    """采集源基类"""
+
+    # realtime 为True表示数据按真实时间到达（例如声卡），否则可以全速读取
+    realtime = False
+
+    def __init__(self, sample_rate, name):
+        self.sample_rate = int(sample_rate)
+        self.name = name
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def blocks(self, block_size):
+        """按块产生float32单声道数组；返回的数组可能被复用，调用方需在下一块之前用完"""
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class DeviceSource(CaptureSource):
+    """sounddevice输入设备，回调写入无锁环形缓冲区"""
+
+    realtime = True
+
+    def __init__(
+        self, device, sample_rate, block_size=0, buffer_seconds=10.0, name=None
+    ):
+        super().__init__(sample_rate, name or f"device:{device}")
+        self.device = device
+        self.block_size = block_size
+        self.ring = CaptureRing(int(self.sample_rate * buffer_seconds), sample_rate)
+        self.stream = None
+
+    def _callback(self, indata, frames, time, status):
+        """音频回调函数：只把样本复制进预分配的环形缓冲区，不加锁、不打印"""
+        self.ring.write(indata[:, 0], status)
+
+    def open(self):
+        import sounddevice as sd
+
+        self.stream = sd.InputStream(
+            device=self.device,
+            samplerate=self.sample_rate,
+            channels=1,
+            dtype=np.float32,
+            blocksize=self.block_size,
+            callback=self._callback,
+        )
+        self.stream.start()
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    def blocks(self, block_size):
+        block = np.zeros(block_size, dtype=np.float32)
+        while True:
+            if self.ring.wait_read_into(block):
+                yield block
+
+    def stats(self):
+        return self.ring.stats()
+
+
+class MultiChannelDevice:
+    """一个多声道输入流，回调把每个声道写入各自的环形缓冲区
+
+    channels 为要采集的声道号（从1开始）；sources() 返回每个声道的采集源，
+    所有声道源都关闭后才停止输入流
+    """
+
+    def __init__(
+        self, device, sample_rate, channels, block_size=0, buffer_seconds=10.0
+    ):
+        self.device = device
+        self.sample_rate = int(sample_rate)
+        self.channels = list(channels)
+        self.block_size = block_size
+        self.rings = [
+            CaptureRing(int(self.sample_rate * buffer_seconds), sample_rate)
+            for _ in self.channels
+        ]
+        self._columns = [channel - 1 for channel in self.channels]
+        self.stream = None
+        self._users = 0
+        self._lock = threading.Lock()
+
+    def _callback(self, indata, frames, time, status):
+        for ring, column in zip(self.rings, self._columns):
+            ring.write(indata[:, column], status)
+
+    def acquire(self):
+        import sounddevice as sd
+
+        with self._lock:
+            if self._users == 0:
+                self.stream = sd.InputStream(
+                    device=self.device,
+                    samplerate=self.sample_rate,
+                    channels=max(self.channels),
+                    dtype=np.float32,
+                    blocksize=self.block_size,
+                    callback=self._callback,
+                )
+                self.stream.start()
+            self._users += 1
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            if self._users == 0 and self.stream is not None:
+                self.stream.stop()
+                self.stream.close()
+                self.stream = None
+
+    def sources(self, name=None):
+        name = name or f"device:{self.device}"
+        return [
+            ChannelSource(self, index, f"{name}#{channel}")
+            for index, channel in enumerate(self.channels)
+        ]
+
+
+class ChannelSource(CaptureSource):
+    """多声道设备中的一个声道"""
+
+    realtime = True
+
+    def __init__(self, device, index, name):
+        super().__init__(device.sample_rate, name)
+        self.device = device
+        self.ring = device.rings[index]
+
+    def open(self):
+        self.device.acquire()
+
+    def close(self):
+        self.device.release()
+
+    def blocks(self, block_size):
+        block = np.zeros(block_size, dtype=np.float32)
+        while True:
+            if self.ring.wait_read_into(block):
+                yield block
+
+    def stats(self):
+        return self.ring.stats()
+
+
+class FileSource(CaptureSource):
+    """音频文件: WAV直接读取，其他格式通过ffmpeg解码
+
+    channel 指定只读WAV的某个声道（从1开始），默认把所有声道混为单声道
+    """
+
+    def __init__(self, path, realtime=False, decode_rate=16000, channel=None):
+        self.path = path
+        self.realtime = realtime
+        self.channel = channel
+        self._wav = None
+        self._process = None
+        self._channels = 1
+        self._sample_width = 2
+
+        if path.lower().endswith(".wav"):
+            with wave.open(path, "rb") as wav_file:
+                sample_rate = wav_file.getframerate()
+                self.duration = wav_file.getnframes() / sample_rate
+        else:
+            if channel is not None:
+                raise RuntimeError(f"按声道读取只支持WAV文件: {path}")
+            if not shutil.which("ffmpeg"):
+                raise RuntimeError(f"读取 {path} 需要ffmpeg，或先转换为WAV")
+            sample_rate = decode_rate
+            self.duration = None
+        name = f"file:{path}" if channel is None else f"file:{path}#{channel}"
+        super().__init__(sample_rate, name)
+
+    def open(self):
+        if self.path.lower().endswith(".wav"):
+            self._wav = wave.open(self.path, "rb")
+            self._channels = self._wav.getnchannels()
+            self._sample_width = self._wav.getsampwidth()
+            if self.channel is not None and self.channel > self._channels:
+                raise RuntimeError(f"{self.path} 只有 {self._channels} 个声道")
+        else:
+            self._process = subprocess.Popen(
+                [
+                    "ffmpeg",
+                    "-nostdin",
+                    "-loglevel",
+                    "error",
+                    "-i",
+                    self.path,
+                    "-f",
+                    "s16le",
+                    "-ac",
+                    "1",
+                    "-ar",
+                    str(self.sample_rate),
+                    "-",
+                ],
+                stdout=subprocess.PIPE,
+            )
+
+    def close(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+
+    def _read(self, block_size):
+        if self._wav is not None:
+            return self._wav.readframes(block_size)
+        return self._process.stdout.read(block_size * 2)
+
+    def blocks(self, block_size):
+        started = time.monotonic()
+        produced = 0
+        while True:
+            data = self._read(block_size)
+            if not data:
+                return
+            block = pcm_to_float(data, self._sample_width, self._channels, self.channel)
+            produced += len(block)
+            if self.realtime:
+                # 模拟实时输入: 按音频时长节流
+                delay = started + produced / self.sample_rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            yield block
+
+
+class StdinSource(CaptureSource):
+    """标准输入的原始PCM（s16le单声道）"""
+
+    def __init__(self, sample_rate=16000, stream=None):
+        super().__init__(sample_rate, "stdin")
+        self.stream = stream or sys.stdin.buffer
+
+    def blocks(self, block_size):
+        while True:
+            data = self.stream.read(block_size * 2)
+            if not data:
+                return
+            if len(data) % 2:
+                data = data[:-1]
+            yield pcm_to_float(data, 2, 1)
+
+
+class SyntheticSource(CaptureSource):
+    """合成的类语音信号: 语音段与静音段交替，便于在没有声卡的机器上测试"""
+
+    def __init__(
+        self,
+        duration=60.0,
+        sample_rate=16000,
+        speech_seconds=(1.0, 4.0),
+        silence_seconds=(0.3, 1.5),
+        seed=0,
+        realtime=False,
+        name="synthetic",
+    ):
+        super().__init__(sample_rate, name)
+        self.duration = duration
+        self.speech_seconds = speech_seconds
+        self.silence_seconds = silence_seconds
+        self.seed = seed
+        self.realtime = realtime
+        self._audio = None
+
+    def generate(self):
+        """生成完整信号，同时返回各语音段的 (起点, 终点) 样本位置"""
+        rng = np.random.default_rng(self.seed)
+        total = int(self.duration * self.sample_rate)
+        audio = np.zeros(total, dtype=np.float32)
+        spans = []
+        position = int(rng.uniform(*self.silence_seconds) * self.sample_rate)
+        while position < total:
+            length = int(rng.uniform(*self.speech_seconds) * self.sample_rate)
+            end = min(total, position + length)
+            audio[position:end] = synth_speech(
+                (end - position) / self.sample_rate,
+                self.sample_rate,
+                seed=int(rng.integers(1 << 30)),
+            )[: end - position]
+            spans.append((position, end))
+            position = end + int(rng.uniform(*self.silence_seconds) * self.sample_rate)
+        audio += rng.normal(0, 0.001, total).astype(np.float32)
+        return audio, spans
+
+    def open(self):
+        if self._audio is None:
+            self._audio, self.speech_spans = self.generate()
+
+    def blocks(self, block_size):
+        started = time.monotonic()
+        for i in range(0, len(self._audio), block_size):
+            if self.realtime:
+                delay = started + i / self.sample_rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            yield self._audio[i : i + block_size]
+
+
+def synth_speech(duration, sample_rate=16000, seed=0):
+    """生成类语音信号：带颤音的谐波，按约4Hz的音节包络调制"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(round(duration * sample_rate))) / sample_rate
+    f0 = 120 + 30 * np.sin(2 * np.pi * 0.7 * t + rng.uniform(0, np.pi))
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t + rng.uniform(0, np.pi)), 0, None)
+    noise = rng.normal(0, 0.02, len(t))
+    return (0.3 * voiced * envelope + noise).astype(np.float32)
+
+
+def pcm_to_float(data, sample_width, channels, channel=None):
+    """把PCM字节转换为float32单声道（多声道取平均，或只取 channel 声道，从1开始）"""
+    if sample_width == 2:
+        audio = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768
+    elif sample_width == 4:
+        audio = np.frombuffer(data, dtype=np.int32).astype(np.float32) / 2147483648
+    elif sample_width == 1:
+        audio = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+    else:
+        raise ValueError(f"不支持的采样位宽: {sample_width * 8} bit")
+    if channels > 1:
+        audio = audio[: len(audio) // channels * channels]
+        audio = audio.reshape(-1, channels)
+        if channel is not None:
+            return np.ascontiguousarray(audio[:, channel - 1])
+        audio = audio.mean(axis=1)
+    return audio
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+音频格式工具
+在内存中完成重采样、PCM转换和WAV封装，片段不再经过临时文件
+"""
+
+import math
+import struct
+
+import numpy as np
+
+
+def float_to_int16(audio):
+    """float32 [-1, 1] 转换为 int16，超出范围的样本先截断"""
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def wav_header(num_samples, sample_rate, channels=1):
+    """生成16位PCM WAV文件头"""
+    data_size = num_samples * channels * 2
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + data_size,
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,  # PCM
+        channels,
+        sample_rate,
+        sample_rate * channels * 2,
+        channels * 2,
+        16,
+        b"data",
+        data_size,
+    )
+
+
+def pcm_to_wav_bytes(pcm_int16, sample_rate):
+    """把int16单声道PCM封装成内存中的WAV字节"""
+    pcm = np.ascontiguousarray(pcm_int16, dtype=np.int16)
+    return wav_header(len(pcm), sample_rate) + pcm.tobytes()
+
+
+# 流水线内部统一使用16kHz单声道int16，whisper.cpp和WebRTC VAD都直接支持
+PIPELINE_SAMPLE_RATE = 16000
+
+
+class PolyphaseResampler:
+    """流式多相重采样器：float32输入，int16输出，块与块之间保持滤波器状态"""
+
+    def __init__(
+        self, in_rate, out_rate=PIPELINE_SAMPLE_RATE, taps_per_phase=32, beta=8.0
+    ):
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        g = math.gcd(self.in_rate, self.out_rate)
+        self.up = self.out_rate // g
+        self.down = self.in_rate // g
+        self.passthrough = self.up == 1 and self.down == 1
+
+        # Kaiser窗sinc低通原型滤波器，截止频率取输入/输出奈奎斯特频率的较小者
+        self.taps = taps_per_phase
+        length = taps_per_phase * self.up
+        cutoff = 0.5 / max(self.up, self.down) * 0.95
+        n = np.arange(length) - (length - 1) / 2
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, beta)
+        prototype *= self.up / prototype.sum()
+
+        # 多相分解: 第p行为 h[p::up]，上采样补零的乘法被完全跳过
+        self.phases = prototype.reshape(taps_per_phase, self.up).T.astype(np.float32)
+        self._offsets = np.arange(taps_per_phase - 1, -1, -1)
+
+        # 流式状态: 上一块末尾的 taps-1 个样本，以及下一个输出在上采样域中的位置
+        self._history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+        self._position = 0
+        self._plans = {}
+
+    def reset(self):
+        self._history[:] = 0
+        self._position = 0
+
+    def _plan(self, num_samples, count):
+        """取样下标和系数矩阵只取决于 (起始位置, 块长度)；固定块长时位置通常不变，缓存复用"""
+        key = (self._position, num_samples)
+        plan = self._plans.get(key)
+        if plan is None:
+            positions = self._position + self.down * np.arange(count)
+            gather = positions[:, None] // self.up + self._offsets
+            plan = (gather, self.phases[positions % self.up])
+            if len(self._plans) >= 8:
+                self._plans.clear()
+            self._plans[key] = plan
+        return plan
+
+    def output_length(self, num_samples):
+        """处理 num_samples 个输入样本后产生的输出样本数"""
+        if self.passthrough:
+            return num_samples
+        span = num_samples * self.up - self._position
+        return max(0, -(-span // self.down))
+
+    def process(self, block):
+        """重采样一块float32单声道音频，返回int16"""
+        block = np.asarray(block, dtype=np.float32).reshape(-1)
+        if self.passthrough:
+            return float_to_int16(block)
+
+        extended = np.concatenate((self._history, block))
+        count = self.output_length(len(block))
+        gather, coefficients = self._plan(len(block), count)
+
+        # 每个输出样本一次向量化内积: (count, taps) 的窗口矩阵乘以对应相位的系数
+        output = np.einsum("ij,ij->i", extended[gather], coefficients)
+
+        self._position = self._position + self.down * count - len(block) * self.up
+        self._history = extended[len(extended) - (self.taps - 1) :].copy()
+        return float_to_int16(output)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+片段批量识别
+积压时把同一路排队的几个片段用静音隔开拼成一段音频，一次识别调用完成，
+再按带时间戳的识别结果把文本分回各个片段。whisper每次调用都按30秒窗口编码，
+短片段单独识别时大部分计算花在补齐的静音上，拼接后多个片段共用一次编码（cli后端还省掉多次模型加载）
+"""
+
+import bisect
+
+import numpy as np
+
+# whisper一次编码30秒，拼接后的音频留一点余量
+WHISPER_WINDOW_SECONDS = 30.0
+
+
+class SegmentBatcher:
+    """决定哪些片段合在一起识别，负责拼接和按时间切分结果，并统计省下的调用开销"""
+
+    def __init__(
+        self,
+        max_batch=4,
+        max_seconds=WHISPER_WINDOW_SECONDS - 2.0,
+        gap_seconds=0.6,
+        sample_rate=16000,
+    ):
+        self.max_batch = max_batch
+        self.max_seconds = max_seconds
+        self.gap = int(gap_seconds * sample_rate)
+        self.sample_rate = sample_rate
+
+        # 单个片段一次调用的平均耗时（指数滑动平均），用来估计批量调用省下的时间
+        self.single_seconds = None
+
+        # 统计
+        self.batches = 0
+        self.segments = 0
+        self.sizes = {}  # 批大小 -> 次数
+        self.calls_saved = 0
+        self.saved_seconds = 0.0
+
+    def plan(self, jobs):
+        """把待识别的片段按顺序分组，返回每组在 jobs 中的下标
+
+        同一组的片段使用同一个模型和后端，片段数不超过 max_batch，拼接后不超过 max_seconds
+        （为None时不限，例如后端按批推理、片段不拼接）
+        """
+        groups = []
+        current, seconds, backend = [], 0.0, None
+        for i, job in enumerate(jobs):
+            duration = len(job["audio"]) / self.sample_rate
+            job_backend = (job["model_path"], id(job["worker"]), job["key"])
+            added = duration + (self.gap / self.sample_rate if current else 0.0)
+            if current and (
+                job_backend != backend
+                or len(current) >= self.max_batch
+                or (self.max_seconds is not None and seconds + added > self.max_seconds)
+            ):
+                groups.append(current)
+                current, seconds = [], 0.0
+                added = duration
+            current.append(i)
+            seconds += added
+            backend = job_backend
+        if current:
+            groups.append(current)
+        return groups
+
+    def join(self, audios):
+        """用静音把片段拼起来，返回 (拼接后的音频, 各片段的起止样本)"""
+        silence = np.zeros(self.gap, dtype=audios[0].dtype)
+        parts, bounds, offset = [], [], 0
+        for i, audio in enumerate(audios):
+            if i:
+                parts.append(silence)
+                offset += self.gap
+            parts.append(audio)
+            bounds.append((offset, offset + len(audio)))
+            offset += len(audio)
+        return np.concatenate(parts), bounds
+
+    def split(self, segments, bounds):
+        """把 [(起始秒, 结束秒, 文本)] 按中点分回各个片段，返回每个片段的文本（没有时为None）
+
+        中点落在两个片段之间的静音里时，以静音的中点为界
+        """
+        # 相邻片段之间静音的中点（秒）
+        edges = [
+            (bounds[i][1] + bounds[i + 1][0]) / 2 / self.sample_rate
+            for i in range(len(bounds) - 1)
+        ]
+        texts = [[] for _ in bounds]
+        for start, end, text in segments:
+            index = bisect.bisect_right(edges, (start + end) / 2)
+            texts[index].append(text)
+        return [" ".join(parts) or None for parts in texts]
+
+    def observe_single(self, seconds):
+        if self.single_seconds is None:
+            self.single_seconds = seconds
+        else:
+            self.single_seconds += 0.2 * (seconds - self.single_seconds)
+
+    def observe_batch(self, size, seconds):
+        """记录一次批量调用；按单个片段的平均耗时估计省下的时间"""
+        self.batches += 1
+        self.segments += size
+        self.sizes[size] = self.sizes.get(size, 0) + 1
+        self.calls_saved += size - 1
+        if self.single_seconds is not None:
+            self.saved_seconds += max(0.0, size * self.single_seconds - seconds)
+
+    def mean_size(self):
+        return self.segments / self.batches if self.batches else 0.0
+
+    def stats(self):
+        return {
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "segments": self.segments,
+            "mean_size": self.mean_size(),
+            "sizes": dict(sorted(self.sizes.items())),
+            "calls_saved": self.calls_saved,
+            "saved_seconds": self.saved_seconds,
+            "single_seconds": self.single_seconds,
+        }
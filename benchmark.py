@@ -0,0 +1,576 @@
+#!/usr/bin/env python3
+"""
+性能基准测试
+默认使用 fake_whisper.py 替身程序，不需要真实的whisper.cpp和模型文件
+
+用法:
+    python benchmark.py worker --segments 20
+    python benchmark.py vad --seconds 30
+    python benchmark.py pipeline --models tiny,small --threads 2,4 --json out.json
+    python benchmark.py backends --model-path models/ggml-small.bin --hf-model openai/whisper-small
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+import numpy as np
+
+from audio_sources import SyntheticSource, synth_speech
+from audio_utils import PolyphaseResampler, float_to_int16
+from history import CaptionRecord
+from transformers_backend import default_model
+from vad_engine import VadEngine
+from whisper_worker import WhisperCliBackend, WhisperServerWorker
+from worker_pool import OVERFLOW_POLICIES
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE_WHISPER = os.path.join(HERE, "fake_whisper.py")
+
+
+def wav_bytes(audio, sample_rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes((np.clip(audio, -1, 1) * 32767).astype(np.int16))
+    return buffer.getvalue()
+
+
+def summarize(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"{name:10s} n={len(latencies):3d}  mean={statistics.mean(latencies) * 1000:8.1f}ms"
+        f"  p50={statistics.median(latencies) * 1000:8.1f}ms  p95={p95 * 1000:8.1f}ms"
+    )
+
+
+def bench_worker(args):
+    """比较每片段启动whisper-cli与常驻whisper-server的单片段延迟"""
+    cli = args.whisper_cli or [sys.executable, FAKE_WHISPER]
+    server = args.whisper_server or [sys.executable, FAKE_WHISPER, "--server"]
+    cli = [cli] if isinstance(cli, str) else cli
+    server = [server] if isinstance(server, str) else server
+
+    segments = [
+        wav_bytes(synth_speech(args.duration, seed=i)) for i in range(args.segments)
+    ]
+
+    # 每片段启动进程：临时WAV + 进程启动 + 模型加载 + 推理
+    spawn_latencies = []
+    for data in segments:
+        start = time.perf_counter()
+        with tempfile.NamedTemporaryFile(suffix=".wav") as f:
+            f.write(data)
+            f.flush()
+            subprocess.run(
+                cli + ["-m", args.model_path, "-f", f.name, "--no-timestamps"],
+                capture_output=True,
+                check=True,
+            )
+        spawn_latencies.append(time.perf_counter() - start)
+
+    # 常驻进程：模型只加载一次
+    with WhisperServerWorker(args.model_path, command=server) as worker:
+        resident_latencies = []
+        for data in segments:
+            start = time.perf_counter()
+            worker.transcribe_wav(data)
+            resident_latencies.append(time.perf_counter() - start)
+        startup = worker.startup_time
+
+    print(f"片段: {args.segments} x {args.duration}s，常驻进程启动耗时 {startup:.2f}s")
+    summarize("spawn", spawn_latencies)
+    summarize("resident", resident_latencies)
+    speedup = statistics.mean(spawn_latencies) / statistics.mean(resident_latencies)
+    print(f"平均延迟加速: {speedup:.1f}x")
+
+
+def bench_backends(args):
+    """比较识别后端: 每片段启动whisper-cli vs 进程内transformers模型（逐个识别和按批识别）
+
+    whisper-cli默认使用替身程序，比较真实开销时用 --whisper-cli 指定真实的whisper-cli
+    """
+    from transformers_backend import TransformersWhisperBackend
+
+    cli = args.whisper_cli or [sys.executable, FAKE_WHISPER]
+    cli = [cli] if isinstance(cli, str) else cli
+    segments = [
+        float_to_int16(synth_speech(args.duration, seed=i))
+        for i in range(args.segments)
+    ]
+    audio_seconds = args.segments * args.duration
+    print(f"片段: {args.segments} x {args.duration}s，{args.threads} 线程")
+
+    rows = []
+    backend = WhisperCliBackend(cli, args.model_path, threads=args.threads)
+    latencies = []
+    start = time.perf_counter()
+    for audio in segments:
+        started = time.perf_counter()
+        backend.transcribe_pcm(audio, language=args.language)
+        latencies.append(time.perf_counter() - started)
+    rows.append(("cli", 0.0, latencies, time.perf_counter() - start))
+
+    for quantize in (True, False) if args.compare_fp32 else (True,):
+        precision = "int8" if quantize else "fp32"
+        try:
+            backend = TransformersWhisperBackend(
+                args.hf_model, threads=args.threads, quantize=quantize
+            ).start()
+        except ImportError as e:
+            print(f"跳过transformers后端（需要torch和transformers）: {e}")
+            break
+        # 第一次推理有额外的初始化开销，不计入
+        backend.transcribe_pcm(segments[0], language=args.language)
+
+        latencies = []
+        start = time.perf_counter()
+        for audio in segments:
+            started = time.perf_counter()
+            backend.transcribe_pcm(audio, language=args.language)
+            latencies.append(time.perf_counter() - started)
+        rows.append(
+            (
+                f"hf-{precision}",
+                backend.startup_time,
+                latencies,
+                time.perf_counter() - start,
+            )
+        )
+
+        for size in [int(b) for b in args.batch.split(",")]:
+            latencies = []
+            start = time.perf_counter()
+            for i in range(0, len(segments), size):
+                started = time.perf_counter()
+                batch = segments[i : i + size]
+                backend.transcribe_batch(batch, language=args.language)
+                # 同一批的片段同时得到结果
+                latencies.extend([time.perf_counter() - started] * len(batch))
+            rows.append(
+                (
+                    f"hf-{precision}-b{size}",
+                    backend.startup_time,
+                    latencies,
+                    time.perf_counter() - start,
+                )
+            )
+        backend.stop()
+
+    for name, startup, latencies, wall in rows:
+        summarize(name, latencies)
+        print(
+            f"{'':10s} 吞吐 {len(latencies) / wall:6.2f} 段/s  RTF {wall / audio_seconds:.3f}"
+            f"  模型加载 {startup:.2f}s"
+        )
+
+
+def legacy_detect_speech(vad, sample_rate, audio_chunk):
+    """重构前 SimpleTranscriber.detect_speech 的实现，作为对比基线"""
+    vad_configs = {8000: 80, 16000: 160, 32000: 320, 48000: 480}
+    if sample_rate in vad_configs:
+        vad_sample_rate = sample_rate
+        vad_frame_size = vad_configs[vad_sample_rate]
+    else:
+        vad_sample_rate = 16000
+        vad_frame_size = vad_configs[vad_sample_rate]
+        downsample_factor = sample_rate // vad_sample_rate
+        if downsample_factor > 1:
+            audio_chunk = audio_chunk[::downsample_factor]
+        else:
+            audio_chunk = np.repeat(audio_chunk, vad_sample_rate // sample_rate)
+    if len(audio_chunk) < vad_frame_size:
+        audio_chunk = np.pad(audio_chunk, (0, vad_frame_size - len(audio_chunk)))
+    elif len(audio_chunk) > vad_frame_size:
+        num_frames = len(audio_chunk) // vad_frame_size
+        audio_chunk = audio_chunk[: num_frames * vad_frame_size]
+    audio_int16 = (np.clip(audio_chunk, -1.0, 1.0) * 32767).astype(np.int16)
+    try:
+        return vad.is_speech(audio_int16.tobytes(), vad_sample_rate)
+    except Exception:
+        rms = np.sqrt(np.mean(audio_chunk**2))
+        return rms > 0.001
+
+
+def time_per_frame(fn, frames, repeat):
+    """返回每帧的 (墙钟时间, CPU时间)，单位微秒"""
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    for _ in range(repeat):
+        for frame in frames:
+            fn(frame)
+    count = len(frames) * repeat
+    return (
+        (time.perf_counter() - wall_start) / count * 1e6,
+        (time.process_time() - cpu_start) / count * 1e6,
+    )
+
+
+def bench_vad(args):
+    """比较旧版detect_speech与VadEngine的单帧CPU开销"""
+    import webrtcvad
+
+    rate = args.rate
+    frame_size = rate * 30 // 1000
+    audio = synth_speech(args.seconds, rate)
+    frames = [
+        audio[i : i + frame_size]
+        for i in range(0, len(audio) - frame_size + 1, frame_size)
+    ]
+
+    legacy_vad = webrtcvad.Vad(2)
+    legacy = time_per_frame(
+        lambda f: legacy_detect_speech(legacy_vad, rate, f), frames, args.repeat
+    )
+
+    # 新流水线: 采集端统一重采样为16kHz int16，VAD直接读取
+    resampler = PolyphaseResampler(rate)
+    pipeline_frames = [resampler.process(f) for f in frames]
+    engine = VadEngine()
+    vad_only = time_per_frame(engine.is_speech, pipeline_frames, args.repeat)
+
+    resampler = PolyphaseResampler(rate)
+    engine = VadEngine()
+    with_resample = time_per_frame(
+        lambda f: engine.is_speech(resampler.process(f)), frames, args.repeat
+    )
+
+    print(f"{len(frames)} 帧 x {args.repeat} 次，输入采样率 {rate} Hz")
+    print(f"{'':22s} {'墙钟(us/帧)':>12s} {'CPU(us/帧)':>12s}")
+    for name, (wall, cpu) in (
+        ("legacy detect_speech", legacy),
+        ("VadEngine", vad_only),
+        ("resample + VadEngine", with_resample),
+    ):
+        print(f"{name:22s} {wall:12.1f} {cpu:12.1f}")
+    print(f"语音占比 {engine.stats()['speech_ratio']:.0%}，回退 {engine.fallbacks} 次")
+
+
+def percentiles(values):
+    """毫秒为单位的延迟分布"""
+    if not values:
+        return None
+    values = np.asarray(values) * 1000
+    return {
+        "count": len(values),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+def stage_ms(stats):
+    """把内置指标的阶段统计换算为与 percentiles() 相同的毫秒格式"""
+    return {
+        "count": stats["count"],
+        "mean": stats["sum"] / stats["count"] * 1000,
+        "p50": stats["p50"] * 1000,
+        "p90": stats["p90"] * 1000,
+        "p99": stats["p99"] * 1000,
+        "max": stats["max"] * 1000,
+    }
+
+
+def max_rss_mb(who):
+    """峰值常驻内存（MB）；macOS的ru_maxrss单位是字节，Linux是KB"""
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+def cpu_seconds(who):
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+class StageTimer:
+    """线程安全地收集各阶段耗时"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+
+        return timed
+
+    def report(self):
+        return {stage: percentiles(values) for stage, values in self.samples.items()}
+
+
+def bench_transcriber_class():
+    """延迟导入SimpleTranscriber（依赖colorama等运行时库）"""
+    from simple_transcriber import SimpleTranscriber
+
+    class BenchTranscriber(SimpleTranscriber):
+        """补充派发、排队和端到端延迟（其余阶段由内置指标计时），不打印字幕"""
+
+        def __init__(self, timer, **kwargs):
+            self.timer = timer
+            self.submitted = {}
+            super().__init__(**kwargs)
+
+        def dispatch_segment(self, segment, channel=None):
+            self.submitted[self.segment_counter + 1] = time.perf_counter()
+            start = time.perf_counter()
+            super().dispatch_segment(segment, channel)
+            self.timer.add("dispatch", time.perf_counter() - start)
+
+        def process_audio_segment(self, segment_id, audio_data):
+            submitted = self.submitted.get(segment_id)
+            if submitted is not None:
+                self.timer.add("queue_wait", time.perf_counter() - submitted)
+            result = super().process_audio_segment(segment_id, audio_data)
+            self.timer.add("inference", result["processing_time"])
+            return result
+
+        def display_result(self, result):
+            submitted = self.submitted.get(result["segment_id"])
+            if submitted is not None:
+                self.timer.add("end_to_end", time.perf_counter() - submitted)
+            if result["transcription"]:
+                self.startup.caption()
+                self.history.append(CaptionRecord.from_result(result))
+
+    return BenchTranscriber
+
+
+def run_pipeline_case(args, model, threads, model_dir):
+    """用合成音频和替身后端跑一遍完整流水线，返回该组合的测量结果"""
+    timer = StageTimer()
+    source = SyntheticSource(
+        args.seconds, sample_rate=args.rate, seed=args.seed, realtime=args.realtime
+    )
+    model_path = os.path.join(model_dir, f"ggml-{model}.bin")
+    open(model_path, "wb").close()
+
+    cpu_self = cpu_seconds(resource.RUSAGE_SELF)
+    cpu_children = cpu_seconds(resource.RUSAGE_CHILDREN)
+    transcriber_class = bench_transcriber_class()
+    # 流水线的进度输出对基准测试没有意义
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        transcriber = transcriber_class(
+            timer,
+            backend=args.backend,
+            hf_model=args.hf_model or default_model(model),
+            max_batch=(
+                args.max_batch
+                if args.max_batch is not None
+                else 4 if args.backend == "transformers" else 1
+            ),
+            whisper_cli=args.whisper_cli or [sys.executable, FAKE_WHISPER],
+            whisper_server=args.whisper_server
+            or [sys.executable, FAKE_WHISPER, "--server"],
+            workers=args.workers,
+            max_queue=args.max_queue,
+            overflow=args.overflow,
+            source=source,
+            threads=threads,
+            # 显式的预算: 比较线程数时不受本机核数限制
+            cpu_budget=threads,
+            model_path=model_path,
+            adaptive=args.adaptive,
+            startup_origin=start,
+        )
+        startup = time.perf_counter() - start
+        start = time.perf_counter()
+        transcriber.start_transcription()
+        wall = time.perf_counter() - start
+
+    stages = {
+        name: stage_ms(stats)
+        for name, stats in transcriber.metrics.snapshot()["stages"].items()
+        if stats["count"]
+    }
+    stages.update(timer.report())
+    history = transcriber.history.stats()
+    speech = history["duration"]["sum"]
+    inference = history["processing_time"]["sum"]
+    pool_stats = transcriber.pool.stats()
+    return {
+        "model": model,
+        "threads": threads,
+        "backend": transcriber.backend,
+        "audio_seconds": args.seconds,
+        "startup_seconds": startup,
+        # 构造转录器到第一条字幕，跟踪启动路径的回归
+        "first_caption_seconds": transcriber.startup.first_caption,
+        "wall_seconds": wall,
+        "segments": pool_stats["submitted"],
+        "transcribed": history["total"],
+        "dropped": pool_stats["dropped"],
+        "merged": pool_stats["merged"],
+        "segments_per_second": pool_stats["submitted"] / wall if wall else 0.0,
+        "rtf": wall / args.seconds,
+        "inference_rtf": inference / speech if speech else None,
+        "cpu_seconds": cpu_seconds(resource.RUSAGE_SELF) - cpu_self,
+        "children_cpu_seconds": cpu_seconds(resource.RUSAGE_CHILDREN) - cpu_children,
+        "max_rss_mb": max_rss_mb(resource.RUSAGE_SELF),
+        "children_max_rss_mb": max_rss_mb(resource.RUSAGE_CHILDREN),
+        "max_queue_depth": pool_stats["max_depth_seen"],
+        "segmentation": (
+            transcriber.controller.stats() if transcriber.controller else None
+        ),
+        "stages_ms": stages,
+    }
+
+
+def git_revision():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=HERE,
+            capture_output=True,
+            text=True,
+        )
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_pipeline(args):
+    """端到端基准: 合成音频 → SimpleTranscriber 的 VAD/分段/派发 → 替身识别后端"""
+    # 替身程序的延迟通过环境变量传给子进程
+    os.environ["FAKE_WHISPER_LOAD_DELAY"] = str(args.load_delay)
+    os.environ["FAKE_WHISPER_RTF"] = str(args.fake_rtf)
+
+    models = args.models.split(",")
+    thread_counts = [int(t) for t in args.threads.split(",")]
+    runs = []
+    with tempfile.TemporaryDirectory() as model_dir:
+        for model in models:
+            for threads in thread_counts:
+                run = run_pipeline_case(args, model, threads, model_dir)
+                runs.append(run)
+                stages = run["stages_ms"]
+                e2e = stages.get("end_to_end") or {}
+                print(
+                    f"{model:8s} t={threads:<2d} 片段 {run['segments']:3d}  "
+                    f"{run['segments_per_second']:6.2f} 段/s  RTF {run['rtf']:.3f}  "
+                    f"推理RTF {run['inference_rtf'] or 0:.3f}  "
+                    f"端到端 p50/p99 {e2e.get('p50', 0):7.1f}/{e2e.get('p99', 0):7.1f}ms  "
+                    f"首条字幕 {run['first_caption_seconds'] or 0:.2f}s  "
+                    f"CPU {run['cpu_seconds']:.2f}s+{run['children_cpu_seconds']:.2f}s"
+                )
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key != "func"},
+        "runs": runs,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"结果已写入 {args.json}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="audio-captions-rt 性能基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    worker = sub.add_parser("worker", help="常驻工作进程 vs 每片段启动进程")
+    worker.add_argument("--segments", type=int, default=10)
+    worker.add_argument("--duration", type=float, default=2.0, help="片段时长（秒）")
+    worker.add_argument("--model-path", default="models/ggml-small.bin")
+    worker.add_argument("--whisper-cli", help="真实whisper-cli路径（默认使用替身）")
+    worker.add_argument(
+        "--whisper-server", help="真实whisper-server路径（默认使用替身）"
+    )
+    worker.set_defaults(func=bench_worker)
+
+    backends = sub.add_parser(
+        "backends",
+        help="识别后端: 每片段启动whisper-cli vs 进程内transformers（int8，按批）",
+    )
+    backends.add_argument("--segments", type=int, default=16)
+    backends.add_argument("--duration", type=float, default=3.0, help="片段时长（秒）")
+    backends.add_argument("--threads", type=int, default=4)
+    backends.add_argument("--language", default="en")
+    backends.add_argument("--model-path", default="models/ggml-small.bin")
+    backends.add_argument("--hf-model", default="openai/whisper-small")
+    backends.add_argument("--batch", default="4,8", help="逗号分隔的批大小")
+    backends.add_argument(
+        "--compare-fp32", action="store_true", help="同时测量不量化的float32模型"
+    )
+    backends.add_argument("--whisper-cli", help="真实whisper-cli路径（默认使用替身）")
+    backends.set_defaults(func=bench_backends)
+
+    vad = sub.add_parser("vad", help="VAD单帧CPU开销: 重构前 vs 重构后")
+    vad.add_argument("--seconds", type=float, default=30.0)
+    vad.add_argument("--rate", type=int, default=48000, help="设备采样率")
+    vad.add_argument("--repeat", type=int, default=3)
+    vad.set_defaults(func=bench_vad)
+
+    pipeline = sub.add_parser(
+        "pipeline", help="端到端流水线: 段/s、各阶段延迟分位数、CPU/内存、RTF"
+    )
+    pipeline.add_argument("--seconds", type=float, default=60.0, help="合成音频时长")
+    pipeline.add_argument("--rate", type=int, default=48000, help="合成音频采样率")
+    pipeline.add_argument("--seed", type=int, default=0)
+    pipeline.add_argument(
+        "--realtime", action="store_true", help="按实际时长输入（默认全速）"
+    )
+    pipeline.add_argument("--models", default="tiny,base,small", help="逗号分隔")
+    pipeline.add_argument("--threads", default="1,2,4", help="逗号分隔的线程数")
+    pipeline.add_argument(
+        "--backend", choices=["server", "cli", "transformers"], default="server"
+    )
+    pipeline.add_argument(
+        "--hf-model", default=None, help="transformers后端的模型（默认按 --models）"
+    )
+    pipeline.add_argument("--workers", type=int, default=2)
+    pipeline.add_argument(
+        "--max-batch", type=int, default=None, help="默认 transformers后端 4，其他 1"
+    )
+    pipeline.add_argument("--max-queue", type=int, default=4)
+    pipeline.add_argument("--overflow", choices=OVERFLOW_POLICIES, default="block")
+    pipeline.add_argument(
+        "--load-delay", type=float, default=0.3, help="替身程序的模型加载耗时（秒）"
+    )
+    pipeline.add_argument(
+        "--fake-rtf", type=float, default=0.05, help="替身程序每秒音频的推理耗时"
+    )
+    pipeline.add_argument("--whisper-cli", help="真实whisper-cli路径（默认使用替身）")
+    pipeline.add_argument(
+        "--whisper-server", help="真实whisper-server路径（默认使用替身）"
+    )
+    pipeline.add_argument("--adaptive", action="store_true", help="启用自适应分段")
+    pipeline.add_argument("--json", help="把结果写入JSON文件，便于跨提交比较")
+    pipeline.set_defaults(func=bench_pipeline)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
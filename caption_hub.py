@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+字幕分发
+进程内的发布/订阅中心: 转录结果（partial/final事件）广播给任意多个订阅者，
+例如SSE端点、文件和回调函数。每个订阅者有自己的有界队列，满了按策略丢弃或合并，
+发布方从不等待，慢的订阅者不会拖住转录线程或其他订阅者
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+# drop-oldest: 丢弃最旧的事件；drop-newest: 丢弃新事件；
+# coalesce: 同一来源的部分结果只保留最新一条，仍然满时先丢最旧的部分结果
+SUBSCRIBER_POLICIES = ("drop-oldest", "drop-newest", "coalesce")
+
+
+class Subscriber:
+    """一个订阅者的有界事件队列；get() 由订阅方线程调用"""
+
+    def __init__(self, name, maxsize=256, policy="drop-oldest", filter=None):
+        if policy not in SUBSCRIBER_POLICIES:
+            raise ValueError(f"未知的订阅策略: {policy}")
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.filter = filter
+        self.closed = False
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+        # 统计
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth_seen = 0
+
+    def offer(self, event):
+        """由发布方调用，只做队列操作，不会阻塞"""
+        if self.filter is not None and not self.filter(event):
+            return
+        with self._cond:
+            if self.closed:
+                return
+            self.received += 1
+            queue = self._queue
+            if self.policy == "coalesce" and event.get("type") == "partial":
+                # 替换队列中同一来源尚未取走的部分结果
+                for i in range(len(queue) - 1, -1, -1):
+                    queued = queue[i]
+                    if queued.get("type") == "partial" and queued.get(
+                        "source"
+                    ) == event.get("source"):
+                        del queue[i]
+                        self.coalesced += 1
+                        break
+            if len(queue) >= self.maxsize:
+                if self.policy == "drop-newest":
+                    self.dropped += 1
+                    return
+                self._drop_one()
+            queue.append(event)
+            self.max_depth_seen = max(self.max_depth_seen, len(queue))
+            self._cond.notify()
+
+    def _drop_one(self):
+        queue = self._queue
+        if self.policy == "coalesce":
+            for i, queued in enumerate(queue):
+                if queued.get("type") == "partial":
+                    del queue[i]
+                    self.dropped += 1
+                    return
+        queue.popleft()
+        self.dropped += 1
+
+    def get(self, timeout=None):
+        """取下一个事件；超时或订阅已关闭且队列为空时返回None"""
+        with self._cond:
+            if not self._queue and not self.closed:
+                self._cond.wait(timeout)
+            if not self._queue:
+                return None
+            self.delivered += 1
+            return self._queue.popleft()
+
+    def __iter__(self):
+        while True:
+            event = self.get()
+            if event is None:
+                if self.closed:
+                    return
+                continue
+            yield event
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def depth(self):
+        return len(self._queue)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "policy": self.policy,
+            "depth": len(self._queue),
+            "max_depth_seen": self.max_depth_seen,
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+
+class CallbackSubscriber(Subscriber):
+    """在自己的线程中对每个事件调用 fn(event)；回调再慢也只影响自己的队列"""
+
+    def __init__(self, fn, name=None, **kwargs):
+        super().__init__(name or getattr(fn, "__name__", "callback"), **kwargs)
+        self.fn = fn
+        self.errors = 0
+        self._thread = threading.Thread(
+            target=self._run, name=f"subscriber-{self.name}", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        for event in self:
+            try:
+                self.fn(event)
+            except Exception as e:
+                self.errors += 1
+                if self.errors == 1:
+                    print(f"❌ 字幕订阅者 {self.name} 出错: {e}")
+
+    def join(self, timeout=None):
+        """关闭后等待队列中剩余的事件处理完"""
+        self._thread.join(timeout)
+
+
+class FileSink:
+    """把事件逐行写成JSON（JSONL）；默认只写最终结果"""
+
+    def __init__(self, path, types=("final",)):
+        self.path = path
+        self.types = types
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def __call__(self, event):
+        if self.types and event.get("type") not in self.types:
+            return
+        self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class CaptionHub:
+    """字幕事件的发布/订阅中心"""
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._closers = []
+        self.published = 0
+        self.closed = False
+
+    def subscribe(self, name=None, maxsize=256, policy="drop-oldest", filter=None):
+        """新建一个拉取式订阅，调用方用 get()/迭代 读取事件"""
+        subscriber = Subscriber(
+            name or f"subscriber-{len(self._subscribers) + 1}",
+            maxsize=maxsize,
+            policy=policy,
+            filter=filter,
+        )
+        self._add(subscriber)
+        return subscriber
+
+    def add_callback(
+        self, fn, name=None, maxsize=256, policy="drop-oldest", filter=None
+    ):
+        """在独立线程中调用 fn(event)"""
+        subscriber = CallbackSubscriber(
+            fn, name=name, maxsize=maxsize, policy=policy, filter=filter
+        )
+        self._add(subscriber)
+        return subscriber.start()
+
+    def add_file_sink(self, path, types=("final",), maxsize=1024):
+        """把事件追加写入JSONL文件（写文件在订阅者线程中进行）"""
+        sink = FileSink(path, types)
+        subscriber = self.add_callback(
+            sink,
+            name=f"file:{path}",
+            maxsize=maxsize,
+            filter=lambda event: not types or event.get("type") in types,
+        )
+        self._closers.append(sink.close)
+        return subscriber
+
+    def _add(self, subscriber):
+        with self._lock:
+            # 复制后替换，发布时不需要持锁遍历
+            self._subscribers = self._subscribers + [subscriber]
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not subscriber]
+        subscriber.close()
+
+    def publish(self, event):
+        """广播一个事件；只往各订阅者的队列里放，不等待任何订阅者"""
+        event.setdefault("published", time.time())
+        with self._lock:
+            self.published += 1
+        for subscriber in self._subscribers:
+            subscriber.offer(event)
+
+    @property
+    def subscribers(self):
+        return list(self._subscribers)
+
+    def close(self, timeout=5.0):
+        """关闭所有订阅；回调订阅者先处理完队列中剩余的事件"""
+        self.closed = True
+        subscribers = self.subscribers
+        for subscriber in subscribers:
+            subscriber.close()
+        for subscriber in subscribers:
+            if isinstance(subscriber, CallbackSubscriber):
+                subscriber.join(timeout)
+        for close in self._closers:
+            close()
+        self._closers = []
+
+    def stats(self):
+        subscribers = [s.stats() for s in self.subscribers]
+        return {
+            "published": self.published,
+            "subscribers": len(subscribers),
+            "dropped": sum(s["dropped"] for s in subscribers),
+            "coalesced": sum(s["coalesced"] for s in subscribers),
+            "details": subscribers,
+        }
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+采集日志
+把采集到的16kHz int16音频写进一个预分配、内存映射的环形文件，附带时间锚点和片段索引。
+写入只是对映射内存的复制，每帧没有系统调用；进程崩溃后已写入的数据仍在页缓存中，
+下次启动接着写，读取端可以按任意时间范围取出音频，比实时更快地重新送入流水线
+（例如换一个模型重新识别）
+
+文件布局: 头部(4KB) | 时间锚点环 | 片段索引环 | 音频环
+    头部中的 written / anchors / segments 为累计写入数，最后更新，作为提交标记
+
+用法:
+    python capture_journal.py journal.pcm                       # 查看时间范围和片段数
+    python capture_journal.py journal.pcm --segments            # 列出片段
+    python capture_journal.py journal.pcm --from -60 --export last.wav   # 导出最近一分钟
+"""
+
+import mmap
+import os
+import time
+import wave
+from datetime import datetime
+
+import numpy as np
+
+from audio_sources import CaptureSource
+
+MAGIC = b"ACRTJRN1"
+VERSION = 1
+HEADER_BYTES = 4096
+
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("sample_rate", "<u4"),
+        ("capacity", "<u8"),  # 音频环的样本数
+        ("anchor_capacity", "<u8"),
+        ("index_capacity", "<u8"),
+        ("written", "<u8"),  # 累计写入的样本数（流中的绝对位置）
+        ("anchors", "<u8"),  # 累计写入的时间锚点数
+        ("segments", "<u8"),  # 累计写入的片段数
+        ("created", "<f8"),
+    ]
+)
+# 时间锚点: 流中位置 → 采集时的时间
+ANCHOR_DTYPE = np.dtype([("position", "<u8"), ("time", "<f8")])
+# 片段索引: seq 为累计序号+1，最后写入，读取时用来判断记录是否完整
+SEGMENT_DTYPE = np.dtype(
+    [
+        ("seq", "<u8"),
+        ("start", "<u8"),
+        ("end", "<u8"),
+        ("time", "<f8"),
+        ("segment_id", "<u8"),
+        ("channel", "<u4"),
+        ("reserved", "<u4"),
+    ]
+)
+
+
+def channel_path(path, index, count):
+    """多路采集时每路一个文件: journal.pcm → journal.1.pcm"""
+    if count <= 1 or index == 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{index}{ext}"
+
+
+class _Mapping:
+    """日志文件的内存映射和各区域的numpy视图"""
+
+    def __init__(self, path, writable):
+        self.path = path
+        self._file = open(path, "r+b" if writable else "rb")
+        try:
+            self._mmap = mmap.mmap(
+                self._file.fileno(),
+                0,
+                access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ,
+            )
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} 不是采集日志")
+        self.header = np.ndarray((), HEADER_DTYPE, buffer=self._mmap)
+        if bytes(self.header["magic"]) != MAGIC or self.header["version"] != VERSION:
+            self.close()
+            raise ValueError(f"{path} 不是采集日志")
+        self.sample_rate = int(self.header["sample_rate"])
+        self.capacity = int(self.header["capacity"])
+        offset = HEADER_BYTES
+        self.anchors = np.ndarray(
+            int(self.header["anchor_capacity"]),
+            ANCHOR_DTYPE,
+            buffer=self._mmap,
+            offset=offset,
+        )
+        offset += self.anchors.nbytes
+        self.index = np.ndarray(
+            int(self.header["index_capacity"]),
+            SEGMENT_DTYPE,
+            buffer=self._mmap,
+            offset=offset,
+        )
+        offset += self.index.nbytes
+        self.data = np.ndarray(
+            self.capacity, np.int16, buffer=self._mmap, offset=offset
+        )
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        # 先释放指向映射的视图，否则 mmap.close 会报错
+        self.header = self.anchors = self.index = self.data = None
+        self._mmap.close()
+        self._file.close()
+
+
+def create_journal(path, sample_rate=16000, seconds=3600, max_segments=None):
+    """预分配日志文件（已存在的文件被覆盖）"""
+    capacity = int(sample_rate * seconds)
+    anchor_capacity = int(seconds) + 64  # 每秒最多一个锚点，另有每次启动时的锚点
+    index_capacity = max_segments or max(1024, int(seconds))
+    size = (
+        HEADER_BYTES
+        + anchor_capacity * ANCHOR_DTYPE.itemsize
+        + index_capacity * SEGMENT_DTYPE.itemsize
+        + capacity * 2
+    )
+    with open(path, "wb") as f:
+        f.truncate(size)  # 稀疏文件，空间随写入分配
+        header = np.zeros((), HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["sample_rate"] = sample_rate
+        header["capacity"] = capacity
+        header["anchor_capacity"] = anchor_capacity
+        header["index_capacity"] = index_capacity
+        header["created"] = time.time()
+        f.write(header.tobytes())
+
+
+class CaptureJournal:
+    """采集日志的写入端（每路采集一个，只在该路的采集线程中写入）
+
+    文件已存在且容量一致时接着写（崩溃后重启不丢之前的音频），否则重新创建
+    """
+
+    def __init__(self, path, sample_rate=16000, seconds=3600, anchor_interval=1.0):
+        self.path = path
+        self.created = False
+        try:
+            mapping = _Mapping(path, writable=True)
+            if mapping.sample_rate != sample_rate or mapping.capacity != int(
+                sample_rate * seconds
+            ):
+                mapping.close()
+                mapping = None
+        except (OSError, ValueError):
+            mapping = None
+        if mapping is None:
+            create_journal(path, sample_rate, seconds)
+            mapping = _Mapping(path, writable=True)
+            self.created = True
+        self._map = mapping
+        self.sample_rate = sample_rate
+        self.capacity = mapping.capacity
+        self.written = int(mapping.header["written"])
+        self.segments = int(mapping.header["segments"])
+        self.anchors = int(mapping.header["anchors"])
+        # 本次运行的流位置0对应日志中的位置（分段器的样本位置从0开始）
+        self.base = self.written
+        self.anchor_interval = int(anchor_interval * sample_rate)
+        self._last_anchor = None
+
+    def write(self, frame):
+        """追加一帧int16音频: 只是对映射内存的复制"""
+        n = len(frame)
+        data = self._map.data
+        offset = self.written % self.capacity
+        first = min(n, self.capacity - offset)
+        data[offset : offset + first] = frame[:first]
+        if first < n:
+            data[: n - first] = frame[first:]
+        self.written += n
+        if (
+            self._last_anchor is None
+            or self.written - self._last_anchor >= self.anchor_interval
+        ):
+            self._anchor(self.written, time.time())
+        self._map.header["written"] = self.written
+
+    def _anchor(self, position, at):
+        anchors = self._map.anchors
+        anchors[self.anchors % len(anchors)] = (position, at)
+        self.anchors += 1
+        self._map.header["anchors"] = self.anchors
+        self._last_anchor = position
+
+    def mark_segment(self, segment_id, start, end, channel=0):
+        """记录一个片段；start/end 为本次运行中分段器的样本位置"""
+        index = self._map.index
+        record = index[self.segments % len(index)]
+        record["seq"] = 0  # 写入过程中记录无效
+        record["start"] = self.base + start
+        record["end"] = self.base + end
+        record["time"] = time.time()
+        record["segment_id"] = segment_id
+        record["channel"] = channel
+        self.segments += 1
+        record["seq"] = self.segments
+        self._map.header["segments"] = self.segments
+
+    def flush(self):
+        """写回磁盘（进程崩溃不需要，只防系统断电）"""
+        self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self.flush()
+            self._map.close()
+            self._map = None
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "written_seconds": (self.written - self.base) / self.sample_rate,
+            "capacity_seconds": self.capacity / self.sample_rate,
+            "segments": self.segments,
+        }
+
+
+class JournalReader:
+    """采集日志的读取端，可以在写入端运行时读取"""
+
+    def __init__(self, path):
+        self._map = _Mapping(path, writable=False)
+        self.path = path
+        self.sample_rate = self._map.sample_rate
+        self.capacity = self._map.capacity
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def written(self):
+        return int(self._map.header["written"])
+
+    @property
+    def oldest(self):
+        return max(0, self.written - self.capacity)
+
+    def _anchor_table(self):
+        """有效的时间锚点，按位置排序: (位置数组, 时间数组)"""
+        count = int(self._map.header["anchors"])
+        anchors = self._map.anchors
+        if count > len(anchors):
+            start = count % len(anchors)
+            table = np.concatenate((anchors[start:], anchors[:start]))
+        else:
+            table = anchors[:count].copy()
+        return table["position"].astype(np.int64), table["time"]
+
+    def time_at(self, position):
+        """流中位置对应的采集时间（用前一个锚点按采样率外推）"""
+        positions, times = self._anchor_table()
+        if not len(positions):
+            return None
+        i = max(0, np.searchsorted(positions, position, side="right") - 1)
+        return float(times[i] + (position - positions[i]) / self.sample_rate)
+
+    def position_at(self, at):
+        """采集时间对应的流中位置；两个锚点之间有中断时取后一个锚点"""
+        positions, times = self._anchor_table()
+        if not len(positions):
+            return self.oldest
+        i = np.searchsorted(times, at, side="right") - 1
+        if i < 0:
+            return self.oldest
+        position = positions[i] + int((at - times[i]) * self.sample_rate)
+        if i + 1 < len(positions):
+            position = min(position, positions[i + 1])
+        return int(min(max(position, self.oldest), self.written))
+
+    def read(self, start, end):
+        """取出 [start, end) 的int16样本（复制）；起点已被覆盖时从最早的样本开始"""
+        start = max(start, self.oldest)
+        end = min(end, self.written)
+        if end <= start:
+            return np.zeros(0, dtype=np.int16)
+        data = self._map.data
+        a = start % self.capacity
+        b = a + (end - start)
+        if b <= self.capacity:
+            audio = data[a:b].copy()
+        else:
+            audio = np.concatenate((data[a:], data[: b - self.capacity]))
+        # 复制过程中写入端可能已经覆盖了开头
+        overwritten = self.oldest - start
+        return audio[overwritten:] if overwritten > 0 else audio
+
+    def segments(self, start=None, end=None):
+        """流位置在 [start, end) 内、音频仍在日志中的片段记录（按写入顺序）"""
+        count = int(self._map.header["segments"])
+        index = self._map.index
+        first = max(0, count - len(index))
+        oldest = self.oldest
+        records = []
+        for seq in range(first + 1, count + 1):
+            record = index[(seq - 1) % len(index)].copy()
+            if record["seq"] != seq or record["start"] < oldest:
+                continue
+            if start is not None and record["end"] <= start:
+                continue
+            if end is not None and record["start"] >= end:
+                continue
+            records.append(record)
+        return records
+
+    def info(self):
+        oldest, written = self.oldest, self.written
+        return {
+            "path": self.path,
+            "sample_rate": self.sample_rate,
+            "capacity_seconds": self.capacity / self.sample_rate,
+            "oldest": oldest,
+            "written": written,
+            "seconds": (written - oldest) / self.sample_rate,
+            "start_time": self.time_at(oldest),
+            "end_time": self.time_at(written),
+            "segments": len(self.segments()),
+        }
+
+
+def parse_time(spec, reader):
+    """时间范围的端点: 负数为相对日志末尾的秒数，含 : 或 - 的为日期时间，否则为Unix时间戳"""
+    if spec is None:
+        return None
+    spec = str(spec).strip()
+    if spec.startswith("-"):
+        end = reader.time_at(reader.written)
+        return (end if end is not None else time.time()) + float(spec)
+    if ":" in spec or "-" in spec:
+        if len(spec) <= 8:
+            # 只有时分秒: 当天
+            spec = f"{datetime.now().date().isoformat()}T{spec}"
+        return datetime.fromisoformat(spec).timestamp()
+    return float(spec)
+
+
+class JournalSource(CaptureSource):
+    """按时间范围回放采集日志，全速读取（比实时快），可以换一个模型重新识别"""
+
+    def __init__(self, path, start=None, end=None, realtime=False):
+        self.path = path
+        self.realtime = realtime
+        self.start_spec = start
+        self.end_spec = end
+        self.reader = None
+        self.range = None
+        with JournalReader(path) as reader:
+            sample_rate = reader.sample_rate
+            self.range = self._resolve(reader)
+        super().__init__(sample_rate, f"journal:{path}")
+
+    def _resolve(self, reader):
+        start = parse_time(self.start_spec, reader)
+        end = parse_time(self.end_spec, reader)
+        first = reader.position_at(start) if start is not None else reader.oldest
+        last = reader.position_at(end) if end is not None else reader.written
+        return first, max(first, last)
+
+    @property
+    def duration(self):
+        return (self.range[1] - self.range[0]) / self.sample_rate
+
+    def open(self):
+        self.reader = JournalReader(self.path)
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def blocks(self, block_size):
+        started = time.monotonic()
+        position, end = self.range
+        chunk = max(block_size, self.sample_rate * 10)
+        produced = 0
+        while position < end:
+            audio = self.reader.read(position, min(end, position + chunk))
+            if not len(audio):
+                return
+            position += len(audio)
+            for i in range(0, len(audio), block_size):
+                block = audio[i : i + block_size].astype(np.float32) * (1 / 32768)
+                produced += len(block)
+                if self.realtime:
+                    delay = started + produced / self.sample_rate - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                yield block
+
+
+def format_time(at):
+    return datetime.fromtimestamp(at).strftime("%Y-%m-%d %H:%M:%S") if at else "-"
+
+
+def export_wav(path, audio, sample_rate):
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(audio.tobytes())
+
+
+def main():
+    """查看或导出采集日志"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="查看或导出采集日志")
+    parser.add_argument("journal", help="采集日志文件")
+    parser.add_argument(
+        "--from",
+        dest="start",
+        default=None,
+        help="起始时间: 负数为相对末尾的秒数，或日期时间/时分秒，或Unix时间戳",
+    )
+    parser.add_argument(
+        "--to", dest="end", default=None, help="结束时间，格式同 --from"
+    )
+    parser.add_argument("--segments", action="store_true", help="列出范围内的片段")
+    parser.add_argument("--export", default=None, help="把范围内的音频导出为WAV")
+    args = parser.parse_args()
+
+    source = JournalSource(args.journal, args.start, args.end)
+    first, last = source.range
+    with JournalReader(args.journal) as reader:
+        info = reader.info()
+        print(
+            f"📼 {info['path']}: {info['seconds']:.1f}s / {info['capacity_seconds']:.0f}s，"
+            f"{format_time(info['start_time'])} → {format_time(info['end_time'])}，"
+            f"片段 {info['segments']}"
+        )
+        if args.start is not None or args.end is not None:
+            print(
+                f"   范围: {format_time(reader.time_at(first))} → "
+                f"{format_time(reader.time_at(last))}（{source.duration:.1f}s）"
+            )
+        if args.segments:
+            for record in reader.segments(first, last):
+                seconds = (record["end"] - record["start"]) / reader.sample_rate
+                print(
+                    f"   [{format_time(record['time'])}] 通道 {record['channel']} "
+                    f"片段 {record['segment_id']} ({seconds:.1f}s)"
+                )
+        if args.export:
+            audio = reader.read(first, last)
+            export_wav(args.export, audio, reader.sample_rate)
+            print(f"💾 已导出 {len(audio) / reader.sample_rate:.1f}s 到 {args.export}")
+
+
+if __name__ == "__main__":
+    main()
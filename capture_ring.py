@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+采集环形缓冲区
+PortAudio回调（唯一生产者）把样本复制进预分配的数组，主线程（唯一消费者）按帧读取。
+读写各自只修改自己的位置计数，不需要加锁，回调中也不分配新的数组
+"""
+
+import time
+
+import numpy as np
+
+
+class CaptureRing:
+    """单生产者/单消费者的float32环形缓冲区"""
+
+    def __init__(self, capacity, sample_rate):
+        self.capacity = int(capacity)
+        self.sample_rate = sample_rate
+        self._buffer = np.zeros(self.capacity, dtype=np.float32)
+
+        # 绝对位置: _write 只由回调线程修改，_read 只由消费线程修改
+        self._write = 0
+        self._read = 0
+
+        # 生产者侧统计
+        self.callbacks = 0
+        self.overflows = 0  # PortAudio报告的输入溢出
+        self.underflows = 0  # PortAudio报告的输入下溢
+        self.dropped_samples = 0  # 缓冲区满时丢弃的样本
+        self.dropped_blocks = 0
+        self.max_fill = 0
+
+        # 消费者侧统计
+        self.frames_read = 0
+        self.empty_polls = 0
+
+    # ---- 生产者（PortAudio回调线程） ----
+
+    def write(self, samples, status=None):
+        """写入一块样本；缓冲区空间不足时丢弃整块并计数"""
+        self.callbacks += 1
+        if status:
+            if status.input_overflow:
+                self.overflows += 1
+            if status.input_underflow:
+                self.underflows += 1
+
+        n = len(samples)
+        write = self._write
+        if n > self.capacity - (write - self._read):
+            self.dropped_samples += n
+            self.dropped_blocks += 1
+            return False
+
+        offset = write % self.capacity
+        first = min(n, self.capacity - offset)
+        self._buffer[offset : offset + first] = samples[:first]
+        if first < n:
+            self._buffer[: n - first] = samples[first:]
+
+        # 数据复制完成后再发布新的写位置
+        self._write = write + n
+        fill = self._write - self._read
+        if fill > self.max_fill:
+            self.max_fill = fill
+        return True
+
+    # ---- 消费者（主线程） ----
+
+    def available(self):
+        return self._write - self._read
+
+    def read_into(self, out):
+        """读取恰好 len(out) 个样本到out；数据不足时返回False"""
+        n = len(out)
+        read = self._read
+        if self._write - read < n:
+            self.empty_polls += 1
+            return False
+
+        offset = read % self.capacity
+        first = min(n, self.capacity - offset)
+        out[:first] = self._buffer[offset : offset + first]
+        if first < n:
+            out[first:] = self._buffer[: n - first]
+
+        self._read = read + n
+        self.frames_read += 1
+        return True
+
+    def wait_read_into(self, out, timeout=0.1, poll_interval=0.005):
+        """等待直到读满一帧或超时"""
+        deadline = time.monotonic() + timeout
+        while not self.read_into(out):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
+        return True
+
+    def stats(self):
+        fill = self.available()
+        return {
+            "capacity": self.capacity,
+            "fill": fill,
+            "lag_seconds": fill / self.sample_rate,
+            "max_lag_seconds": self.max_fill / self.sample_rate,
+            "callbacks": self.callbacks,
+            "overflows": self.overflows,
+            "underflows": self.underflows,
+            "dropped_samples": self.dropped_samples,
+            "dropped_blocks": self.dropped_blocks,
+        }
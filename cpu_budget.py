@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+CPU线程预算
+按本机可用的核数（CPU亲和性和cgroup配额取较小者）设一个全局线程预算，
+同时运行的识别任务从预算中领取线程数: 空闲时一个任务拿满（单个片段延迟最低），
+积压时按在途和排队的任务数平分（总吞吐最高，不会几个whisper-cli进程抢同一批核），
+预算用完时新任务等前面的任务结束，而不是超额运行；
+可选把每个任务绑定到领取的核上（仅Linux）
+"""
+
+import math
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+# cgroup v2 / v1 的CPU配额文件（容器内一般挂载在根目录）
+CGROUP_V2_ROOT = "/sys/fs/cgroup"
+CGROUP_V1_DIRS = ("/sys/fs/cgroup/cpu", "/sys/fs/cgroup/cpu,cpuacct")
+
+PINNING_SUPPORTED = hasattr(os, "sched_setaffinity")
+
+
+def _own_cgroup_path():
+    """本进程所在的cgroup v2路径（/proc/self/cgroup 中 0:: 开头的一行）"""
+    try:
+        with open("/proc/self/cgroup") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    return line[3:].strip()
+    except OSError:
+        pass
+    return "/"
+
+
+def cgroup_cpu_limit():
+    """cgroup的CPU配额（核数，可以是小数）；没有配额或不是Linux时返回None"""
+    own = _own_cgroup_path().lstrip("/")
+    for directory in {os.path.join(CGROUP_V2_ROOT, own), CGROUP_V2_ROOT}:
+        try:
+            with open(os.path.join(directory, "cpu.max")) as f:
+                quota, period = f.read().split()[:2]
+        except (OSError, ValueError):
+            continue
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+
+    for directory in CGROUP_V1_DIRS:
+        try:
+            with open(os.path.join(directory, "cpu.cfs_quota_us")) as f:
+                quota = int(f.read())
+            with open(os.path.join(directory, "cpu.cfs_period_us")) as f:
+                period = int(f.read())
+        except (OSError, ValueError):
+            continue
+        return quota / period if quota > 0 and period > 0 else None
+    return None
+
+
+def available_cpus():
+    """返回 (可用核数, 可用的CPU编号列表, 配额)
+
+    核数取CPU亲和性和cgroup配额（向下取整，避免被CFS限流）中较小的一个
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    quota = cgroup_cpu_limit()
+    count = len(cpus)
+    if quota is not None:
+        count = max(1, min(count, math.floor(quota)))
+    return count, cpus, quota
+
+
+class Lease:
+    """一次领取: 线程数和（绑核时）CPU编号"""
+
+    __slots__ = ("threads", "cpus")
+
+    def __init__(self, threads, cpus=None):
+        self.threads = threads
+        self.cpus = cpus
+
+
+class ThreadBudget:
+    """全局线程预算，在同时运行的识别任务之间分配
+
+    total 为预算总线程数（默认为可用核数），max_per_job 为单个任务的上限（默认不限）；
+    pending_fn 返回还在排队等待的任务数，用来在积压时提前平分，
+    不让先开始的任务拿满预算、后来的只能挤在一起
+    """
+
+    def __init__(
+        self,
+        total=None,
+        max_per_job=None,
+        min_per_job=1,
+        pin=False,
+        pending_fn=None,
+        max_jobs=None,
+    ):
+        count, cpus, quota = available_cpus()
+        self.available = count
+        self.quota = quota
+        self.total = max(1, total or count)
+        self.max_per_job = max(1, min(max_per_job or self.total, self.total))
+        self.min_per_job = min_per_job
+        self.pending_fn = pending_fn
+        self.max_jobs = max_jobs  # 最多同时运行的任务数（线程池大小）
+        self.pin = pin and PINNING_SUPPORTED
+        self._cpus = cpus[: self.total] if len(cpus) >= self.total else cpus
+        self._cpu_load = {cpu: 0 for cpu in self._cpus}
+        self._cond = threading.Condition()
+
+        self.in_use = 0
+        self.active = 0
+        self.waiting = 0  # 在这里等待线程的任务数
+
+        # 统计
+        self.leases = 0
+        self.leased_threads = 0
+        self.waits = 0  # 预算用完、等待其他任务结束的次数
+        self.wait_seconds = 0.0
+        self.max_in_use = 0
+
+    def share(self, active, pending=0):
+        """已有 active 个任务在运行、pending 个在排队时，新任务应得的线程数"""
+        jobs = active + 1 + pending
+        if self.max_jobs:
+            jobs = min(jobs, self.max_jobs)
+        return max(self.min_per_job, min(self.max_per_job, self.total // jobs))
+
+    def acquire(self):
+        pending = self.pending_fn() if self.pending_fn is not None else 0
+        with self._cond:
+            if self.total - self.in_use < self.min_per_job:
+                started = time.perf_counter()
+                self.waits += 1
+                self.waiting += 1
+                while self.total - self.in_use < self.min_per_job:
+                    self._cond.wait()
+                self.waiting -= 1
+                self.wait_seconds += time.perf_counter() - started
+            # 还在等待的任务也计入平分；先开始的任务占用了部分预算时只能用剩下的
+            threads = min(
+                self.share(self.active, pending + self.waiting),
+                self.total - self.in_use,
+            )
+            cpus = None
+            if self.pin:
+                # 选当前负载最低的几个核
+                cpus = sorted(self._cpu_load, key=self._cpu_load.get)[:threads]
+                for cpu in cpus:
+                    self._cpu_load[cpu] += 1
+            self.active += 1
+            self.in_use += threads
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.leases += 1
+            self.leased_threads += threads
+            return Lease(threads, cpus)
+
+    def release(self, lease):
+        with self._cond:
+            self.active -= 1
+            self.in_use -= lease.threads
+            for cpu in lease.cpus or ():
+                self._cpu_load[cpu] -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self):
+        lease = self.acquire()
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    def stats(self):
+        return {
+            "total": self.total,
+            "available": self.available,
+            "quota": self.quota,
+            "max_per_job": self.max_per_job,
+            "pin": self.pin,
+            "in_use": self.in_use,
+            "active": self.active,
+            "leases": self.leases,
+            "mean_threads": self.leased_threads / self.leases if self.leases else 0.0,
+            "max_in_use": self.max_in_use,
+            "waits": self.waits,
+            "wait_seconds": self.wait_seconds,
+        }
+
+
+def run_pinned(cmd, cpus=None, input=None, timeout=None, **kwargs):
+    """与 subprocess.run 相同，cpus 不为空时在子进程启动后把它绑定到这些核上
+
+    whisper的计算线程在模型加载后才创建，会继承主线程的亲和性
+    """
+    if not cpus:
+        return subprocess.run(cmd, input=input, timeout=timeout, **kwargs)
+    if kwargs.pop("capture_output", False):
+        kwargs["stdout"] = kwargs["stderr"] = subprocess.PIPE
+    with subprocess.Popen(
+        cmd, stdin=subprocess.PIPE if input is not None else None, **kwargs
+    ) as process:
+        try:
+            os.sched_setaffinity(process.pid, cpus)
+        except OSError:
+            pass  # 进程已经退出，或核不在本进程的亲和性范围内
+        try:
+            stdout, stderr = process.communicate(input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+        return subprocess.CompletedProcess(
+            process.args, process.returncode, stdout, stderr
+        )
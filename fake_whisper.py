@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+whisper-cli / whisper-server 的替身程序
+不依赖真实的whisper.cpp，用固定的延迟模拟模型加载和推理，
+便于在没有模型和二进制文件的机器上测试协议和延迟
+
+用法:
+    python fake_whisper.py -m model.bin -f audio.wav --output-json   # 模拟 whisper-cli
+    python fake_whisper.py --server -m model.bin --port 8080         # 模拟 whisper-server
+
+环境变量:
+    FAKE_WHISPER_LOAD_DELAY  模拟模型加载耗时（秒），默认 0.3
+    FAKE_WHISPER_RTF         每秒音频的推理耗时（秒），默认 0.05
+    FAKE_WHISPER_DETECT      --language auto 时语种识别的耗时（秒），默认 0.05
+    FAKE_WHISPER_LANGUAGE    语种识别的结果，默认 en
+
+两个耗时都按模型文件名中的模型大小缩放，推理耗时还按 -t 线程数缩放（以4线程为基准）
+"""
+
+import email.parser
+import io
+import json
+import os
+import sys
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+LOAD_DELAY = float(os.environ.get("FAKE_WHISPER_LOAD_DELAY", "0.3"))
+RTF = float(os.environ.get("FAKE_WHISPER_RTF", "0.05"))
+DETECT_DELAY = float(os.environ.get("FAKE_WHISPER_DETECT", "0.05"))
+LANGUAGE = os.environ.get("FAKE_WHISPER_LANGUAGE", "en")
+# whisper-server 的结果中语言用全称
+LANGUAGE_NAMES = {"en": "english", "zh": "chinese", "ja": "japanese", "de": "german"}
+
+# 相对small模型的耗时系数，按模型文件名匹配（例如 ggml-base.bin）
+MODEL_COST = {"tiny": 0.15, "base": 0.3, "small": 1.0, "medium": 3.0, "large": 6.0}
+# 推理中可并行的比例（Amdahl定律）
+PARALLEL_FRACTION = 0.8
+
+
+def model_cost(model_path):
+    name = os.path.basename(model_path or "")
+    for size, cost in MODEL_COST.items():
+        if f"-{size}" in name:
+            return cost
+    return 1.0
+
+
+def thread_cost(threads):
+    """相对4线程的推理耗时系数"""
+
+    def serial_time(n):
+        return (1 - PARALLEL_FRACTION) + PARALLEL_FRACTION / max(1, n)
+
+    return serial_time(threads) / serial_time(4)
+
+
+def parse_cost(argv):
+    """从 -m/-t 参数得到 (加载耗时系数, 推理耗时系数)"""
+    model, threads = None, 4
+    for i, arg in enumerate(argv[:-1]):
+        if arg in ("-m", "--model"):
+            model = argv[i + 1]
+        elif arg in ("-t", "--threads"):
+            threads = int(argv[i + 1])
+    return model_cost(model), model_cost(model) * thread_cost(threads)
+
+
+def read_wav(data):
+    """读取WAV字节，返回 (样本, 采样率)"""
+    with wave.open(io.BytesIO(data), "rb") as wav_file:
+        frames = wav_file.readframes(wav_file.getnframes())
+        rate = wav_file.getframerate()
+    return memoryview(frames).cast("h"), rate
+
+
+def mean_level(samples):
+    # 只用标准库计算幅度，替身程序不依赖numpy
+    sub = samples[::16]
+    return sum(abs(s) for s in sub) / max(1, len(sub))
+
+
+def fake_transcribe(data, scale=1.0):
+    """按音频时长模拟推理，返回 (时长, 确定性的文本, 带时间戳的分段)
+
+    分段为每秒一段，文本由该秒三等分的幅度决定，同一段音频总得到相同的分段，
+    便于测试流式字幕的前缀确认
+    """
+    samples, rate = read_wav(data)
+    duration = len(samples) / rate
+    time.sleep(RTF * scale * duration)
+    if mean_level(samples) < 30:
+        return duration, "", []
+
+    segments = []
+    for start in range(0, len(samples), rate):
+        chunk = samples[start : start + rate]
+        if mean_level(chunk) < 30:
+            continue
+        third = max(1, len(chunk) // 3)
+        words = [
+            f"w{int(mean_level(chunk[i : i + third])) // 50}"
+            for i in range(0, third * 3, third)
+        ]
+        segments.append((start / rate, (start + len(chunk)) / rate, " ".join(words)))
+    return duration, f"fake transcription of {duration:.2f} seconds", segments
+
+
+def detect_language(scale=1.0):
+    """模拟语种识别: 与片段长短无关，多一次编码器计算；返回 (语言, 置信度)"""
+    time.sleep(DETECT_DELAY * scale)
+    return LANGUAGE, 0.93
+
+
+def format_timestamp(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, rest = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{rest:06.3f}"
+
+
+# ---- whisper-cli 模式 ----
+
+
+def run_cli(argv):
+    inputs = []
+    output_files = []
+    output_json = False
+    no_timestamps = False
+    language = "en"
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg in ("-f", "--file"):
+            inputs.append(argv[i + 1])
+            i += 1
+        elif arg in ("-of", "--output-file"):
+            output_files.append(argv[i + 1])
+            i += 1
+        elif arg in ("-oj", "--output-json"):
+            output_json = True
+        elif arg in ("-nt", "--no-timestamps"):
+            no_timestamps = True
+        elif arg in ("-l", "--language"):
+            language = argv[i + 1]
+            i += 1
+        elif arg in ("-m", "--model", "-t", "--threads"):
+            i += 1
+        i += 1
+
+    started = time.time()
+    load_scale, scale = parse_cost(argv)
+    time.sleep(LOAD_DELAY * load_scale)
+    load_time = time.time() - started
+
+    for index, path in enumerate(inputs):
+        data = sys.stdin.buffer.read() if path == "-" else open(path, "rb").read()
+        if language == "auto":
+            # 与whisper-cli一致: 语种识别结果写到标准错误
+            detected, probability = detect_language(scale)
+            print(
+                f"whisper_full_with_state: auto-detected language: {detected} (p = {probability:f})",
+                file=sys.stderr,
+            )
+        duration, text, segments = fake_transcribe(data, scale)
+        # 与whisper-cli一致: JSON写到 <output-file 或 输入文件>.json
+        output = output_files[index] if index < len(output_files) else path
+        if output_json and output != "-":
+            with open(output + ".json", "w") as f:
+                json.dump({"transcription": [{"text": text}]}, f)
+        if no_timestamps:
+            print(text)
+        else:
+            for start, end, segment_text in segments:
+                print(
+                    f"[{format_timestamp(start)} --> {format_timestamp(end)}]  {segment_text}"
+                )
+
+    # 与whisper-cli一致: 耗时统计写到标准错误
+    print(
+        f"whisper_print_timings:     load time = {load_time * 1000:8.2f} ms",
+        file=sys.stderr,
+    )
+    print(
+        f"whisper_print_timings:    total time = {(time.time() - started) * 1000:8.2f} ms",
+        file=sys.stderr,
+    )
+    return 0
+
+
+# ---- whisper-server 模式 ----
+
+
+class FakeServerHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/inference":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + raw
+        )
+        audio = None
+        response_format = "json"
+        language = "en"
+        for part in message.get_payload():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                audio = part.get_payload(decode=True)
+            elif name == "response_format":
+                response_format = part.get_payload(decode=True).decode().strip()
+            elif name == "language":
+                language = part.get_payload(decode=True).decode().strip()
+        if audio is None:
+            self._send_json(400, {"error": "no file field"})
+            return
+        detected = {}
+        if language == "auto":
+            code, probability = detect_language(self.server.cost_scale)
+            language = LANGUAGE_NAMES.get(code, code)
+            detected = {
+                "detected_language": language,
+                "detected_language_probability": probability,
+            }
+        duration, text, segments = fake_transcribe(audio, self.server.cost_scale)
+        if response_format == "verbose_json":
+            self._send_json(
+                200,
+                {
+                    "text": text,
+                    "language": LANGUAGE_NAMES.get(language, language),
+                    **detected,
+                    "duration": duration,
+                    "segments": [
+                        {"id": i, "start": start, "end": end, "text": segment_text}
+                        for i, (start, end, segment_text) in enumerate(segments)
+                    ],
+                },
+            )
+        else:
+            self._send_json(200, {"text": text})
+
+
+def run_server(argv):
+    host, port = "127.0.0.1", 8080
+    for i, arg in enumerate(argv):
+        if arg == "--host":
+            host = argv[i + 1]
+        elif arg == "--port":
+            port = int(argv[i + 1])
+
+    load_scale, scale = parse_cost(argv)
+    time.sleep(LOAD_DELAY * load_scale)
+    server = HTTPServer((host, port), FakeServerHandler)
+    server.cost_scale = scale
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main():
+    argv = sys.argv[1:]
+    if "--server" in argv:
+        return run_server([a for a in argv if a != "--server"])
+    return run_cli(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
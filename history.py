@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+转录历史
+内存中只保留最近的若干条记录（__slots__ 对象 + 时间列的环形数组），
+统计量随写入增量更新，不需要在退出时扫描全部历史；
+可选的磁盘日志（按大小轮转的JSONL，或带全文索引的SQLite）保存完整历史，支持按时间和关键字查询
+"""
+
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+class CaptionRecord:
+    """一条字幕；time 为输出时的Unix时间"""
+
+    __slots__ = (
+        "segment_id",
+        "time",
+        "source",
+        "text",
+        "duration",
+        "processing_time",
+        "model",
+    )
+
+    def __init__(
+        self,
+        segment_id,
+        time,
+        source,
+        text,
+        duration,
+        processing_time,
+        model=None,
+    ):
+        self.segment_id = segment_id
+        self.time = time
+        self.source = source
+        self.text = text
+        self.duration = duration
+        self.processing_time = processing_time
+        self.model = model
+
+    @classmethod
+    def from_result(cls, result):
+        """线程池的转录结果（dict）"""
+        return cls(
+            result["segment_id"],
+            result.get("time") or time.time(),
+            result.get("source"),
+            result["transcription"],
+            result["duration"],
+            result["processing_time"],
+            result.get("model"),
+        )
+
+    @classmethod
+    def from_event(cls, event):
+        """字幕分发的 final 事件（流式或非流式）"""
+        duration = event.get("duration")
+        if duration is None:
+            duration = event["end"] - event["start"]
+        processing = event.get("processing_time")
+        if processing is None:
+            processing = event.get("latency") or 0.0
+        return cls(
+            event.get("segment_id", event.get("utterance")),
+            event.get("published") or time.time(),
+            event.get("source"),
+            event["text"],
+            duration,
+            processing,
+            event.get("model"),
+        )
+
+    @property
+    def clock(self):
+        """显示用的本地时间 HH:MM:SS，只在需要时格式化"""
+        return time.strftime("%H:%M:%S", time.localtime(self.time))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class RunningStats:
+    """O(1) 更新的计数/总和/最值/均值/标准差（Welford算法）"""
+
+    __slots__ = ("count", "total", "min", "max", "_mean", "_m2")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+
+    @property
+    def mean(self):
+        return self._mean if self.count else 0.0
+
+    @property
+    def stdev(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.mean,
+            "stdev": self.stdev,
+            "min": self.min if self.count else 0.0,
+            "max": self.max if self.count else 0.0,
+        }
+
+
+class HistoryStore:
+    """有界的内存历史: 最近 capacity 条记录 + 全部记录的累计统计
+
+    log 为可选的磁盘日志（JsonlLog / SqliteLog），deep=True 的查询会用它查到更早的记录
+    """
+
+    def __init__(self, capacity=10000, log=None):
+        self.capacity = max(1, capacity)
+        self.log = log
+        self._records = [None] * self.capacity
+        self._times = np.full(self.capacity, np.nan)
+        self._written = 0  # 累计写入条数，环形位置为 _written % capacity
+        self._lock = threading.Lock()
+
+        # 累计统计（包括已被挤出内存的记录）
+        self.duration = RunningStats()
+        self.processing = RunningStats()
+        self.sources = {}  # 来源 -> 条数
+
+    def __len__(self):
+        return min(self._written, self.capacity)
+
+    @property
+    def total(self):
+        return self._written
+
+    def append(self, record):
+        with self._lock:
+            slot = self._written % self.capacity
+            self._records[slot] = record
+            self._times[slot] = record.time
+            self._written += 1
+            self.duration.add(record.duration)
+            self.processing.add(record.processing_time)
+            self.sources[record.source] = self.sources.get(record.source, 0) + 1
+        return record
+
+    def records(self):
+        """内存中的全部记录，按写入顺序（从旧到新）"""
+        with self._lock:
+            if self._written <= self.capacity:
+                return self._records[: self._written]
+            slot = self._written % self.capacity
+            return self._records[slot:] + self._records[:slot]
+
+    def recent(self, count=10):
+        return self.records()[-count:]
+
+    def between(self, start, end=None, deep=False):
+        """start <= time < end 的记录（Unix时间），按时间排序
+
+        内存中的记录用时间列向量化筛选；deep=True 且范围早于内存中最旧的记录时查询磁盘日志
+        """
+        end = math.inf if end is None else end
+        with self._lock:
+            indexes = np.flatnonzero((self._times >= start) & (self._times < end))
+            found = sorted(
+                (self._records[i] for i in indexes), key=lambda record: record.time
+            )
+            oldest = np.nanmin(self._times) if self._written else math.inf
+        if deep and self.log is not None and start < oldest:
+            older = self.log.between(start, min(end, oldest))
+            found = older + found
+        return found
+
+    def search(self, query, limit=50, source=None, deep=False):
+        """不区分大小写的全文查找，返回最新的 limit 条匹配
+
+        deep=True 时查询磁盘日志（SQLite使用FTS5索引），可以查到已被挤出内存的记录
+        """
+        if deep and self.log is not None:
+            return self.log.search(query, limit, source)
+        needle = query.lower()
+        matches = []
+        for record in reversed(self.records()):
+            if source is not None and record.source != source:
+                continue
+            if needle in record.text.lower():
+                matches.append(record)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def stats(self):
+        return {
+            "total": self._written,
+            "in_memory": len(self),
+            "capacity": self.capacity,
+            "duration": self.duration.snapshot(),
+            "processing_time": self.processing.snapshot(),
+            "sources": dict(self.sources),
+        }
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+
+
+class JsonlLog:
+    """追加写入的JSONL日志，超过 rotate_bytes 时轮转为 path.1、path.2 …（最多保留 backups 个）"""
+
+    def __init__(self, path, rotate_bytes=64 << 20, backups=5):
+        self.path = path
+        self.rotate_bytes = rotate_bytes
+        self.backups = backups
+        self.rotations = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def write(self, record):
+        line = json.dumps(record.to_dict(), ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._size and self._size + len(line) > self.rotate_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line.encode())
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = 0
+        self.rotations += 1
+
+    def files(self):
+        """所有日志文件，从旧到新"""
+        older = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)]
+        return [path for path in older + [self.path] if os.path.exists(path)]
+
+    def _scan(self, paths):
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield CaptionRecord(**json.loads(line))
+                    except (ValueError, TypeError):
+                        continue
+
+    def between(self, start, end):
+        with self._lock:
+            self._file.flush()
+        return sorted(
+            (r for r in self._scan(self.files()) if start <= r.time < end),
+            key=lambda record: record.time,
+        )
+
+    def search(self, query, limit=50, source=None):
+        needle = query.lower()
+        with self._lock:
+            self._file.flush()
+        matches = [
+            r
+            for r in self._scan(self.files())
+            if needle in r.text.lower() and (source is None or r.source == source)
+        ]
+        return matches[::-1][:limit]
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+# 查询中含有这些字符时不走FTS，避免被当作FTS语法
+FTS_SYNTAX = re.compile(r'["*^:(){}+\-]')
+
+
+class SqliteLog:
+    """SQLite日志: 时间索引 + FTS5全文索引（SQLite未编译FTS5时退化为LIKE查询）
+
+    全文索引用trigram分词，中文等不以空格分词的文本也能按任意子串查找；
+    trigram至少要3个字符，更短的查询和含FTS语法字符的查询用LIKE
+    """
+
+    COLUMNS = CaptionRecord.__slots__
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS captions ("
+            "id INTEGER PRIMARY KEY, segment_id INTEGER, time REAL, source TEXT, "
+            "text TEXT, duration REAL, processing_time REAL, model TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS captions_time ON captions(time)")
+        try:
+            self._create_fts()
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        self._db.commit()
+
+    def _create_fts(self):
+        """创建trigram全文索引；旧版本用默认分词建的索引删掉后从captions表重建"""
+        row = self._db.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'captions_fts'"
+        ).fetchone()
+        if row is not None and "trigram" in row[0]:
+            return
+        if row is not None:
+            self._db.execute("DROP TABLE captions_fts")
+        self._db.execute(
+            "CREATE VIRTUAL TABLE captions_fts USING fts5("
+            "text, content='captions', content_rowid='id', tokenize='trigram')"
+        )
+        if row is not None:
+            self._db.execute(
+                "INSERT INTO captions_fts (captions_fts) VALUES ('rebuild')"
+            )
+
+    def write(self, record):
+        values = [getattr(record, name) for name in self.COLUMNS]
+        with self._lock:
+            cursor = self._db.execute(
+                f"INSERT INTO captions ({', '.join(self.COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                values,
+            )
+            if self.fts:
+                self._db.execute(
+                    "INSERT INTO captions_fts (rowid, text) VALUES (?, ?)",
+                    (cursor.lastrowid, record.text),
+                )
+            self._db.commit()
+
+    def _records(self, sql, params):
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [CaptionRecord(*row) for row in rows]
+
+    def between(self, start, end):
+        columns = ", ".join(self.COLUMNS)
+        return self._records(
+            f"SELECT {columns} FROM captions WHERE time >= ? AND time < ? ORDER BY time",
+            (start, end if end != math.inf else 1e18),
+        )
+
+    def search(self, query, limit=50, source=None):
+        columns = ", ".join(f"c.{name}" for name in self.COLUMNS)
+        filters, params = "", []
+        if source is not None:
+            filters, params = " AND c.source = ?", [source]
+        if self.fts and len(query) >= 3 and not FTS_SYNTAX.search(query):
+            # trigram索引按子串匹配，查询作为一个短语
+            return self._records(
+                f"SELECT {columns} FROM captions_fts f JOIN captions c ON c.id = f.rowid "
+                f"WHERE captions_fts MATCH ?{filters} ORDER BY c.id DESC LIMIT ?",
+                [f'"{query}"', *params, limit],
+            )
+        pattern = re.sub(r"([\\%_])", r"\\\1", query)
+        return self._records(
+            f"SELECT {columns} FROM captions c WHERE c.text LIKE ? ESCAPE '\\'{filters} "
+            "ORDER BY c.id DESC LIMIT ?",
+            [f"%{pattern}%", *params, limit],
+        )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def open_log(path, rotate_mb=64, backups=5):
+    """按扩展名选择日志格式: .db/.sqlite 为SQLite，其他为JSONL"""
+    if path.endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteLog(path)
+    return JsonlLog(path, rotate_bytes=int(rotate_mb * (1 << 20)), backups=backups)
+
+
+def main():
+    """查询磁盘历史日志: python history.py captions.db --search 关键字 --since 3600"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="查询转录历史日志")
+    parser.add_argument("log", help="--history-log 写出的日志文件（.jsonl 或 .db）")
+    parser.add_argument("--search", default=None, help="全文查找的关键字")
+    parser.add_argument("--source", default=None, help="只看某个来源")
+    parser.add_argument(
+        "--since", type=float, default=None, help="只看最近多少秒内的字幕"
+    )
+    parser.add_argument("--limit", type=int, default=50, help="最多显示条数 (默认 50)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        parser.error(f"日志文件不存在: {args.log}")
+    log = open_log(args.log)
+    try:
+        if args.search:
+            records = log.search(args.search, args.limit, args.source)[::-1]
+        else:
+            start = time.time() - args.since if args.since is not None else 0.0
+            records = [
+                r
+                for r in log.between(start, math.inf)
+                if args.source is None or r.source == args.source
+            ][-args.limit :]
+        if args.search and args.since is not None:
+            records = [r for r in records if r.time >= time.time() - args.since]
+    finally:
+        log.close()
+    for record in records:
+        source = f"[{record.source}] " if record.source else ""
+        print(f"{record.clock} {source}{record.text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+会话级语言跟踪
+--language auto 时whisper对每个片段都先做一次语种识别，1-3秒的短片段既多花一次计算，
+又容易在对话中途判成别的语言。这里按采集通道（会话）跟踪语言: 前几个置信的片段投票确定语言后
+固定下来，之后的片段直接指定语言；每隔若干片段或连续出现空结果时再检测一次
+"""
+
+import threading
+from collections import Counter
+
+AUTO = "auto"
+
+
+class SessionLanguage:
+    """一路采集的语言状态"""
+
+    __slots__ = (
+        "language",
+        "fixed",
+        "checking",
+        "votes",
+        "attempts",
+        "probability",
+        "since_check",
+        "misses",
+        "detections",
+        "pinned",
+        "rechecks",
+        "switches",
+    )
+
+    def __init__(self):
+        self.language = None  # 固定下来的语言，None 表示还在检测
+        self.fixed = False  # 由会话指定，不做检测
+        self.checking = False  # 固定语言后的重新检测
+        self.votes = Counter()  # 本轮检测中置信的结果
+        self.attempts = 0  # 本轮检测已识别的片段数
+        self.probability = None  # 最近一次检测的置信度
+        self.since_check = 0  # 固定语言后识别的片段数
+        self.misses = 0  # 固定语言后连续的空结果数
+        self.detections = 0  # 带语种识别的片段数
+        self.pinned = 0  # 直接指定语言识别的片段数
+        self.rechecks = 0  # 重新检测的次数
+        self.switches = 0  # 重新检测后换了语言的次数
+
+    @property
+    def detecting(self):
+        return not self.fixed and (self.language is None or self.checking)
+
+    def stats(self):
+        return {
+            "language": self.language,
+            "fixed": self.fixed,
+            "detecting": self.detecting,
+            "probability": self.probability,
+            "detections": self.detections,
+            "pinned": self.pinned,
+            "rechecks": self.rechecks,
+            "switches": self.switches,
+        }
+
+
+class LanguageTracker:
+    """按会话固定识别语言
+
+    - 检测: 每个片段用 auto 识别，置信度不低于 min_probability 的结果计一票，
+      攒够 detect_segments 票后取票数最多的语言（平票时保留原来的语言）；
+      max_attempts 个片段后仍不够票时用已有的票，一票都没有就继续检测
+    - 重新检测: 固定后每 recheck_every 个片段，或连续 miss_limit 个片段识别为空时，
+      下一个片段重新用 auto；第一票与原语言相同就直接确认，否则重新投票
+    """
+
+    def __init__(
+        self,
+        detect_segments=3,
+        min_probability=0.5,
+        recheck_every=30,
+        miss_limit=3,
+        max_attempts=None,
+    ):
+        self.detect_segments = detect_segments
+        self.min_probability = min_probability
+        self.recheck_every = recheck_every
+        self.miss_limit = miss_limit
+        self.max_attempts = max_attempts or detect_segments * 3
+        self._sessions = {}  # 采集通道 -> SessionLanguage
+        self._lock = threading.Lock()  # 多个转录线程同时读写
+
+    def _session(self, key):
+        state = self._sessions.get(key)
+        if state is None:
+            state = self._sessions[key] = SessionLanguage()
+        return state
+
+    def language_for(self, key=None):
+        """这一路下一个片段使用的语言: 固定的语言，或检测中的 auto"""
+        with self._lock:
+            state = self._session(key)
+            return AUTO if state.detecting else state.language
+
+    def fix(self, key, language):
+        """会话指定了语言: 直接使用，不再检测"""
+        with self._lock:
+            state = self._session(key)
+            state.language = language
+            state.fixed = True
+
+    def observe(self, key, requested, detected=None, probability=None, text=None):
+        """记录一次识别的结果；requested 为这次使用的语言，detected/probability 为语种识别结果
+
+        后端没有返回置信度时（probability 为None）视为置信
+        """
+        with self._lock:
+            state = self._session(key)
+            if state.fixed:
+                return
+            if requested == AUTO:
+                self._vote(state, detected, probability)
+            elif requested == state.language:
+                self._track(state, text)
+
+    def _vote(self, state, detected, probability):
+        if not state.detecting:
+            # 检测结束后才返回的结果（几个线程同时在识别），不再计票
+            return
+        state.attempts += 1
+        if detected:
+            state.detections += 1
+            state.probability = probability
+            if probability is None or probability >= self.min_probability:
+                state.votes[detected] += 1
+        if state.language is not None and state.votes[state.language]:
+            # 重新检测: 与原语言一致就确认
+            self._settle(state, state.language)
+            return
+        if sum(state.votes.values()) >= self.detect_segments or (
+            state.attempts >= self.max_attempts and state.votes
+        ):
+            ranked = state.votes.most_common()
+            best = ranked[0][0]
+            if state.language in state.votes and (
+                state.votes[state.language] == ranked[0][1]
+            ):
+                best = state.language
+            self._settle(state, best)
+
+    def _settle(self, state, language):
+        if state.language is not None and language != state.language:
+            state.switches += 1
+        state.language = language
+        state.checking = False
+        state.votes.clear()
+        state.attempts = 0
+        state.since_check = 0
+        state.misses = 0
+
+    def _track(self, state, text):
+        state.pinned += 1
+        if state.checking:
+            return
+        state.since_check += 1
+        state.misses = 0 if text else state.misses + 1
+        if (self.recheck_every and state.since_check >= self.recheck_every) or (
+            self.miss_limit and state.misses >= self.miss_limit
+        ):
+            state.rechecks += 1
+            state.checking = True
+
+    def forget(self, key):
+        """会话结束后丢弃它的状态"""
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def session_stats(self, key):
+        with self._lock:
+            state = self._sessions.get(key)
+            return state.stats() if state is not None else None
+
+    def stats(self):
+        with self._lock:
+            sessions = {key: state.stats() for key, state in self._sessions.items()}
+        return {
+            "sessions": sessions,
+            "detections": sum(s["detections"] for s in sessions.values()),
+            "pinned": sum(s["pinned"] for s in sessions.values()),
+            "rechecks": sum(s["rechecks"] for s in sessions.values()),
+            "switches": sum(s["switches"] for s in sessions.values()),
+        }
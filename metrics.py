@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+运行时指标
+各处理阶段的命名计时器、计数器和队列深度等仪表，
+通过本地HTTP端点导出为Prometheus文本或JSON，并支持按需采集cProfile和线程栈
+"""
+
+import cProfile
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import deque
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+QUANTILES = (0.5, 0.9, 0.99)
+# /profile 最多分析的秒数
+MAX_PROFILE_SECONDS = 3600
+
+
+class Timer:
+    """单个阶段的耗时统计: 总次数/总耗时/最大值 + 最近样本（用于分位数）"""
+
+    def __init__(self, name, reservoir=1024):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=reservoir)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+            self._recent.append(seconds)
+
+    def time(self):
+        """上下文管理器形式: with timer.time(): ..."""
+        return _TimerContext(self)
+
+    def snapshot(self):
+        with self._lock:
+            recent = np.array(self._recent)
+            result = {"count": self.count, "sum": self.total, "max": self.max}
+        for q in QUANTILES:
+            result[f"p{int(q * 100)}"] = (
+                float(np.quantile(recent, q)) if len(recent) else 0.0
+            )
+        return result
+
+
+class _TimerContext:
+    __slots__ = ("timer", "start")
+
+    def __init__(self, timer):
+        self.timer = timer
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.observe(time.perf_counter() - self.start)
+
+
+class Counter:
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Metrics:
+    """指标注册表；计时器和计数器按名称懒创建，仪表通过回调函数读取当前值"""
+
+    def __init__(self, prefix="captions"):
+        self.prefix = prefix
+        self.started = time.time()
+        self.timers = {}
+        self.counters = {}
+        self.gauges = {}  # 名称 -> (回调, 说明, 类型)
+        self._lock = threading.Lock()
+
+    def timer(self, name):
+        with self._lock:
+            if name not in self.timers:
+                self.timers[name] = Timer(name)
+            return self.timers[name]
+
+    def counter(self, name):
+        with self._lock:
+            if name not in self.counters:
+                self.counters[name] = Counter(name)
+            return self.counters[name]
+
+    def observe(self, name, seconds):
+        self.timer(name).observe(seconds)
+
+    def inc(self, name, amount=1):
+        self.counter(name).inc(amount)
+
+    def gauge(self, name, fn, help="", kind="gauge"):
+        """注册一个仪表，fn() 返回当前数值；kind="counter" 表示由其他模块维护的累计值"""
+        self.gauges[name] = (fn, help, kind)
+
+    def _gauge_values(self):
+        values = {}
+        for name, (fn, _, _) in list(self.gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            if value is not None:
+                values[name] = float(value)
+        return values
+
+    def snapshot(self):
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "stages": {
+                name: timer.snapshot() for name, timer in list(self.timers.items())
+            },
+            "counters": {
+                name: counter.value for name, counter in list(self.counters.items())
+            },
+            "gauges": self._gauge_values(),
+        }
+
+    def prometheus_text(self):
+        """Prometheus文本格式（0.0.4）"""
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_seconds 各处理阶段耗时",
+            f"# TYPE {p}_stage_seconds summary",
+        ]
+        for name, timer in list(self.timers.items()):
+            snap = timer.snapshot()
+            for q in QUANTILES:
+                lines.append(
+                    f'{p}_stage_seconds{{stage="{name}",quantile="{q}"}} '
+                    f'{snap[f"p{int(q * 100)}"]:.6f}'
+                )
+            lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {snap["sum"]:.6f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {snap["count"]}')
+        for name, counter in list(self.counters.items()):
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines.append(f"{p}_{name}_total {counter.value}")
+        gauge_values = self._gauge_values()
+        for name, (_, help, kind) in list(self.gauges.items()):
+            if name not in gauge_values:
+                continue
+            metric = f"{p}_{name}_total" if kind == "counter" else f"{p}_{name}"
+            if help:
+                lines.append(f"# HELP {metric} {help}")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {gauge_values[name]:g}")
+        return "\n".join(lines) + "\n"
+
+
+class ProfileTrigger:
+    """按需采集cProfile
+
+    cProfile只能分析启用它的线程，所以由处理音频的线程定期调用 tick()，
+    在该线程内开始和结束分析，结果写入pstats文件: 本地采集时是第一路采集循环（每块一次），
+    --serve 时是网络会话所在的事件循环（定时调用，没有会话时也能按时结束）
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or tempfile.gettempdir()
+        self.last_path = None
+        self._pending = None  # (秒数, 输出路径)
+        self._profile = None
+        self._path = None
+        self._deadline = 0.0
+
+    @property
+    def active(self):
+        return self._profile is not None
+
+    def request(self, seconds):
+        """请求分析接下来的若干秒，返回将要写入的文件路径"""
+        path = os.path.join(
+            self.directory, f"captions-{time.strftime('%Y%m%d-%H%M%S')}.prof"
+        )
+        self._pending = (seconds, path)
+        return path
+
+    def tick(self):
+        if self._pending is not None and self._profile is None:
+            seconds, self._path = self._pending
+            self._pending = None
+            self._deadline = time.monotonic() + seconds
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self._profile is not None and time.monotonic() >= self._deadline:
+            self.finish()
+
+    def finish(self):
+        if self._profile is None:
+            return
+        self._profile.disable()
+        self._profile.dump_stats(self._path)
+        self.last_path = self._path
+        self._profile = None
+
+
+def thread_stacks():
+    """所有线程当前调用栈的文本快照"""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    chunks = []
+    for ident, frame in sys._current_frames().items():
+        chunks.append(f"--- {names.get(ident, ident)} ---\n")
+        chunks.extend(traceback.format_stack(frame))
+    return "".join(chunks)
+
+
+class MetricsServer:
+    """本地HTTP端点
+
+    GET /metrics           Prometheus文本
+    GET /metrics.json      JSON
+    GET /profile?seconds=N 在采集主循环（--serve 时为事件循环）中运行cProfile N秒，返回输出文件路径
+    GET /stacks            所有线程的调用栈
+    GET /events            字幕事件的SSE流（需要 hub），可用 ?types=final&source=名称 过滤
+    """
+
+    def __init__(self, metrics, host="127.0.0.1", port=9108, profiler=None, hub=None):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.profiler = profiler
+        self.hub = hub
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        # 只有开启指标端点时才需要 http.server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                body = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream_events(self, query):
+                """每个SSE连接一个合并部分结果的订阅，客户端读得慢只会丢掉它自己的事件"""
+                types = set(",".join(query.get("types", [])).split(",")) - {""}
+                source = query.get("source", [None])[0]
+                subscriber = owner.hub.subscribe(
+                    name=f"sse:{self.client_address[0]}:{self.client_address[1]}",
+                    policy="coalesce",
+                    filter=lambda event: (not types or event.get("type") in types)
+                    and (source is None or event.get("source") == source),
+                )
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                try:
+                    while not subscriber.closed:
+                        event = subscriber.get(timeout=15.0)
+                        if event is None:
+                            chunk = ": keepalive\n\n"
+                        else:
+                            data = json.dumps(event, ensure_ascii=False)
+                            chunk = f"event: {event.get('type')}\ndata: {data}\n\n"
+                        self.wfile.write(chunk.encode())
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    owner.hub.unsubscribe(subscriber)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/metrics":
+                    self._send(
+                        200,
+                        owner.metrics.prometheus_text(),
+                        "text/plain; version=0.0.4",
+                    )
+                elif url.path == "/metrics.json":
+                    self._send(
+                        200, json.dumps(owner.metrics.snapshot()), "application/json"
+                    )
+                elif url.path == "/profile" and owner.profiler is not None:
+                    query = parse_qs(url.query)
+                    try:
+                        seconds = float(query.get("seconds", ["10"])[0])
+                    except ValueError:
+                        seconds = math.nan
+                    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+                        self._send(
+                            400,
+                            json.dumps(
+                                {
+                                    "error": f"seconds 必须是 0-{MAX_PROFILE_SECONDS} 之间的秒数"
+                                },
+                                ensure_ascii=False,
+                            ),
+                            "application/json",
+                        )
+                        return
+                    path = owner.profiler.request(seconds)
+                    self._send(202, json.dumps({"path": path}), "application/json")
+                elif url.path == "/stacks":
+                    self._send(200, thread_stacks(), "text/plain")
+                elif url.path == "/events" and owner.hub is not None:
+                    self._stream_events(parse_qs(url.query))
+                else:
+                    self._send(404, "not found\n", "text/plain")
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+离线转录
+整段音频先做一遍VAD，在静音处切成长块，多个进程并行调用whisper-cli，
+结果按块顺序合并，比实时播放快得多
+"""
+
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from audio_utils import pcm_to_wav_bytes
+from whisper_worker import parse_whisper_stdout
+
+
+def speech_flags(pcm, vad):
+    """逐帧运行VAD，返回每帧是否为语音的布尔数组"""
+    frame_size = vad.frame_size
+    count = len(pcm) // frame_size
+    flags = np.zeros(count, dtype=bool)
+    for i in range(count):
+        flags[i] = vad.is_speech(pcm[i * frame_size : (i + 1) * frame_size])
+    return flags
+
+
+def silence_runs(flags, min_frames=1):
+    """返回长度不少于 min_frames 的静音段 (起始帧, 结束帧) 数组"""
+    padded = np.concatenate(([True], flags, [True])).astype(np.int8)
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == -1)
+    ends = np.flatnonzero(edges == 1)
+    keep = ends - starts >= min_frames
+    return np.stack((starts[keep], ends[keep]), axis=1)
+
+
+def split_at_silence(flags, frame_size, target_frames, min_gap_frames=5):
+    """在目标长度附近最长的静音段中点切块，返回 [(起始样本, 结束样本)]
+
+    目标长度的0.5~1.5倍范围内没有静音时才硬切；不含语音帧的块被丢弃
+    """
+    total = len(flags)
+    runs = silence_runs(flags, min_gap_frames)
+    midpoints = (runs[:, 0] + runs[:, 1]) // 2
+    lengths = runs[:, 1] - runs[:, 0]
+
+    bounds = []
+    position = 0
+    while total - position > target_frames * 1.5:
+        low, high = position + target_frames // 2, position + target_frames * 3 // 2
+        candidates = np.flatnonzero((midpoints > low) & (midpoints < high))
+        if len(candidates):
+            # 优先最长的静音，其次离目标长度最近
+            target = position + target_frames
+            best = max(
+                candidates, key=lambda i: (lengths[i], -abs(midpoints[i] - target))
+            )
+            cut = int(midpoints[best])
+        else:
+            cut = position + target_frames
+        bounds.append((position, cut))
+        position = cut
+    bounds.append((position, total))
+
+    return [
+        (start * frame_size, end * frame_size)
+        for start, end in bounds
+        if flags[start:end].any()
+    ]
+
+
+def transcribe_chunk(job):
+    """在工作进程中转录一块音频（WAV通过标准输入交给whisper-cli）"""
+    index, pcm, command, sample_rate, timeout = job
+    result = subprocess.run(
+        command,
+        input=pcm_to_wav_bytes(pcm, sample_rate),
+        capture_output=True,
+        timeout=timeout,
+    )
+    if result.returncode != 0:
+        return index, None
+    return index, parse_whisper_stdout(result.stdout.decode(errors="replace"))
+
+
+def run_offline(pcm, chunks, command, sample_rate, jobs=2, timeout=600):
+    """多进程并行转录所有块，按块顺序返回文本列表"""
+    results = [None] * len(chunks)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(
+                transcribe_chunk, (i, pcm[start:end], command, sample_rate, timeout)
+            )
+            for i, (start, end) in enumerate(chunks)
+        ]
+        for future in as_completed(futures):
+            index, text = future.result()
+            results[index] = text
+    return results
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+网络PCM接入服务的客户端和压测工具
+每个会话连接一次服务，按实时速度（或全速）推送音频，接收字幕事件，
+汇总各会话的字幕数、背压等待和收尾延迟，用于检查服务扩展到几百个会话时的表现
+
+用法:
+    python simple_transcriber.py --serve 9200 &
+    python pcm_client.py --port 9200 --input talk.wav --print        # 单个会话，打印字幕
+    python pcm_client.py --port 9200 --sessions 200 --seconds 30     # 200个合成语音会话
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+
+from audio_sources import FileSource, SyntheticSource
+from benchmark import percentiles
+from pcm_server import encode_frame
+
+
+async def run_session(
+    host,
+    port,
+    audio,
+    sample_rate=16000,
+    name=None,
+    chunk_seconds=0.1,
+    realtime=True,
+    on_event=None,
+):
+    """推送一段int16音频并接收字幕，返回该会话的统计"""
+    stats = {
+        "name": name,
+        "captions": 0,
+        "partials": 0,
+        "errors": [],
+        "send_wait": 0.0,  # writer.drain() 等待的总时间（服务端流控造成的背压）
+        "first_caption": None,
+        "finish_latency": None,  # 发送 E 帧到收到 end 事件
+        "end": None,
+    }
+    started = time.monotonic()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError as e:
+        stats["errors"].append(f"连接失败: {e}")
+        return stats
+
+    async def receive():
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            event = json.loads(line)
+            kind = event.get("type")
+            if on_event is not None:
+                on_event(name, event)
+            if kind in ("caption", "final"):
+                stats["captions"] += 1
+                if stats["first_caption"] is None:
+                    stats["first_caption"] = time.monotonic() - started
+            elif kind == "partial":
+                stats["partials"] += 1
+            elif kind == "error":
+                stats["errors"].append(event.get("error"))
+            elif kind == "end":
+                stats["end"] = event
+                return
+
+    receiver = asyncio.create_task(receive())
+    try:
+        hello = json.dumps({"sample_rate": sample_rate, "name": name}).encode()
+        writer.write(encode_frame(b"H", hello))
+        chunk = max(1, int(chunk_seconds * sample_rate))
+        for i in range(0, len(audio), chunk):
+            if receiver.done():
+                break
+            if realtime:
+                delay = started + i / sample_rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            writer.write(encode_frame(b"A", audio[i : i + chunk].tobytes()))
+            wait_start = time.monotonic()
+            await writer.drain()
+            stats["send_wait"] += time.monotonic() - wait_start
+        finished = time.monotonic()
+        writer.write(encode_frame(b"E"))
+        await writer.drain()
+        await receiver
+        if stats["end"] is not None:
+            stats["finish_latency"] = time.monotonic() - finished
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        stats["errors"].append(f"连接中断: {e}")
+        receiver.cancel()
+    finally:
+        writer.close()
+    stats["duration"] = time.monotonic() - started
+    return stats
+
+
+def load_audio(args):
+    """读取 --input 文件或生成合成语音，返回 (int16数组, 采样率)"""
+    if args.input:
+        source = FileSource(args.input)
+    else:
+        source = SyntheticSource(args.seconds, seed=args.seed)
+    with source:
+        blocks = [block.copy() for block in source.blocks(4096)]
+    audio = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+    return (np.clip(audio, -1, 1) * 32767).astype(np.int16), source.sample_rate
+
+
+async def run_load(args):
+    audio, sample_rate = load_audio(args)
+
+    def print_event(name, event):
+        if event.get("type") in ("caption", "final") and event.get("text"):
+            print(f"[{name}] {event['text']}")
+
+    async def start_session(i):
+        # 逐个错开启动，避免所有会话同时切出片段
+        await asyncio.sleep(i * args.ramp)
+        # 每个会话从音频的不同位置开始，负载更接近真实情况
+        offset = (i * sample_rate * 7) % max(1, len(audio)) if args.sessions > 1 else 0
+        return await run_session(
+            args.host,
+            args.port,
+            np.roll(audio, -offset),
+            sample_rate,
+            name=f"load-{i}",
+            chunk_seconds=args.chunk,
+            realtime=not args.fast,
+            on_event=print_event if args.print else None,
+        )
+
+    started = time.monotonic()
+    results = await asyncio.gather(*(start_session(i) for i in range(args.sessions)))
+    wall = time.monotonic() - started
+    return summarize(results, len(audio) / sample_rate, wall)
+
+
+def summarize(results, audio_seconds, wall):
+    completed = [r for r in results if r["end"] is not None and r["end"]["complete"]]
+    failed = [r for r in results if r["errors"]]
+    report = {
+        "sessions": len(results),
+        "completed": len(completed),
+        "failed": len(failed),
+        "audio_seconds": audio_seconds * len(results),
+        "wall_seconds": wall,
+        "throughput": audio_seconds * len(results) / wall if wall else 0.0,
+        "captions": sum(r["captions"] for r in results),
+        "partials": sum(r["partials"] for r in results),
+        "server_stalls": sum(r["end"]["stalls"] for r in results if r["end"]),
+        "first_caption_ms": percentiles(
+            [r["first_caption"] for r in results if r["first_caption"] is not None]
+        ),
+        "finish_latency_ms": percentiles(
+            [r["finish_latency"] for r in results if r["finish_latency"] is not None]
+        ),
+        "send_wait_ms": percentiles([r["send_wait"] for r in results]),
+        "errors": sorted({e for r in failed for e in r["errors"]})[:10],
+    }
+    return report
+
+
+def print_report(report):
+    print(
+        f"会话 {report['sessions']}（完成 {report['completed']}，失败 {report['failed']}），"
+        f"音频 {report['audio_seconds']:.0f}s，用时 {report['wall_seconds']:.1f}s，"
+        f"吞吐 {report['throughput']:.1f}x 实时"
+    )
+    print(
+        f"字幕 {report['captions']} 条，部分结果 {report['partials']} 次，"
+        f"服务端流控暂停 {report['server_stalls']} 次"
+    )
+    for key, label in (
+        ("first_caption_ms", "首条字幕"),
+        ("finish_latency_ms", "收尾延迟"),
+        ("send_wait_ms", "发送背压"),
+    ):
+        stats = report[key]
+        if stats:
+            print(
+                f"{label}: p50 {stats['p50']:.0f}ms  p90 {stats['p90']:.0f}ms  "
+                f"p99 {stats['p99']:.0f}ms  max {stats['max']:.0f}ms"
+            )
+    for error in report["errors"]:
+        print(f"错误: {error}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="网络PCM接入服务的客户端/压测工具")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--sessions", type=int, default=1, help="并发会话数 (默认 1)")
+    parser.add_argument("--input", default=None, help="推送的音频文件（默认合成语音）")
+    parser.add_argument(
+        "--seconds", type=float, default=20.0, help="合成语音时长 (默认 20)"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--chunk", type=float, default=0.1, help="每个音频帧的时长（秒，默认 0.1）"
+    )
+    parser.add_argument(
+        "--ramp", type=float, default=0.01, help="相邻会话的启动间隔（秒，默认 0.01）"
+    )
+    parser.add_argument("--fast", action="store_true", help="全速推送，不按实时节流")
+    parser.add_argument("--print", action="store_true", help="打印收到的字幕")
+    parser.add_argument("--json", default=None, help="把结果写入JSON文件")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    report = asyncio.run(run_load(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
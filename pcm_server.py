@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+网络PCM接入服务
+asyncio TCP服务: 客户端推送分帧的PCM音频，每个连接一个会话（独立的重采样/VAD/分段状态），
+所有会话共用转录器的线程池和识别后端，字幕以JSON行发回客户端
+
+帧格式（客户端 → 服务端）: 1字节类型 + 4字节大端长度 + 负载
+    H  握手，JSON: {"sample_rate": 16000, "name": "...", "language": "en"}，必须是第一帧；
+       language 可省略，省略时按会话自动识别语种
+    A  s16le单声道PCM，长度任意
+    E  音频结束: 服务端输出剩余片段、等待所有字幕发出后关闭连接
+
+服务端 → 客户端: 每行一个JSON事件
+    ready / caption / failed / skipped / partial / final / error / end
+    skipped: {"segment_id": ..., "reason": "dropped" | "skipped" | "failed"}，
+    片段被溢出策略丢弃、因等待过久跳过或处理出错，不会再有它的字幕
+"""
+
+import asyncio
+import itertools
+import json
+import signal
+import struct
+import time
+
+from colorama import Fore, Style
+
+from audio_sources import CaptureSource, pcm_to_float
+
+FRAME_HEADER = struct.Struct(">cI")
+MAX_FRAME_BYTES = 1 << 20
+HELLO_TIMEOUT = 10.0
+PROFILE_TICK = 0.1  # 事件循环检查 /profile 请求的间隔（秒）
+
+# 客户端不读取时，发送缓冲区超过这个大小就丢弃部分结果（最终字幕总是发送）
+MAX_WRITE_BUFFER = 256 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(kind, payload=b""):
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+async def read_frame(reader):
+    """读取一帧，返回 (类型, 负载)；连接正常关闭时返回 (None, b"")"""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise ProtocolError("帧头不完整")
+        return None, b""
+    kind, length = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_BYTES:
+        raise ProtocolError(f"帧过大: {length} 字节")
+    try:
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise ProtocolError("帧数据不完整")
+    return kind, payload
+
+
+class NetworkSource(CaptureSource):
+    """网络会话的采集源；音频由服务端逐帧推入，不通过 blocks() 读取"""
+
+    realtime = True
+
+    def __init__(self, sample_rate, name):
+        super().__init__(sample_rate, name)
+        self.received_samples = 0
+
+    def blocks(self, block_size):
+        raise NotImplementedError("网络会话的音频由服务端推送")
+
+    def stats(self):
+        return {}
+
+
+class Session:
+    """一个连接: 采集通道 + 发送字幕 + 按会话的流控"""
+
+    def __init__(self, server, channel, writer):
+        self.server = server
+        self.channel = channel
+        self.writer = writer
+        self.started = time.monotonic()
+        self.delivered = 0  # 已返回结果的片段数（含识别失败）
+        self.captions = 0
+        self.skipped = 0  # 没有结果的片段数（被丢弃、过期跳过或处理出错）
+        self.dropped_events = 0
+        self.stalls = 0  # 因在途片段过多而暂停读取的次数
+        self.stall_seconds = 0.0
+        self.receiving = True
+        self.task = asyncio.current_task()
+        self._drained = asyncio.Event()
+
+    @property
+    def outstanding(self):
+        return self.channel.accepted - self.delivered
+
+    def send(self, event):
+        if self.writer.is_closing():
+            return
+        self.writer.write((json.dumps(event, ensure_ascii=False) + "\n").encode())
+
+    def deliver(self, event):
+        """在事件循环中处理转录结果或流式事件（由工作线程通过 call_soon_threadsafe 调用）"""
+        kind = event.get("type")
+        if kind == "partial":
+            # 部分结果可以丢: 客户端读得慢时不再堆积
+            if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                self.dropped_events += 1
+                return
+            self.send(event)
+            return
+
+        self.delivered += 1
+        if kind == "skipped":
+            self.skipped += 1
+            self.send(event)
+        elif kind == "final":
+            self.captions += bool(event["text"])
+            self.send(event)
+        elif event["transcription"]:
+            self.captions += 1
+            self.send(
+                {
+                    "type": "caption",
+                    "segment_id": event["segment_id"],
+                    "text": event["transcription"],
+                    "duration": event["duration"],
+                    "processing_time": event["processing_time"],
+                    "model": event.get("model"),
+                }
+            )
+        else:
+            self.send({"type": "failed", "segment_id": event["segment_id"]})
+        if self.outstanding <= 0:
+            self._drained.set()
+
+    async def wait_capacity(self, pool, max_pending):
+        """该会话排队的片段达到上限时暂停读取，背压经TCP传回客户端"""
+        key = self.channel.index
+        if pool.queue_depth(key) < max_pending:
+            return
+        self.stalls += 1
+        start = time.monotonic()
+        while pool.queue_depth(key) >= max_pending and not self.server.stopping:
+            await asyncio.sleep(0.01)
+        self.stall_seconds += time.monotonic() - start
+
+    async def drain(self, timeout):
+        """等待已提交的片段全部返回结果"""
+        deadline = time.monotonic() + timeout
+        while self.outstanding > 0:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._drained.clear()
+            try:
+                await asyncio.wait_for(self._drained.wait(), min(remaining, 0.5))
+            except asyncio.TimeoutError:
+                pass
+        return True
+
+    def stats(self):
+        return {
+            "segments": self.channel.segments,
+            "captions": self.captions,
+            "skipped": self.skipped,
+            "received_seconds": self.channel.source.received_samples
+            / self.channel.source.sample_rate,
+            "stalls": self.stalls,
+            "stall_seconds": self.stall_seconds,
+            "dropped_events": self.dropped_events,
+            "duration": time.monotonic() - self.started,
+            "language": self.language_stats(),
+        }
+
+    def language_stats(self):
+        tracker = self.server.transcriber.language_tracker
+        if tracker is None:
+            return None
+        return tracker.session_stats(self.channel.index)
+
+
+class PcmServer:
+    """多会话PCM接入服务；transcriber 为 SimpleTranscriber（提供线程池和识别后端）
+
+    max_pending 为每个会话在线程池中排队的片段上限（不超过线程池的队列上限），
+    达到上限时暂停读取该连接，其他会话不受影响
+    """
+
+    def __init__(
+        self,
+        transcriber,
+        host="127.0.0.1",
+        port=9200,
+        max_sessions=256,
+        max_pending=2,
+        drain_timeout=30.0,
+    ):
+        self.transcriber = transcriber
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.max_pending = max(1, min(max_pending, transcriber.pool.max_queue))
+        self.drain_timeout = drain_timeout
+        self.sessions = {}  # 通道序号 -> Session
+        self.stopping = False
+        self._server = None
+        self._tasks = set()
+        # 会话的通道序号接在本地采集通道之后，线程池按序号分别排队
+        self._ids = itertools.count(len(transcriber.channels))
+
+        # 统计
+        self.total_sessions = 0
+        self.rejected = 0
+        self.errors = 0
+        self.bytes_received = 0
+        self.setup_metrics()
+
+    def setup_metrics(self):
+        metrics = self.transcriber.metrics
+        metrics.gauge("sessions_active", lambda: len(self.sessions), "当前会话数")
+        metrics.gauge(
+            "sessions_total", lambda: self.total_sessions, "累计会话数", kind="counter"
+        )
+        metrics.gauge(
+            "session_bytes_received",
+            lambda: self.bytes_received,
+            "收到的PCM字节数",
+            kind="counter",
+        )
+        metrics.gauge(
+            "session_stalls",
+            lambda: sum(s.stalls for s in list(self.sessions.values())),
+            "当前会话因流控暂停读取的次数",
+        )
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            await self._session(reader, writer)
+        except (ProtocolError, ValueError) as e:
+            self.errors += 1
+            self._send_error(writer, str(e))
+        except asyncio.TimeoutError:
+            self.errors += 1
+            self._send_error(writer, "等待握手帧超时")
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._tasks.discard(task)
+            writer.close()
+
+    def _send_error(self, writer, message):
+        if not writer.is_closing():
+            writer.write(
+                (
+                    json.dumps({"type": "error", "error": message}, ensure_ascii=False)
+                    + "\n"
+                ).encode()
+            )
+
+    async def _session(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        if self.stopping or len(self.sessions) >= self.max_sessions:
+            self.rejected += 1
+            self._send_error(writer, "会话数已达上限")
+            return
+
+        kind, payload = await asyncio.wait_for(read_frame(reader), HELLO_TIMEOUT)
+        if kind != b"H":
+            raise ProtocolError("第一帧必须是握手帧 H")
+        hello = json.loads(payload or b"{}")
+        sample_rate = int(hello.get("sample_rate", 16000))
+        if not 8000 <= sample_rate <= 192000:
+            raise ProtocolError(f"不支持的采样率: {sample_rate}")
+        name = str(hello.get("name") or (f"{peer[0]}:{peer[1]}" if peer else "client"))
+
+        transcriber = self.transcriber
+        index = next(self._ids)
+        source = NetworkSource(sample_rate, f"net:{name}")
+        channel = transcriber.setup_channel(index, source, verbose=False)
+        language = hello.get("language")
+        if language and transcriber.language_tracker is not None:
+            transcriber.language_tracker.fix(index, str(language))
+        session = Session(self, channel, writer)
+        loop = asyncio.get_running_loop()
+        transcriber.result_hooks[index] = lambda event: loop.call_soon_threadsafe(
+            session.deliver, event
+        )
+        self.sessions[index] = session
+        self.total_sessions += 1
+        if channel.streamer is not None:
+            channel.streamer.start()
+        print(f"{Fore.GREEN}🔌 会话 {channel.name} 已连接{Style.RESET_ALL}")
+
+        try:
+            session.send(
+                {"type": "ready", "session": index, "frame_size": channel.frame_size}
+            )
+            await self._receive(reader, session)
+            session.receiving = False
+            # 输出最后一个未完成的片段，等所有字幕发出后再关闭
+            transcriber.finish_channel(channel)
+            timeout = 5.0 if self.stopping else self.drain_timeout
+            drained = await session.drain(timeout)
+            session.send({"type": "end", "complete": drained, **session.stats()})
+            await writer.drain()
+        finally:
+            transcriber.result_hooks.pop(index, None)
+            self.sessions.pop(index, None)
+            if channel.streamer is not None:
+                await loop.run_in_executor(None, channel.streamer.stop, 5.0)
+            stats = session.stats()
+            if transcriber.language_tracker is not None:
+                transcriber.language_tracker.forget(index)
+            language = stats["language"]
+            language_note = (
+                f"，语言 {language['language']}（复查 {language['rechecks']} 次）"
+                if language and language["language"]
+                else ""
+            )
+            print(
+                f"{Fore.CYAN}🔌 会话 {channel.name} 结束: {stats['received_seconds']:.1f}s 音频，"
+                f"{stats['captions']} 条字幕，暂停读取 {stats['stalls']} 次{language_note}{Style.RESET_ALL}"
+            )
+
+    async def _receive(self, reader, session):
+        """读取音频帧直到 E 帧、连接关闭或服务停止；按帧大小切块送入流水线"""
+        channel = session.channel
+        pool = self.transcriber.pool
+        block_bytes = channel.frame_size * 2
+        pending = bytearray()
+        while not self.stopping:
+            try:
+                kind, payload = await read_frame(reader)
+            except asyncio.CancelledError:
+                # 服务停止: 不再读取，继续完成已收到的音频
+                return
+            if kind is None or kind == b"E":
+                return
+            if kind != b"A":
+                raise ProtocolError(f"未知的帧类型: {kind!r}")
+
+            self.bytes_received += len(payload)
+            pending += payload
+            usable = len(pending) - len(pending) % block_bytes
+            for offset in range(0, usable, block_bytes):
+                await session.wait_capacity(pool, self.max_pending)
+                block = pcm_to_float(pending[offset : offset + block_bytes], 2, 1)
+                channel.source.received_samples += len(block)
+                self.transcriber.process_block(block, channel)
+            del pending[:usable]
+
+    async def shutdown(self):
+        """停止接受新连接，已有会话处理完收到的音频后关闭"""
+        self.stopping = True
+        if self._server is not None:
+            self._server.close()
+        # 只打断还在等待音频的连接；正在输出剩余字幕的会话继续完成
+        finishing = {s.task for s in self.sessions.values() if not s.receiving}
+        for task in list(self._tasks):
+            if task not in finishing:
+                task.cancel()
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=self.drain_timeout)
+
+    def stats(self):
+        return {
+            "sessions_active": len(self.sessions),
+            "sessions_total": self.total_sessions,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "bytes_received": self.bytes_received,
+        }
+
+
+async def tick_profiler(profiler):
+    """会话的音频在事件循环中处理，由这里开始和结束 /profile 请求的分析"""
+    while True:
+        profiler.tick()
+        await asyncio.sleep(PROFILE_TICK)
+
+
+async def serve(transcriber, host="127.0.0.1", port=9200, **kwargs):
+    """运行接入服务直到收到 SIGINT/SIGTERM"""
+    transcriber.pool.start()
+    transcriber.start_metrics_server()
+    server = await PcmServer(transcriber, host, port, **kwargs).start()
+    ticker = asyncio.create_task(tick_profiler(transcriber.profiler))
+    print(
+        f"{Fore.GREEN}🌐 PCM接入服务: tcp://{server.host}:{server.port} "
+        f"(最多 {server.max_sessions} 个会话，每会话排队 {server.max_pending} 个片段){Style.RESET_ALL}"
+    )
+    print(f"{Fore.YELLOW}💡 按 Ctrl+C 停止服务{Style.RESET_ALL}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+
+    print(f"\n{Fore.CYAN}🛑 停止服务，等待会话结束...{Style.RESET_ALL}")
+    await server.shutdown()
+    ticker.cancel()
+    transcriber.profiler.finish()
+    return server
+
+
+def run_server(transcriber, host="127.0.0.1", port=9200, **kwargs):
+    server = asyncio.run(serve(transcriber, host, port, **kwargs))
+    transcriber.stop_services()
+    stats = server.stats()
+    print(f"{Fore.GREEN}👋 服务结束！{Style.RESET_ALL}")
+    print(
+        f"{Fore.YELLOW}📊 会话: 共 {stats['sessions_total']} 个，拒绝 {stats['rejected']}，"
+        f"协议错误 {stats['errors']}，收到 {stats['bytes_received'] / 1e6:.1f}MB{Style.RESET_ALL}"
+    )
+    transcriber.print_statistics()
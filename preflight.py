@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+启动预检缓存
+whisper-cli检查、模型文件检查和设备选择的结果按文件签名（路径+大小+修改时间）缓存，
+签名不变时下次启动直接复用，不再启动子进程或列出全部设备；
+另有后台预热（模型文件读入页缓存、提前导入较慢的模块）和启动计时
+"""
+
+import importlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+CACHE_VERSION = 1
+
+
+def default_cache_path():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "audio-captions-rt", "preflight.json")
+
+
+def file_signature(path):
+    """文件的 (绝对路径, 大小, 修改时间)；文件不存在时返回None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.realpath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def command_signature(command):
+    """命令的签名: 可执行文件和参数中所有存在的文件（例如 python 脚本）的签名"""
+    executable = shutil.which(command[0])
+    if executable is None:
+        return None
+    files = [file_signature(executable)]
+    files += [file_signature(arg) for arg in command[1:] if os.path.isfile(arg)]
+    return {"command": list(command), "files": files}
+
+
+class PreflightCache:
+    """按签名缓存的预检结果；签名变化（重新编译、换模型、换设备）时自动失效"""
+
+    def __init__(self, path=None, refresh=False):
+        self.path = path or default_cache_path()
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._dirty = False
+        if not refresh:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == CACHE_VERSION:
+            self._entries = data.get("entries", {})
+
+    def get(self, key, signature):
+        entry = self._entries.get(key)
+        if entry is not None and entry.get("signature") == signature:
+            self.hits += 1
+            return entry["value"]
+        self.misses += 1
+        return None
+
+    def put(self, key, signature, value):
+        self._entries[key] = {
+            "signature": signature,
+            "value": value,
+            "checked": time.time(),
+        }
+        self._dirty = True
+
+    def save(self):
+        """写回缓存文件（先写临时文件再替换）；缓存目录不可写时静默跳过"""
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"version": CACHE_VERSION, "entries": self._entries},
+                    f,
+                    ensure_ascii=False,
+                    indent=1,
+                )
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except OSError:
+            pass
+
+    def check_binary(self, command, timeout=10.0):
+        """检查识别程序能否运行: 返回 {"path", "usage", "cached"}，程序不存在时返回None
+
+        whisper-cli 没有版本参数，用可执行文件的签名代替版本: 重新编译后签名变化，缓存失效
+        """
+        signature = command_signature(command)
+        if signature is None:
+            return None
+        key = f"binary:{' '.join(command)}"
+        value = self.get(key, signature)
+        if value is not None:
+            return dict(value, cached=True)
+        try:
+            result = subprocess.run(
+                list(command) + ["--help"],
+                capture_output=True,
+                text=True,
+                errors="replace",
+                timeout=timeout,
+            )
+            output = (result.stdout + result.stderr).strip().splitlines()
+            usage = next((line for line in output if "usage" in line.lower()), "")
+            value = {
+                "path": signature["files"][0][0],
+                "returncode": result.returncode,
+                "usage": usage.strip(),
+            }
+        except (OSError, subprocess.TimeoutExpired) as e:
+            value = {
+                "path": signature["files"][0][0],
+                "returncode": None,
+                "error": str(e),
+            }
+        self.put(key, signature, value)
+        return dict(value, cached=False)
+
+    def check_model(self, path, expected_size=0):
+        """检查模型文件大小（允许10%误差）；返回 {"size", "ok", "cached"}，文件不存在时返回None"""
+        signature = file_signature(path)
+        if signature is None:
+            return None
+        key = f"model:{signature[0]}"
+        value = self.get(key, signature)
+        if value is None:
+            size = signature[1]
+            value = {"size": size, "ok": size >= expected_size * 0.9}
+            self.put(key, signature, value)
+            return dict(value, cached=False)
+        return dict(value, cached=True)
+
+    def device_choice(self, spec):
+        """上次为 spec（设备号/名称，None表示默认BlackHole）选择的设备"""
+        return self.get(f"device:{spec}", None)
+
+    def remember_device(self, spec, choice):
+        self.put(f"device:{spec}", None, choice)
+
+    def forget_device(self, spec):
+        if self._entries.pop(f"device:{spec}", None) is not None:
+            self._dirty = True
+
+
+def prewarm_file(path, chunk_size=4 << 20):
+    """把文件读入页缓存，之后识别进程加载模型时不再等磁盘；返回读取的字节数"""
+    try:
+        with open(path, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            total = 0
+            buffer = bytearray(chunk_size)
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    return total
+                total += n
+    except OSError:
+        return 0
+
+
+def prewarm_imports(modules):
+    """导入模块（在后台线程中调用，与模型加载并行）；缺少的可选模块忽略"""
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+
+def prewarm(paths=(), modules=()):
+    """后台预热模型文件和模块，返回线程"""
+
+    def run():
+        prewarm_imports(modules)
+        for path in paths:
+            prewarm_file(path)
+
+    thread = threading.Thread(target=run, name="prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+class StartupClock:
+    """启动各阶段的时间点和首条字幕时间，均为相对 origin（perf_counter）的秒数"""
+
+    def __init__(self, origin=None):
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.marks = {}
+        self.first_caption = None
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - self.origin
+
+    def mark(self, name):
+        """记录阶段完成时间（同名阶段只记第一次）"""
+        self.marks.setdefault(name, self.elapsed())
+        return self.marks[name]
+
+    def caption(self):
+        """记录首条字幕；是第一条时返回耗时，否则返回None"""
+        if self.first_caption is not None:
+            return None
+        with self._lock:
+            if self.first_caption is not None:
+                return None
+            self.first_caption = self.elapsed()
+            return self.first_caption
+
+    def phases(self):
+        """各阶段耗时（与上一阶段之差），按完成顺序"""
+        previous = 0.0
+        phases = []
+        for name, at in sorted(self.marks.items(), key=lambda item: item[1]):
+            phases.append((name, at - previous))
+            previous = at
+        return phases
+
+    def stats(self):
+        return {"marks": dict(self.marks), "first_caption": self.first_caption}
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+识别结果缓存
+等待音乐、入会提示音、循环广告这类重复出现的音频，用音频指纹找到上次的识别结果，
+不再调用识别后端。指纹是每帧16位的频带能量差分哈希（Haitsma-Kalker），
+对音量变化和片段起点几十毫秒的偏移不敏感；完全相同的指纹直接命中，
+否则在时长相近的条目中按误码率找最接近的一条
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# 每个16位子指纹中1的个数，用于计算两个指纹之间的汉明距离
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_POPCOUNT = _POPCOUNT8[np.arange(1 << 16) & 0xFF] + _POPCOUNT8[np.arange(1 << 16) >> 8]
+
+
+class Fingerprint:
+    """一个片段的指纹: 每帧一个uint16子指纹"""
+
+    __slots__ = ("bits", "duration", "digest")
+
+    def __init__(self, bits, duration):
+        self.bits = bits
+        self.duration = duration
+        self.digest = hashlib.blake2b(bits.tobytes(), digest_size=16).hexdigest()
+
+    def __len__(self):
+        return len(self.bits)
+
+
+class AudioFingerprinter:
+    """频带能量差分哈希: 17个对数间隔频带 → 相邻频带能量差在时间上的变化取符号 → 16位"""
+
+    def __init__(self, sample_rate=16000, frame_ms=60, hop_ms=10, band=(250, 4000)):
+        self.sample_rate = sample_rate
+        self.frame_size = sample_rate * frame_ms // 1000
+        self.hop = sample_rate * hop_ms // 1000
+        self._window = np.hanning(self.frame_size).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.frame_size, 1 / sample_rate)
+        edges = np.geomspace(band[0], band[1], 18)
+        # 频率点到频带的0/1矩阵，各频带能量用一次矩阵乘法求出
+        self._bands = np.zeros((len(freqs), 17), dtype=np.float32)
+        for b in range(17):
+            self._bands[(freqs >= edges[b]) & (freqs < edges[b + 1]), b] = 1.0
+        self._weights = 1 << np.arange(16, dtype=np.uint16)
+
+    def fingerprint(self, audio):
+        """int16片段 → Fingerprint；不足三帧的片段返回None"""
+        count = 1 + (len(audio) - self.frame_size) // self.hop
+        if count < 3:
+            return None
+        frames = np.lib.stride_tricks.sliding_window_view(audio, self.frame_size)[
+            :: self.hop
+        ][:count]
+        spectrum = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2
+        energy = np.log(spectrum.astype(np.float32) @ self._bands + 1e-6)
+        # 相邻频带的能量差，在相邻帧之间再做差分，取符号
+        diff = np.diff(energy, axis=1)
+        bits = (diff[1:] - diff[:-1]) > 0
+        packed = (bits * self._weights).sum(axis=1).astype(np.uint16)
+        return Fingerprint(packed, len(audio) / self.sample_rate)
+
+
+def bit_error_rates(query, candidates, max_shift=6, min_overlap=0.9):
+    """query 与每个候选指纹在 ±max_shift 帧（默认±60ms）对齐范围内重叠部分的最小误码率
+
+    所有候选补齐成一个矩阵，每个偏移量只做一次向量化的异或和计数；
+    重叠部分不到两者中较长一方的 min_overlap 时记为1，避免短片段匹配到长片段的开头
+    """
+    lengths = np.array([len(c) for c in candidates])
+    width = max(int(lengths.max()), len(query))
+    matrix = np.zeros((len(candidates), width), dtype=np.uint16)
+    for i, bits in enumerate(candidates):
+        matrix[i, : len(bits)] = bits
+    longest = np.maximum(lengths, len(query))
+    rows = np.arange(len(candidates))
+    best = np.ones(len(candidates))
+    for shift in range(-max_shift, max_shift + 1):
+        c_start, q_start = max(0, shift), max(0, -shift)
+        span = min(width - c_start, len(query) - q_start)
+        if span < 3:
+            continue
+        overlap = np.minimum(lengths - c_start, len(query) - q_start)
+        valid = (overlap >= 3) & (overlap >= longest * min_overlap)
+        if not valid.any():
+            continue
+        xor = matrix[:, c_start : c_start + span] ^ query[q_start : q_start + span]
+        errors = np.cumsum(_POPCOUNT[xor], axis=1, dtype=np.int32)
+        n = np.clip(overlap, 1, span)
+        rate = errors[rows, n - 1] / (n * 16)
+        best = np.where(valid, np.minimum(best, rate), best)
+    return best
+
+
+class CacheEntry:
+    __slots__ = ("fingerprint", "model", "language", "text", "cost", "created", "hits")
+
+    def __init__(self, fingerprint, model, text, cost, language=None):
+        self.fingerprint = fingerprint
+        self.model = model
+        self.language = language
+        self.text = text  # None 表示识别结果为“无语音”
+        self.cost = cost  # 原来识别用的时间（秒），命中时计入节省
+        self.created = time.monotonic()
+        self.hits = 0
+
+
+class ResultCache:
+    """按音频指纹缓存识别结果的LRU缓存，条目数和存活时间都有上限
+
+    同一段音频用不同的模型或识别语言得到的文本不同，条目按 (模型, 语言) 分开
+    """
+
+    def __init__(
+        self,
+        capacity=256,
+        ttl=3600.0,
+        max_ber=0.25,
+        duration_tolerance=0.2,
+        sample_rate=16000,
+    ):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.max_ber = max_ber
+        self.duration_tolerance = duration_tolerance
+        self.fingerprinter = AudioFingerprinter(sample_rate)
+        # (模型, 语言, 指纹摘要) -> CacheEntry，最近使用的在末尾
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 统计
+        self.lookups = 0
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def hits(self):
+        return self.exact_hits + self.near_hits
+
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def fingerprint(self, audio):
+        return self.fingerprinter.fingerprint(audio)
+
+    def get(self, fingerprint, model=None, language=None):
+        """查找缓存；命中时返回 CacheEntry（其 text 可能为None），否则返回None"""
+        if fingerprint is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self.lookups += 1
+            self._expire(now)
+            entry = self._entries.get((model, language, fingerprint.digest))
+            if entry is not None:
+                self.exact_hits += 1
+            else:
+                entry = self._nearest(fingerprint, model, language)
+                if entry is None:
+                    return None
+                self.near_hits += 1
+            self._entries.move_to_end(
+                (entry.model, entry.language, entry.fingerprint.digest)
+            )
+            entry.hits += 1
+            self.saved_seconds += entry.cost
+            return entry
+
+    def _nearest(self, fingerprint, model, language):
+        """时长相近的条目中误码率最低且低于 max_ber 的一条"""
+        candidates = [
+            entry
+            for entry in self._entries.values()
+            if entry.model == model
+            and entry.language == language
+            and abs(entry.fingerprint.duration - fingerprint.duration)
+            <= self.duration_tolerance
+        ]
+        if not candidates:
+            return None
+        rates = bit_error_rates(
+            fingerprint.bits, [entry.fingerprint.bits for entry in candidates]
+        )
+        best = int(np.argmin(rates))
+        return candidates[best] if rates[best] < self.max_ber else None
+
+    def put(self, fingerprint, model, text, cost, language=None):
+        if fingerprint is None or self.capacity <= 0:
+            return
+        with self._lock:
+            key = (model, language, fingerprint.digest)
+            self._entries[key] = CacheEntry(fingerprint, model, text, cost, language)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _expire(self, now):
+        """删除超过 ttl 的条目（按插入顺序不一定有序，逐个检查；条目数有上限，开销可控）"""
+        if not self.ttl:
+            return
+        expired = [
+            key
+            for key, entry in self._entries.items()
+            if now - entry.created > self.ttl
+        ]
+        for key in expired:
+            del self._entries[key]
+        self.expirations += len(expired)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "capacity": self.capacity,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "hit_rate": self.hit_rate(),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "saved_seconds": self.saved_seconds,
+        }
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+延迟预算调度
+跟踪字幕的迟到时间（片段切出到字幕输出），超出预算时让新片段改用更小的模型，
+并跳过已经过期的片段、合并排队的片段；追上进度后再逐级换回原来的模型
+"""
+
+import threading
+import time
+from collections import deque, namedtuple
+
+# 一次模型切换: action 为 "downgrade" 或 "upgrade"
+ModelSwitch = namedtuple("ModelSwitch", "time action model previous lateness")
+
+
+class DeadlineScheduler:
+    """models 按从大到小排列，第一个是首选模型"""
+
+    def __init__(
+        self,
+        models,
+        budget=4.0,
+        stale_after=None,
+        recover_ratio=0.5,
+        recover_segments=3,
+        cooldown=5.0,
+        smoothing=0.3,
+    ):
+        if not models:
+            raise ValueError("至少需要一个模型")
+        self.models = list(models)
+        self.budget = budget
+        self.stale_after = stale_after or budget * 2
+        self.recover_ratio = recover_ratio
+        self.recover_segments = recover_segments
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+
+        self.level = 0  # 当前使用 models[level]
+        self.lateness = 0.0  # 迟到时间的指数滑动平均
+        self.max_lateness = 0.0
+        self._recovered = 0  # 连续低于恢复阈值的片段数
+        self._last_switch = 0.0
+        self._lock = threading.Lock()
+
+        # 统计
+        self.downgrades = 0
+        self.upgrades = 0
+        self.skipped = 0
+        self.merged = 0
+        self.switches = deque(maxlen=100)
+
+    @property
+    def current_model(self):
+        return self.models[self.level]
+
+    @property
+    def degraded(self):
+        return self.level > 0
+
+    @property
+    def shedding(self):
+        """迟到超出预算: 新片段应与排队的片段合并"""
+        return self.lateness > self.budget
+
+    def is_stale(self, age):
+        """片段从切出到开始识别已等待 age 秒，超过 stale_after 就不再值得识别"""
+        return age > self.stale_after
+
+    def observe(self, lateness, backlog_seconds=0.0):
+        """记录一个字幕的迟到时间和当前积压的预计处理时间；切换模型时返回 ModelSwitch"""
+        with self._lock:
+            self.lateness += self.smoothing * (lateness - self.lateness)
+            self.max_lateness = max(self.max_lateness, lateness)
+            pressure = max(self.lateness, backlog_seconds)
+
+            if pressure < self.budget * self.recover_ratio:
+                self._recovered += 1
+            else:
+                self._recovered = 0
+
+            now = time.monotonic()
+            if now - self._last_switch < self.cooldown:
+                return None
+
+            previous = self.current_model
+            if pressure > self.budget and self.level < len(self.models) - 1:
+                self.level += 1
+                self.downgrades += 1
+                action = "downgrade"
+            elif self.level > 0 and self._recovered >= self.recover_segments:
+                self.level -= 1
+                self.upgrades += 1
+                action = "upgrade"
+            else:
+                return None
+
+            self._recovered = 0
+            self._last_switch = now
+            switch = ModelSwitch(
+                time.time(), action, self.current_model, previous, pressure
+            )
+            self.switches.append(switch)
+            return switch
+
+    def stats(self):
+        return {
+            "model": self.current_model,
+            "level": self.level,
+            "lateness": self.lateness,
+            "max_lateness": self.max_lateness,
+            "downgrades": self.downgrades,
+            "upgrades": self.upgrades,
+            "skipped": self.skipped,
+            "merged": self.merged,
+        }
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+VAD驱动的语音分段
+所有帧（包括片段前的预卷帧和片段后的拖尾帧）都写入同一个预分配的环形缓冲区，
+切分片段时只做一次切片复制
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+# start/end 为流中的绝对样本位置（左闭右开）
+Segment = namedtuple("Segment", "audio start end speech_frames")
+
+
+class SpeechRingBuffer:
+    """固定容量的int16环形缓冲区，按流中的绝对样本位置寻址"""
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self._buffer = np.zeros(self.capacity, dtype=np.int16)
+        self.written = 0  # 已写入的样本总数
+
+    @property
+    def oldest(self):
+        """仍保留在缓冲区中的最早样本位置"""
+        return max(0, self.written - self.capacity)
+
+    def write(self, frame):
+        n = len(frame)
+        if n > self.capacity:
+            frame = frame[n - self.capacity :]
+            self.written += n - self.capacity
+            n = self.capacity
+        offset = self.written % self.capacity
+        first = min(n, self.capacity - offset)
+        self._buffer[offset : offset + first] = frame[:first]
+        if first < n:
+            self._buffer[: n - first] = frame[first:]
+        self.written += n
+
+    def slice(self, start, end, copy=True):
+        """取出 [start, end) 的样本
+
+        不跨越缓冲区末尾且 copy=False 时返回视图（后续写入会覆盖），否则只复制一次
+        """
+        if start < self.oldest or end > self.written or start > end:
+            raise IndexError(f"样本区间 [{start}, {end}) 已不在缓冲区中")
+        a = start % self.capacity
+        b = a + (end - start)
+        if b <= self.capacity:
+            view = self._buffer[a:b]
+            return view.copy() if copy else view
+        return np.concatenate((self._buffer[a:], self._buffer[: b - self.capacity]))
+
+
+class Segmenter:
+    """根据VAD结果把连续的帧切分成语音片段
+
+    最大时长按片段跨越的帧数计算（含片段内的静音），片段不会超出环形缓冲区。
+    达到最大时长时语音帧仍不足最小时长、且末尾已是足够长的静音，说明只有零星的语音帧
+    （咳嗽、按键声等），这样的片段直接丢弃（计入 discarded），不再像早期版本那样
+    只收集语音帧、跨过静音一直累积到下一段话
+    """
+
+    def __init__(
+        self,
+        frame_size,
+        min_segment_frames,
+        max_segment_frames,
+        silence_threshold,
+        preroll_frames=0,
+        tail_frames=0,
+        reserve_frames=None,
+    ):
+        self.frame_size = frame_size
+        self.min_segment_frames = min_segment_frames
+        self.max_segment_frames = max_segment_frames
+        self.silence_threshold = silence_threshold
+        self.preroll_frames = preroll_frames
+        self.tail_frames = tail_frames
+
+        # 容量: 最长片段 + 预卷，再留一帧余量给重采样造成的帧长抖动；
+        # reserve_frames 为运行时可能调到的最长片段（自适应分段）
+        self.reserve_frames = max(max_segment_frames, reserve_frames or 0)
+        capacity = (self.reserve_frames + preroll_frames + 1) * (frame_size + 1)
+        self.ring = SpeechRingBuffer(capacity)
+
+        self._start = None  # 当前片段起点，None表示空闲
+        self._speech_end = 0  # 最后一个语音帧的结束位置
+        self._last_end = 0  # 上一个片段的结束位置，预卷不会越过它
+        self.speech_count = 0
+        self.silence_count = 0
+
+        # 统计
+        self.segments = 0
+        self.discarded = 0
+
+    def configure(self, min_segment_frames, max_segment_frames, silence_threshold):
+        """运行时调整分段参数，最长片段不超过环形缓冲区预留的长度"""
+        self.max_segment_frames = min(max_segment_frames, self.reserve_frames)
+        self.min_segment_frames = min(min_segment_frames, self.max_segment_frames)
+        self.silence_threshold = silence_threshold
+
+    @property
+    def active(self):
+        return self._start is not None
+
+    @property
+    def start(self):
+        """当前片段起点的绝对样本位置，空闲时为None"""
+        return self._start
+
+    def active_frames(self):
+        """当前片段已跨越的帧数（含片段内的静音帧）"""
+        if self._start is None:
+            return 0
+        return (self.ring.written - self._start) // self.frame_size
+
+    def push(self, frame, is_speech):
+        """写入一帧；满足切分条件时返回 Segment，否则返回 None"""
+        frame_start = self.ring.written
+        self.ring.write(frame)
+        frame_end = self.ring.written
+
+        if is_speech:
+            if self._start is None:
+                preroll = self.preroll_frames * self.frame_size
+                # 达到最大时长强制切分后，预卷不能重复上一个片段已经送出的音频
+                self._start = max(
+                    self.ring.oldest, self._last_end, frame_start - preroll
+                )
+            self._speech_end = frame_end
+            self.speech_count += 1
+            self.silence_count = 0
+        elif self._start is not None:
+            self.silence_count += 1
+        else:
+            return None
+
+        # 达到最小时长且有足够静音
+        if (
+            self.speech_count >= self.min_segment_frames
+            and self.silence_count >= self.silence_threshold
+        ):
+            end = min(frame_end, self._speech_end + self.tail_frames * self.frame_size)
+            return self._cut(end)
+
+        # 或者达到最大时长
+        if self.active_frames() >= self.max_segment_frames:
+            if (
+                self.speech_count < self.min_segment_frames
+                and self.silence_count >= self.silence_threshold
+            ):
+                # 只有零星语音帧，之后一直是静音: 丢弃，不送去识别
+                self.discarded += 1
+                self._reset()
+                return None
+            return self._cut(frame_end)
+
+        return None
+
+    def flush(self):
+        """输入结束时输出未完成的片段（语音帧不足最小时长则丢弃）"""
+        if self._start is None or self.speech_count < self.min_segment_frames:
+            self._reset()
+            return None
+        end = min(
+            self.ring.written, self._speech_end + self.tail_frames * self.frame_size
+        )
+        return self._cut(end)
+
+    def _cut(self, end):
+        segment = Segment(
+            self.ring.slice(self._start, end), self._start, end, self.speech_count
+        )
+        self.segments += 1
+        self._last_end = end
+        self._reset()
+        return segment
+
+    def _reset(self):
+        self._start = None
+        self.speech_count = 0
+        self.silence_count = 0
@@ -1,134 +1,671 @@
 #!/usr/bin/env python3
 """
 简化版实时转录系统
-基于sounddevice官方示例，只保留转录功能
+基于sounddevice官方示例，只保留转录功能；也支持文件/标准输入/合成信号和离线模式，
+以及在一个进程中同时为多个设备或声道生成字幕
 """
 
-import sounddevice as sd
-import numpy as np
-import queue
-import threading
 import time
+
+# 启动计时从导入其他模块之前开始
+PROCESS_START = time.perf_counter()
+
+import numpy as np
 import subprocess
 import tempfile
 import wave
 import json
 import os
 import sys
-import webrtcvad
+import shutil
+import shlex
+import argparse
+import threading
 from colorama import init, Fore, Style
 
+from audio_utils import PIPELINE_SAMPLE_RATE, PolyphaseResampler, pcm_to_wav_bytes
+from adaptive import SegmentController
+from asr_backend import wav_to_pcm
+from batching import SegmentBatcher
+from caption_hub import CaptionHub
+from capture_journal import CaptureJournal, JournalSource, channel_path
+from cpu_budget import ThreadBudget, run_pinned
+from history import CaptionRecord, HistoryStore, open_log
+from language import AUTO, LanguageTracker
+from audio_sources import (
+    DeviceSource,
+    FileSource,
+    MultiChannelDevice,
+    StdinSource,
+    SyntheticSource,
+)
+from metrics import Metrics, MetricsServer, ProfileTrigger
+from offline import run_offline, speech_flags, split_at_silence
+from preflight import PreflightCache, StartupClock, prewarm
+from result_cache import ResultCache
+from scheduler import DeadlineScheduler
+from segmenter import Segmenter
+from speech_score import SpeechFilter
+from streaming import StreamingCaptioner
+from vad_engine import VadEngine
+from transformers_backend import TransformersWhisperBackend, default_model
+from whisper_worker import (
+    WhisperCliBackend,
+    WhisperServerWorker,
+    WhisperWorkerError,
+    detected_language,
+    parse_detected_language,
+    parse_whisper_stdout,
+    parse_whisper_timings,
+    whisper_cli_command,
+)
+from worker_pool import OVERFLOW_POLICIES, TranscriptionPool
+
 # 初始化colorama
 init(autoreset=True)
 
 
+# 在后台与模型加载并行导入的较慢模块（VAD初始化时才需要）
+PREWARM_MODULES = ("webrtcvad",)
+# 进程内识别后端需要的模块，导入就要几秒
+TRANSFORMERS_MODULES = ("torch", "transformers")
+
+# 按从小到大排列，过载时按这个顺序降级
+MODEL_CONFIGS = {
+    "tiny": {"file": "ggml-tiny.bin", "size": "39MB"},
+    "base": {"file": "ggml-base.bin", "size": "147MB"},
+    "small": {"file": "ggml-small.bin", "size": "244MB"},
+    "small.en": {"file": "ggml-small.en.bin", "size": "244MB"},
+    "medium": {"file": "ggml-medium.bin", "size": "769MB"},
+    "large-v3": {"file": "ggml-large-v3.bin", "size": "1.55GB"},
+}
+
+# 按处理顺序排列的阶段计时器名称
+STAGES = (
+    "capture_wait",  # 等待采集源的下一块
+    "resample",
+    "vad",
+    "segment",  # 分段/片段拼装
+    "speech_score",  # 提交前的片段语音评分
+    "fingerprint",  # 结果缓存的音频指纹和查找
+    "serialize",  # PCM → WAV
+    "backend",  # 后端调用总耗时（进程启动、HTTP往返或进程内推理）
+    "model_load",  # whisper-cli报告的模型加载时间
+    "inference",  # 后端报告的推理时间（批量识别时为整批）
+    "parse",
+    "display",
+)
+
+
+class CaptureChannel:
+    """一路采集: 采集源及其独立的重采样、VAD和分段状态（流式模式下还有自己的流式识别线程）"""
+
+    def __init__(
+        self, index, source, frame_size, resampler, vad, segmenter, streamer=None
+    ):
+        self.index = index
+        self.source = source
+        self.name = source.name
+        self.frame_size = frame_size
+        self.resampler = resampler
+        self.vad = vad
+        self.segmenter = segmenter
+        self.streamer = streamer
+        self.stream_frames = 0
+        self.journal = None  # 采集日志（--journal）
+        self.segments = 0
+        self.accepted = 0  # 单独产生结果的片段数（不含被合并的）
+
+
 class SimpleTranscriber:
-    def __init__(self, whisper_model="small"):
+    def __init__(
+        self,
+        whisper_model="small",
+        backend="server",
+        language="auto",
+        whisper_cli="whisper-cli",
+        whisper_server="whisper-server",
+        handoff="memory",
+        workers=2,
+        max_queue=4,
+        overflow="block",
+        max_batch=1,
+        batch_wait=0.2,
+        vad_mode=2,
+        vad_votes=None,
+        vad_hangover=0,
+        preroll_frames=5,
+        tail_frames=5,
+        capture_buffer_seconds=10.0,
+        source=None,
+        sources=None,
+        devices=None,
+        device_channels=None,
+        threads=None,
+        cpu_budget=None,
+        pin_cpus=False,
+        model_path=None,
+        metrics_port=None,
+        profile_dir=None,
+        stream=False,
+        stream_step=0.5,
+        stream_window=10.0,
+        adaptive=False,
+        target_rtf=0.7,
+        latency_budget=5.0,
+        deadline=None,
+        stale_after=None,
+        caption_log=None,
+        history_size=10000,
+        history_log=None,
+        history_rotate_mb=64,
+        refresh_preflight=False,
+        startup_origin=None,
+        speech_filter="off",
+        speech_threshold=0.35,
+        result_cache=256,
+        result_cache_ttl=3600.0,
+        language_detect="sticky",
+        language_recheck=30,
+        hf_model=None,
+        quantize=True,
+        journal=None,
+        journal_minutes=60.0,
+    ):
         print(f"{Fore.CYAN}🚀 初始化简化版转录系统{Style.RESET_ALL}")
+        # 启动各阶段计时和首条字幕时间；预检结果按文件签名缓存
+        self.startup = StartupClock(
+            PROCESS_START if startup_origin is None else startup_origin
+        )
+        self.startup.mark("imports")
+        self.preflight = PreflightCache(refresh=refresh_preflight)
+
+        # 识别后端: server（常驻whisper-server）、cli（每个片段启动whisper-cli）
+        # 或 transformers（进程内模型，int8量化，积压的片段按批一次前向计算）
+        self.backend = backend
+        self.hf_model = hf_model or default_model(whisper_model)
+        self.quantize = quantize
+        self.language = language
+        # 会话级语言: auto 时每路只在开头几个片段做语种识别，确定后固定语言，定期复查
+        self.language_tracker = None
+        if language == AUTO and language_detect == "sticky":
+            self.language_tracker = LanguageTracker(recheck_every=language_recheck)
+        self.whisper_cli = (
+            [whisper_cli] if isinstance(whisper_cli, str) else list(whisper_cli)
+        )
+        self.whisper_server = whisper_server
+        # CPU线程预算: 同时运行的whisper-cli按在途和排队的任务数平分，threads 为单个任务的上限
+        self.cpu_budget = ThreadBudget(
+            total=cpu_budget,
+            max_per_job=threads,
+            pin=pin_cpus,
+            pending_fn=lambda: self.pool.queue_depth(),
+            max_jobs=workers,
+        )
+        self.threads = self.cpu_budget.max_per_job  # 每次推理最多使用的线程数
+        self.print_cpu_budget(pin_cpus)
+        if threads and threads > self.threads:
+            print(
+                f"{Fore.YELLOW}⚠️ --threads {threads} 超出CPU预算，每次推理最多 {self.threads} 线程"
+                f"（需要时用 --cpu-budget 指定预算）{Style.RESET_ALL}"
+            )
+        self.worker = None  # 常驻的识别后端（whisper-server或进程内模型）
+        self.cli_backends = {}  # 模型文件 -> WhisperCliBackend
+        self.model_name = whisper_model
+        # 过载降级用的其他模型: 模型名 -> 常驻进程（按需启动）
+        self.model_workers = {}
+        self._starting_models = set()
+        self._model_lock = threading.Lock()
+
+        # 片段交接方式: memory（内存中传递WAV）或 file（临时文件回退）
+        self.handoff = handoff
 
         # 音频设置
-        self.sample_rate = None
+        self.sample_rate = None  # 设备原生采样率
+        self.pipeline_rate = PIPELINE_SAMPLE_RATE  # VAD/分段/识别统一使用16kHz
         self.frame_duration = 30  # ms
         self.frame_size = None
+        self.vad_frame_size = self.pipeline_rate * self.frame_duration // 1000
+        self.resampler = None
+
+        # VAD参数: 敏感度、子帧投票数（默认多数）、拖尾帧数
+        self.vad_mode = vad_mode
+        self.vad_votes = vad_votes
+        self.vad_hangover = vad_hangover
 
         # 分段参数 - 提高转录频率
         self.min_segment_duration = 1  # 秒 - 从2.0降到1.5
         self.max_segment_duration = 3.0  # 秒 - 从8.0降到4.0
         self.silence_threshold = 10  # 静音帧数 - 从50降到20
+        if stream:
+            # 流式模式下长句由滑动窗口逐步确认，不需要在3秒处硬切
+            self.max_segment_duration = 30.0
+
+        # 自适应分段: 根据识别耗时和积压调整上面三个参数
+        self.controller = None
+        if adaptive:
+            self.controller = SegmentController(
+                self.min_segment_duration,
+                self.max_segment_duration,
+                self.silence_threshold,
+                workers=workers,
+                target_rtf=target_rtf,
+                latency_budget=latency_budget,
+            )
 
         # 计算帧数
         self.min_segment_frames = None
         self.max_segment_frames = None
 
-        # 音频缓冲
-        self.speech_frames = []
-        self.silence_count = 0
+        # 音频缓冲: 预分配的环形缓冲区，片段前后保留的预卷/拖尾帧数
+        self.preroll_frames = preroll_frames
+        self.tail_frames = tail_frames
+        self.segmenter = None
 
-        # 队列和状态
-        self.audio_queue = queue.Queue()
-        self.listening = False
-        self.transcription_history = []
-        self.segment_counter = 0
+        # 片段预筛: 语音评分低于阈值的片段（噪声、音乐、键盘声）不送去识别
+        self.speech_filter = None
+        if speech_filter != "off":
+            self.speech_filter = SpeechFilter(
+                threshold=speech_threshold, policy=speech_filter
+            )
 
-        # 设置Whisper
-        self.setup_whisper(whisper_model)
+        # 识别结果缓存: 重复出现的音频（等待音乐、提示音、循环广告）按指纹复用上次的结果
+        self.result_cache = None
+        if result_cache:
+            self.result_cache = ResultCache(
+                capacity=result_cache,
+                ttl=result_cache_ttl,
+                sample_rate=self.pipeline_rate,
+            )
 
-        # 设置音频设备
-        self.setup_audio_device()
+        # 队列和状态；多路采集时每路一个 CaptureChannel，共用下面的线程池
+        self.source = None
+        self.channels = []
+        self.capture_buffer_seconds = capture_buffer_seconds
+        self.listening = False
+        self.segment_counter = 0
+        self.segment_channels = {}  # segment_id -> 采集通道
+        # 按采集通道序号注册的结果回调（网络会话把字幕发回客户端）
+        self.result_hooks = {}
+        self._dispatch_lock = threading.Lock()
+
+        # 批量识别: 积压时同一路排队的片段拼接后一次识别，最多 max_batch 个，凑批最多多等 batch_wait 秒
+        self.batcher = None
+        if max_batch > 1:
+            self.batcher = SegmentBatcher(max_batch, sample_rate=self.pipeline_rate)
+
+        # 转录线程池: 固定线程数 + 有界队列，结果按segment_id顺序输出
+        self.pool = TranscriptionPool(
+            self.process_audio_segment,
+            self.display_result,
+            workers=workers,
+            max_queue=max_queue,
+            overflow=overflow,
+            batch_fn=self.process_segment_batch if self.batcher is not None else None,
+            max_batch=max_batch,
+            max_wait=batch_wait,
+            skip_fn=self.segment_skipped,
+        )
 
-        # 设置WebRTC VAD
-        self.setup_vad()
+        # 流式字幕: 每 stream_step 秒对未确认的尾部重新识别一次（每路采集一个识别线程）
+        self.stream = stream
+        self.stream_step = stream_step
+        self.stream_window = stream_window
+        self.streamer = None
+        self.stream_step_frames = max(1, int(stream_step * 1000 / self.frame_duration))
+
+        # 各阶段计时和计数；metrics_port 不为None时启动本地导出端点
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        self.profiler = ProfileTrigger(profile_dir)
+
+        # 字幕分发: 结果广播给SSE端点、文件和回调等订阅者，订阅者慢不会拖住转录
+        self.hub = CaptionHub()
+        if caption_log:
+            self.hub.add_file_sink(caption_log)
+
+        # 转录历史: 内存中只保留最近 history_size 条，统计量增量累计；
+        # 完整历史写入磁盘日志（在订阅者线程中写，不占用转录线程）
+        log = open_log(history_log, history_rotate_mb) if history_log else None
+        self.history = HistoryStore(history_size, log)
+        if log is not None:
+            self.hub.add_callback(
+                lambda event: log.write(CaptionRecord.from_event(event)),
+                name=f"history:{history_log}",
+                maxsize=1024,
+                filter=lambda event: event.get("type") == "final",
+            )
 
-        print(f"{Fore.GREEN}✓ 转录系统就绪{Style.RESET_ALL}")
+        # 设置Whisper（显式指定模型文件时跳过模型查找，例如基准测试使用替身程序）
+        if model_path:
+            self.whisper_model_path = model_path
+        elif backend == "transformers" and whisper_model in MODEL_CONFIGS:
+            # 进程内模型从Hugging Face缓存加载，回退到whisper-cli时才检查ggml模型文件
+            self.whisper_model_path = f'./models/{MODEL_CONFIGS[whisper_model]["file"]}'
+        else:
+            self.setup_whisper(whisper_model)
+        self.startup.mark("preflight")
+        # 模型文件读入页缓存、导入VAD模块，与下面启动常驻进程并行
+        modules = PREWARM_MODULES
+        if backend == "transformers":
+            modules += TRANSFORMERS_MODULES
+        self.prewarm_thread = prewarm([self.whisper_model_path], modules)
+        self.setup_worker()
+        self.startup.mark("backend")
+
+        # 延迟预算调度: 字幕迟到超过 deadline 秒时降级到更小的模型
+        self.model_paths = self.find_models()
+        self.scheduler = None
+        self.dispatch_times = {}  # segment_id -> 片段切出的时间
+        if deadline:
+            self.scheduler = DeadlineScheduler(
+                self.fallback_models(), budget=deadline, stale_after=stale_after
+            )
+            print(
+                f"{Fore.GREEN}✓ 延迟预算 {deadline}s，可降级模型: {' → '.join(self.scheduler.models)}{Style.RESET_ALL}"
+            )
+            # 降级时才会加载小模型，提前读入页缓存
+            prewarm([self.model_paths[m] for m in self.scheduler.models[1:]])
+
+        # 设置采集源（默认使用BlackHole设备）；每路采集有自己的VAD和分段器
+        if sources is None and source is not None:
+            sources = [source]
+        if sources is None:
+            sources = []
+            for device in devices or [None]:
+                sources.extend(self.setup_audio_device(device, device_channels))
+        self.setup_pipeline(sources)
+        if journal:
+            self.setup_journal(journal, journal_minutes)
+        self.setup_metrics()
+        self.preflight.save()
+
+        ready = self.startup.mark("ready")
+        print(f"{Fore.GREEN}✓ 转录系统就绪 (启动 {ready:.2f}s){Style.RESET_ALL}")
+
+    def print_cpu_budget(self, pin_cpus=False):
+        budget = self.cpu_budget
+        quota = f"，cgroup配额 {budget.quota:g} 核" if budget.quota is not None else ""
+        pin = "，绑核" if budget.pin else ""
+        print(
+            f"{Fore.GREEN}✓ CPU预算: {budget.total} 线程（可用 {budget.available} 核{quota}），"
+            f"每次推理最多 {budget.max_per_job} 线程{pin}{Style.RESET_ALL}"
+        )
+        if pin_cpus and not budget.pin:
+            print(
+                f"{Fore.YELLOW}⚠️ 当前系统不支持绑核，忽略 --pin-cpus{Style.RESET_ALL}"
+            )
 
     def setup_whisper(self, whisper_model):
-        """设置Whisper模型"""
-        try:
-            result = subprocess.run(
-                ["../whisper.cpp/build/bin/whisper-cli", "--help"],
-                capture_output=True,
-                text=True,
-            )
-            print(f"{Fore.GREEN}✓ whisper-cli 可用{Style.RESET_ALL}")
-
-            model_configs = {
-                "tiny": {"file": "ggml-tiny.bin", "size": "39MB"},
-                "base": {"file": "ggml-base.bin", "size": "147MB"},
-                "small": {"file": "ggml-small.bin", "size": "244MB"},
-                "small.en": {"file": "ggml-small.en.bin", "size": "244MB"},
-                "medium": {"file": "ggml-medium.bin", "size": "769MB"},
-                "large-v3": {"file": "ggml-large-v3.bin", "size": "1.55GB"},
-            }
-
-            if whisper_model not in model_configs:
-                print(f"{Fore.RED}❌ 不支持的模型: {whisper_model}{Style.RESET_ALL}")
+        """设置Whisper模型；识别程序和模型文件的检查结果按文件签名缓存"""
+        if whisper_model not in MODEL_CONFIGS:
+            print(f"{Fore.RED}❌ 不支持的模型: {whisper_model}{Style.RESET_ALL}")
+            sys.exit(1)
+
+        # 检查实际使用的whisper-cli（cli后端、server启动失败时的回退和离线模式都用它）
+        cli = self.preflight.check_binary(self.whisper_cli)
+        if cli is None:
+            if self.backend == "cli":
+                print(
+                    f"{Fore.RED}❌ whisper-cli 未安装: {self.whisper_cli[0]}{Style.RESET_ALL}"
+                )
+                print(
+                    f"{Fore.YELLOW}macOS安装: brew install whisper-cpp{Style.RESET_ALL}"
+                )
                 sys.exit(1)
+            print(
+                f"{Fore.YELLOW}⚠️ 未找到 {self.whisper_cli[0]}，whisper-server 不可用时无法回退{Style.RESET_ALL}"
+            )
+        elif cli["returncode"] not in (0, None) or cli.get("error"):
+            print(
+                f"{Fore.YELLOW}⚠️ {cli['path']} --help 运行异常: {cli.get('error') or cli['returncode']}{Style.RESET_ALL}"
+            )
+        else:
+            cached = " (缓存)" if cli["cached"] else ""
+            print(
+                f"{Fore.GREEN}✓ whisper-cli 可用: {cli['path']}{cached}{Style.RESET_ALL}"
+            )
+
+        config = MODEL_CONFIGS[whisper_model]
+        self.whisper_model_path = f'./models/{config["file"]}'
+
+        # 检查模型文件大小
+        expected_sizes = {
+            "tiny": 39 * 1024 * 1024,  # 39MB
+            "base": 147 * 1024 * 1024,  # 147MB
+            "small": 244 * 1024 * 1024,  # 244MB
+            "medium": 769 * 1024 * 1024,  # 769MB
+            "large-v3": 1.55 * 1024 * 1024 * 1024,  # 1.55GB
+        }
+        expected_size = expected_sizes.get(whisper_model, 0)
+        model = self.preflight.check_model(self.whisper_model_path, expected_size)
+        if model is None:
+            print(
+                f"{Fore.RED}❌ 模型文件不存在: {self.whisper_model_path}{Style.RESET_ALL}"
+            )
+            print(
+                f"{Fore.YELLOW}请下载模型: curl -L -o {self.whisper_model_path} https://huggingface.co/ggerganov/whisper.cpp/resolve/main/{config['file']}{Style.RESET_ALL}"
+            )
+            sys.exit(1)
+
+        if not model["ok"]:  # 允许10%的误差
+            print(
+                f"{Fore.RED}❌ 模型文件可能损坏: {self.whisper_model_path}{Style.RESET_ALL}"
+            )
+            print(f"   当前大小: {model['size'] / (1024*1024):.1f}MB")
+            print(f"   期望大小: {expected_size / (1024*1024):.1f}MB")
+            print(f"{Fore.YELLOW}请重新下载模型文件{Style.RESET_ALL}")
+            sys.exit(1)
+
+        print(
+            f"{Fore.CYAN}🧠 使用Whisper模型: {whisper_model} ({config['size']}){Style.RESET_ALL}"
+        )
 
-            config = model_configs[whisper_model]
-            self.whisper_model_path = f'./models/{config["file"]}'
+    def setup_worker(self):
+        """启动常驻whisper-server或进程内模型，模型只加载一次"""
+        if self.backend == "transformers":
+            self.setup_transformers()
+            return
+        if self.backend != "server":
+            return
+
+        command = (
+            [self.whisper_server]
+            if isinstance(self.whisper_server, str)
+            else list(self.whisper_server)
+        )
+        self.server_command = command
+        if not shutil.which(command[0]):
+            print(
+                f"{Fore.YELLOW}⚠️ 未找到 {command[0]}，回退到每片段启动whisper-cli{Style.RESET_ALL}"
+            )
+            self.backend = "cli"
+            return
+
+        try:
+            self.worker = WhisperServerWorker(
+                self.whisper_model_path,
+                command=command,
+                threads=self.cpu_budget.max_per_job,
+            )
+            self.worker.start()
+            print(
+                f"{Fore.GREEN}✓ 常驻whisper-server已就绪 (端口 {self.worker.port}, 加载 {self.worker.startup_time:.2f}s){Style.RESET_ALL}"
+            )
+        except (OSError, WhisperWorkerError) as e:
+            print(
+                f"{Fore.YELLOW}⚠️ whisper-server 启动失败，回退到whisper-cli: {e}{Style.RESET_ALL}"
+            )
+            self.worker = None
+            self.backend = "cli"
 
+    def setup_transformers(self):
+        """在本进程中加载transformers模型；缺少依赖或加载失败时回退到whisper-cli"""
+        try:
+            self.worker = TransformersWhisperBackend(
+                self.hf_model,
+                threads=self.cpu_budget.max_per_job,
+                quantize=self.quantize,
+            ).start()
+            if self.batcher is not None:
+                # 按批推理时片段各自占一个30秒窗口，不拼接，也就没有总时长限制
+                self.batcher.max_seconds = None
+            precision = "int8动态量化" if self.quantize else "float32"
+            print(
+                f"{Fore.GREEN}✓ 进程内模型已加载: {self.hf_model} ({precision}，{self.worker.threads} 线程，加载 {self.worker.startup_time:.2f}s){Style.RESET_ALL}"
+            )
+        except ImportError as e:
+            print(
+                f"{Fore.YELLOW}⚠️ transformers后端需要torch和transformers ({e})，回退到whisper-cli{Style.RESET_ALL}"
+            )
+        except (OSError, ValueError, RuntimeError) as e:
+            print(
+                f"{Fore.YELLOW}⚠️ 加载 {self.hf_model} 失败，回退到whisper-cli: {e}{Style.RESET_ALL}"
+            )
+        if self.worker is None:
+            self.backend = "cli"
             if not os.path.exists(self.whisper_model_path):
+                self.setup_whisper(self.model_name)
+
+    def find_models(self):
+        """模型目录中已下载的模型: 模型名 -> 路径"""
+        if self.backend == "transformers":
+            # 进程内模型不按ggml文件降级（换模型要重新下载和加载）
+            return {self.model_name: self.whisper_model_path}
+        model_dir = os.path.dirname(self.whisper_model_path) or "."
+        paths = {
+            name: os.path.join(model_dir, config["file"])
+            for name, config in MODEL_CONFIGS.items()
+            if os.path.exists(os.path.join(model_dir, config["file"]))
+        }
+        paths[self.model_name] = self.whisper_model_path
+        return paths
+
+    def fallback_models(self):
+        """当前模型及比它小的已下载模型，按从大到小排列（不含 .en 变体）"""
+        order = list(MODEL_CONFIGS)
+        rank = order.index(self.model_name) if self.model_name in order else len(order)
+        smaller = [
+            name
+            for name in order[:rank]
+            if name in self.model_paths and not name.endswith(".en")
+        ]
+        return [self.model_name] + smaller[::-1]
+
+    def backend_for(self, model):
+        """返回 (实际使用的模型, 模型文件, 常驻进程或None)
+
+        server后端的降级模型需要另一个常驻进程，启动完成前继续使用当前模型
+        """
+        if model is None or model == self.model_name or model not in self.model_paths:
+            return self.model_name, self.whisper_model_path, self.worker
+        path = self.model_paths[model]
+        if self.worker is None:
+            return model, path, None
+        worker = self.model_workers.get(model)
+        if worker is None:
+            self.start_model_worker(model)
+            return self.model_name, self.whisper_model_path, self.worker
+        return model, path, worker
+
+    def start_model_worker(self, model):
+        """在后台线程中为降级模型启动常驻whisper-server"""
+        with self._model_lock:
+            if model in self._starting_models:
+                return
+            self._starting_models.add(model)
+
+        def run():
+            try:
+                worker = WhisperServerWorker(
+                    self.model_paths[model],
+                    command=self.server_command,
+                    threads=self.cpu_budget.max_per_job,
+                ).start()
+                self.model_workers[model] = worker
                 print(
-                    f"{Fore.RED}❌ 模型文件不存在: {self.whisper_model_path}{Style.RESET_ALL}"
+                    f"\n{Fore.GREEN}✓ 降级模型 {model} 已就绪 (加载 {worker.startup_time:.2f}s){Style.RESET_ALL}"
                 )
+            except (OSError, WhisperWorkerError) as e:
                 print(
-                    f"{Fore.YELLOW}请下载模型: curl -L -o {self.whisper_model_path} https://huggingface.co/ggerganov/whisper.cpp/resolve/main/{config['file']}{Style.RESET_ALL}"
+                    f"\n{Fore.YELLOW}⚠️ 降级模型 {model} 启动失败: {e}{Style.RESET_ALL}"
                 )
-                sys.exit(1)
 
-            # 检查模型文件大小
-            file_size = os.path.getsize(self.whisper_model_path)
-            expected_sizes = {
-                "tiny": 39 * 1024 * 1024,  # 39MB
-                "base": 147 * 1024 * 1024,  # 147MB
-                "small": 244 * 1024 * 1024,  # 244MB
-                "medium": 769 * 1024 * 1024,  # 769MB
-                "large-v3": 1.55 * 1024 * 1024 * 1024,  # 1.55GB
-            }
-
-            expected_size = expected_sizes.get(whisper_model, 0)
-            if file_size < expected_size * 0.9:  # 允许10%的误差
+        threading.Thread(target=run, name=f"start-{model}", daemon=True).start()
+
+    def setup_audio_device(self, device_spec=None, channels=None):
+        """设置音频设备，返回采集源列表
+
+        device_spec 为设备号或名称的一部分，默认选择BlackHole设备；
+        channels 为声道号列表（从1开始），指定时每个声道作为一路独立的采集源。
+        上次的选择会被缓存，设备号对应的设备名不变时不再列出全部设备
+        """
+        import sounddevice as sd
+
+        print(f"{Fore.CYAN}🎵 设置音频设备...{Style.RESET_ALL}")
+
+        choice = self.cached_audio_device(sd, device_spec)
+        if choice is None:
+            choice = self.choose_audio_device(sd, device_spec)
+            self.preflight.remember_device(device_spec, choice)
+        self.audio_device = choice["index"]
+        self.sample_rate = choice["sample_rate"]
+
+        if channels:
+            available = choice["max_input_channels"]
+            if max(channels) > available:
                 print(
-                    f"{Fore.RED}❌ 模型文件可能损坏: {self.whisper_model_path}{Style.RESET_ALL}"
+                    f"{Fore.RED}❌ 设备只有 {available} 个输入声道，无法采集声道 {max(channels)}{Style.RESET_ALL}"
                 )
-                print(f"   当前大小: {file_size / (1024*1024):.1f}MB")
-                print(f"   期望大小: {expected_size / (1024*1024):.1f}MB")
-                print(f"{Fore.YELLOW}请重新下载模型文件{Style.RESET_ALL}")
                 sys.exit(1)
 
-            print(
-                f"{Fore.CYAN}🧠 使用Whisper模型: {whisper_model} ({config['size']}){Style.RESET_ALL}"
+        block_size = int(self.sample_rate * self.frame_duration / 1000)
+        name = choice["name"]
+        if channels:
+            # 一个多声道输入流，按声道拆成多路采集
+            return MultiChannelDevice(
+                self.audio_device,
+                self.sample_rate,
+                channels,
+                block_size=block_size,
+                buffer_seconds=self.capture_buffer_seconds,
+            ).sources(name)
+        return [
+            DeviceSource(
+                self.audio_device,
+                self.sample_rate,
+                block_size=block_size,
+                buffer_seconds=self.capture_buffer_seconds,
+                name=name,
             )
+        ]
 
-        except FileNotFoundError:
-            print(f"{Fore.RED}❌ whisper-cli 未安装{Style.RESET_ALL}")
-            print(f"{Fore.YELLOW}macOS安装: brew install whisper-cpp{Style.RESET_ALL}")
-            sys.exit(1)
-
-    def setup_audio_device(self):
-        """设置音频设备"""
-        print(f"{Fore.CYAN}🎵 设置音频设备...{Style.RESET_ALL}")
+    def cached_audio_device(self, sd, device_spec):
+        """上次选择的设备；设备号对应的设备名或声道数变了就重新选择"""
+        choice = self.preflight.device_choice(device_spec)
+        if choice is None:
+            return None
+        try:
+            info = sd.query_devices(choice["index"])
+        except Exception:
+            info = None
+        if (
+            info is None
+            or info["name"] != choice["name"]
+            or info["max_input_channels"] != choice["max_input_channels"]
+        ):
+            self.preflight.forget_device(device_spec)
+            return None
+        choice = dict(choice, sample_rate=int(info["default_samplerate"]))
+        print(
+            f"{Fore.GREEN}✓ 使用上次选择的设备: [{choice['index']}] {choice['name']} ({choice['sample_rate']} Hz，--refresh-preflight 重新选择){Style.RESET_ALL}"
+        )
+        print()
+        return choice
 
+    def choose_audio_device(self, sd, device_spec):
+        """列出可用设备并选择输入设备，返回 {index, name, max_input_channels, sample_rate}"""
         # 列出可用设备
         devices = sd.query_devices()
         print(f"{Fore.YELLOW}可用音频设备:{Style.RESET_ALL}")
@@ -149,9 +686,19 @@ class SimpleTranscriber:
 
         print()
 
+        if device_spec is not None:
+            # 按设备号或名称选择
+            index = find_device(devices, device_spec)
+            if index is None:
+                print(f"{Fore.RED}❌ 未找到输入设备: {device_spec}{Style.RESET_ALL}")
+                sys.exit(1)
+            multi_output_id = None
+            print(
+                f"{Fore.GREEN}✓ 选择设备: [{index}] {devices[index]['name']}{Style.RESET_ALL}"
+            )
         # 选择BlackHole作为捕获设备
-        if blackhole_id is not None:
-            self.audio_device = blackhole_id
+        elif blackhole_id is not None:
+            index = blackhole_id
             print(
                 f"{Fore.GREEN}✓ 选择BlackHole设备: [{blackhole_id}] {devices[blackhole_id]['name']}{Style.RESET_ALL}"
             )
@@ -161,339 +708,1876 @@ class SimpleTranscriber:
 
         # 获取设备信息并设置采样率
         try:
-            device_info = sd.query_devices(self.audio_device, "input")
-            self.sample_rate = int(device_info["default_samplerate"])
-            print(
-                f"{Fore.GREEN}✓ 音频设备采样率: {self.sample_rate} Hz{Style.RESET_ALL}"
-            )
+            device_info = sd.query_devices(index, "input")
+            sample_rate = int(device_info["default_samplerate"])
+            print(f"{Fore.GREEN}✓ 音频设备采样率: {sample_rate} Hz{Style.RESET_ALL}")
         except Exception as e:
             print(
                 f"{Fore.YELLOW}⚠️ 无法获取设备采样率，使用默认值: {e}{Style.RESET_ALL}"
             )
-            self.sample_rate = 48000
+            sample_rate = 48000
+
+        # 检查Multi-Output Device配置
+        if multi_output_id is not None:
+            print(
+                f"{Fore.GREEN}✓ 发现Multi-Output Device: [{multi_output_id}] {devices[multi_output_id]['name']}{Style.RESET_ALL}"
+            )
+            print(
+                f"{Fore.CYAN}💡 建议将系统输出设置为Multi-Output Device{Style.RESET_ALL}"
+            )
+            print(
+                f"{Fore.CYAN}   这样音频会同时输出到Speakers和BlackHole{Style.RESET_ALL}"
+            )
 
-        # 计算帧大小和分段参数
-        self.frame_size = int(self.sample_rate * self.frame_duration / 1000)
+        print()
+        return {
+            "index": index,
+            "name": devices[index]["name"],
+            "max_input_channels": devices[index]["max_input_channels"],
+            "sample_rate": sample_rate,
+        }
+
+    def setup_pipeline(self, sources):
+        """计算分段参数，为每路采集源建立重采样、VAD和分段状态"""
         frames_per_second = 1000 / self.frame_duration
         self.min_segment_frames = int(self.min_segment_duration * frames_per_second)
         self.max_segment_frames = int(self.max_segment_duration * frames_per_second)
-
-        print(f"{Fore.GREEN}✓ 音频帧大小: {self.frame_size} 样本{Style.RESET_ALL}")
         print(
             f"{Fore.GREEN}✓ 分段参数: {self.min_segment_duration}s-{self.max_segment_duration}s{Style.RESET_ALL}"
         )
 
-        # 检查Multi-Output Device配置
-        if multi_output_id is not None:
+        self.channels = [
+            self.setup_channel(index, source) for index, source in enumerate(sources)
+        ]
+        if not self.channels:
+            # 没有本地采集源（网络服务模式），会话连接时再创建通道
+            return
+        names = [channel.name for channel in self.channels]
+        for channel in self.channels:
+            if names.count(channel.name) > 1:
+                # 同名采集源用序号区分，保证字幕标签唯一
+                channel.name = f"{channel.name}({channel.index + 1})"
+        if len(self.channels) > 1:
             print(
-                f"{Fore.GREEN}✓ 发现Multi-Output Device: [{multi_output_id}] {devices[multi_output_id]['name']}{Style.RESET_ALL}"
+                f"{Fore.GREEN}✓ 共 {len(self.channels)} 路采集，共用 {self.pool.num_workers} 个转录线程{Style.RESET_ALL}"
+            )
+
+        # 单路采集时直接使用的属性（离线模式、统计等）
+        first = self.channels[0]
+        self.source = first.source
+        self.sample_rate = first.source.sample_rate
+        self.frame_size = first.frame_size
+        self.resampler = first.resampler
+        self.vad = first.vad
+        self.segmenter = first.segmenter
+        self.streamer = first.streamer
+
+    def setup_journal(self, path, minutes):
+        """为每路本地采集打开采集日志（多路时每路一个文件）；已有同样大小的日志时接着写"""
+        for channel in self.channels:
+            journal_path = channel_path(path, channel.index, len(self.channels))
+            channel.journal = CaptureJournal(
+                journal_path, self.pipeline_rate, seconds=minutes * 60
             )
+            action = "新建" if channel.journal.created else "续写"
             print(
-                f"{Fore.CYAN}💡 建议将系统输出设置为Multi-Output Device{Style.RESET_ALL}"
+                f"{Fore.GREEN}✓ 采集日志: {journal_path}（{action}，保留最近 {minutes:g} 分钟）{Style.RESET_ALL}"
             )
+
+    def setup_channel(self, index, source, verbose=True):
+        """为一路采集源计算帧大小，创建重采样器、VAD、分段器和流式识别线程"""
+        sample_rate = source.sample_rate
+        if verbose:
             print(
-                f"{Fore.CYAN}   这样音频会同时输出到Speakers和BlackHole{Style.RESET_ALL}"
+                f"{Fore.GREEN}✓ 采集源: {source.name} ({sample_rate} Hz){Style.RESET_ALL}"
             )
 
-        print()
+        # 计算帧大小
+        frame_size = int(sample_rate * self.frame_duration / 1000)
+        if verbose:
+            print(f"{Fore.GREEN}✓ 音频帧大小: {frame_size} 样本{Style.RESET_ALL}")
+
+        # 采集端重采样到16kHz int16，只做一次
+        resampler = PolyphaseResampler(sample_rate, self.pipeline_rate)
+        if verbose and not resampler.passthrough:
+            print(
+                f"{Fore.GREEN}✓ 重采样: {sample_rate} Hz → {self.pipeline_rate} Hz{Style.RESET_ALL}"
+            )
+
+        frames_per_second = 1000 / self.frame_duration
+        segmenter = Segmenter(
+            self.vad_frame_size,
+            self.min_segment_frames,
+            self.max_segment_frames,
+            self.silence_threshold,
+            preroll_frames=self.preroll_frames,
+            tail_frames=self.tail_frames,
+            reserve_frames=(
+                int(self.controller.max_duration_range[1] * frames_per_second)
+                if self.controller is not None
+                else None
+            ),
+        )
 
-    def setup_vad(self):
-        """设置WebRTC VAD"""
+        channel = CaptureChannel(
+            index,
+            source,
+            frame_size,
+            resampler,
+            self.setup_vad(verbose and index == 0),
+            segmenter,
+        )
+        if self.stream:
+            channel.streamer = StreamingCaptioner(
+                lambda audio: self.transcribe_timestamped(audio, index)[0],
+                lambda event: self.display_stream_event(event, channel),
+                sample_rate=self.pipeline_rate,
+                step_seconds=self.stream_step,
+                max_window_seconds=self.stream_window,
+            )
+        return channel
+
+    def setup_vad(self, verbose=True):
+        """设置WebRTC VAD，返回VAD实例"""
         try:
-            # 创建VAD实例，敏感度设置为2（中等）
-            self.vad = webrtcvad.Vad(2)
-            print(f"{Fore.GREEN}✓ WebRTC VAD 初始化成功{Style.RESET_ALL}")
+            # 创建VAD实例，敏感度默认为2（中等），10ms子帧多数投票
+            vad = VadEngine(
+                sample_rate=self.pipeline_rate,
+                frame_ms=self.frame_duration,
+                aggressiveness=self.vad_mode,
+                min_votes=self.vad_votes,
+                hangover_frames=self.vad_hangover,
+            )
+            if verbose:
+                print(
+                    f"{Fore.GREEN}✓ WebRTC VAD 初始化成功 (投票 {vad.min_votes}/{vad.num_subframes}, 拖尾 {vad.hangover_frames} 帧){Style.RESET_ALL}"
+                )
+            return vad
         except Exception as e:
             print(f"{Fore.RED}❌ WebRTC VAD 初始化失败: {e}{Style.RESET_ALL}")
             print(f"{Fore.YELLOW}请确保已安装: pip install webrtcvad{Style.RESET_ALL}")
             sys.exit(1)
 
-    def audio_callback(self, indata, frames, time, status):
-        """音频回调函数 - 基于sounddevice官方示例"""
-        if status:
-            print(f"⚠️ 音频状态: {status}")
-        if self.listening:
-            self.audio_queue.put(indata.copy())
+    def setup_metrics(self):
+        """注册各阶段计时器和队列/线程池仪表"""
+        for stage in STAGES:
+            self.metrics.timer(stage)
+        for name in (
+            "segments",
+            "transcribed",
+            "failed",
+            "partials",
+            "finals",
+            "backend_errors",
+        ):
+            self.metrics.counter(name)
+        pool = self.pool
+        self.metrics.gauge("queue_depth", pool.queue_depth, "待转录片段数")
+        self.metrics.gauge(
+            "active_workers", lambda: pool.stats()["active"], "正在转录的线程数"
+        )
+        self.metrics.gauge(
+            "pending_reorder",
+            lambda: pool.stats()["pending_reorder"],
+            "等待按序输出的结果数",
+        )
+        channels = self.channels
+        self.metrics.gauge(
+            "capture_lag_seconds",
+            lambda: max(
+                (c.source.stats().get("lag_seconds") or 0.0 for c in channels),
+                default=None,
+            ),
+            "采集缓冲区积压（各路最大值）",
+        )
+        self.metrics.gauge(
+            "segmenter_active_frames",
+            lambda: sum(c.segmenter.active_frames() for c in channels),
+            "当前片段帧数（各路之和）",
+        )
+        self.metrics.gauge(
+            "segments_discarded",
+            lambda: sum(c.segmenter.discarded for c in channels),
+            "达到最大时长时语音帧不足、被丢弃的片段数",
+            kind="counter",
+        )
+        if len(channels) > 1:
+            self.metrics.gauge("capture_channels", lambda: len(channels), "采集路数")
+        for name in ("submitted", "completed", "dropped", "merged", "failed"):
+            self.metrics.gauge(
+                f"pool_{name}", lambda name=name: pool.stats()[name], kind="counter"
+            )
+        if self.scheduler is not None:
+            scheduler = self.scheduler
+            self.metrics.gauge(
+                "model_level", lambda: scheduler.level, "降级层数，0为首选模型"
+            )
+            self.metrics.gauge(
+                "caption_lateness_seconds",
+                lambda: scheduler.lateness,
+                "字幕迟到时间（滑动平均）",
+            )
+            for name in ("model_downgrades", "model_upgrades", "stale_skipped"):
+                self.metrics.counter(name)
+            self.metrics.counter("shed_merged")
+
+        if self.controller is not None:
+            controller = self.controller
+            self.metrics.gauge(
+                "segment_max_seconds", lambda: controller.max_duration, "最长片段"
+            )
+            self.metrics.gauge(
+                "segment_min_seconds", lambda: controller.min_duration, "最短片段"
+            )
+            self.metrics.gauge(
+                "silence_threshold_frames",
+                lambda: controller.silence_frames,
+                "结束片段所需的静音帧数",
+            )
+            self.metrics.gauge(
+                "backend_utilization", controller.utilization, "识别耗时/实时"
+            )
+        hub = self.hub
+        self.metrics.gauge(
+            "caption_subscribers", lambda: len(hub.subscribers), "字幕订阅者数"
+        )
+        self.metrics.gauge(
+            "captions_published",
+            lambda: hub.published,
+            "发布的字幕事件",
+            kind="counter",
+        )
+        self.metrics.gauge(
+            "caption_events_dropped",
+            lambda: sum(s.dropped for s in hub.subscribers),
+            "订阅者队列满时丢弃的事件（当前订阅者）",
+            kind="counter",
+        )
+        if self.result_cache is not None:
+            cache = self.result_cache
+            self.metrics.counter("cache_hits")
+            self.metrics.gauge("result_cache_entries", cache.__len__, "结果缓存条目数")
+            self.metrics.gauge(
+                "result_cache_hit_rate", cache.hit_rate, "结果缓存命中率"
+            )
+            self.metrics.gauge(
+                "result_cache_saved_seconds",
+                lambda: cache.saved_seconds,
+                "缓存命中省下的识别时间",
+                kind="counter",
+            )
+        if self.batcher is not None:
+            batcher = self.batcher
+            self.metrics.counter("batched_calls")
+            self.metrics.gauge(
+                "batch_mean_size", batcher.mean_size, "批量识别的平均片段数"
+            )
+            self.metrics.gauge(
+                "batch_calls_saved",
+                lambda: batcher.calls_saved,
+                "批量识别省下的识别调用次数",
+                kind="counter",
+            )
+            self.metrics.gauge(
+                "batch_saved_seconds",
+                lambda: batcher.saved_seconds,
+                "批量识别估计省下的识别时间",
+                kind="counter",
+            )
+        budget = self.cpu_budget
+        self.metrics.gauge("cpu_threads_budget", lambda: budget.total, "推理线程预算")
+        self.metrics.gauge(
+            "cpu_threads_in_use", lambda: budget.in_use, "正在运行的推理占用的线程数"
+        )
+        if self.language_tracker is not None:
+            tracker = self.language_tracker
+            self.metrics.counter("language_detections")
+            self.metrics.gauge(
+                "language_rechecks",
+                lambda: tracker.stats()["rechecks"],
+                "固定语言后重新检测的次数",
+                kind="counter",
+            )
+            self.metrics.gauge(
+                "language_pinned_segments",
+                lambda: tracker.stats()["pinned"],
+                "直接指定语言识别的片段数",
+                kind="counter",
+            )
+        journals = [c.journal for c in channels if c.journal is not None]
+        if journals:
+            self.metrics.gauge(
+                "journal_seconds",
+                lambda: sum(j.written - j.base for j in journals) / self.pipeline_rate,
+                "本次写入采集日志的音频时长（各路之和）",
+                kind="counter",
+            )
+        if self.speech_filter is not None:
+            speech_filter = self.speech_filter
+            self.metrics.counter("speech_filtered")
+            self.metrics.gauge(
+                "speech_filtered_seconds",
+                lambda: speech_filter.rejected_seconds,
+                "预筛跳过的音频时长",
+                kind="counter",
+            )
+            self.metrics.gauge(
+                "speech_filter_saved_seconds",
+                self.filtered_inference_seconds,
+                "预筛估计节省的识别时间",
+                kind="counter",
+            )
+        startup = self.startup
+        self.metrics.gauge(
+            "startup_seconds", lambda: startup.marks.get("ready"), "启动耗时"
+        )
+        self.metrics.gauge(
+            "time_to_first_caption_seconds",
+            lambda: startup.first_caption,
+            "进程启动到首条字幕（含部分结果）",
+        )
+        self.metrics.gauge(
+            "vad_fallbacks",
+            lambda: sum(c.vad.fallbacks for c in channels),
+            "VAD回退到能量检测的次数",
+            kind="counter",
+        )
 
-    def detect_speech(self, audio_chunk):
-        """使用WebRTC VAD进行语音活动检测"""
+    def start_metrics_server(self):
+        if self.metrics_port is None:
+            return
         try:
-            # WebRTC VAD支持的采样率和对应的帧长度
-            vad_configs = {
-                8000: 80,  # 10ms @ 8kHz
-                16000: 160,  # 10ms @ 16kHz
-                32000: 320,  # 10ms @ 32kHz
-                48000: 480,  # 10ms @ 48kHz
-            }
-
-            # 选择最接近的采样率
-            if self.sample_rate in vad_configs:
-                vad_sample_rate = self.sample_rate
-                vad_frame_size = vad_configs[vad_sample_rate]
-            else:
-                # 重采样到16000Hz
-                vad_sample_rate = 16000
-                vad_frame_size = vad_configs[vad_sample_rate]
-
-                # 计算重采样因子
-                downsample_factor = self.sample_rate // vad_sample_rate
-                if downsample_factor > 1:
-                    audio_chunk = audio_chunk[::downsample_factor]
-                else:
-                    # 如果采样率太低，进行上采样
-                    upsample_factor = vad_sample_rate // self.sample_rate
-                    audio_chunk = np.repeat(audio_chunk, upsample_factor)
-
-            # 确保音频长度是VAD帧大小的整数倍
-            if len(audio_chunk) < vad_frame_size:
-                # 如果太短，用零填充
-                audio_chunk = np.pad(
-                    audio_chunk, (0, vad_frame_size - len(audio_chunk))
-                )
-            elif len(audio_chunk) > vad_frame_size:
-                # 如果太长，截取到最近的帧边界
-                num_frames = len(audio_chunk) // vad_frame_size
-                audio_chunk = audio_chunk[: num_frames * vad_frame_size]
-
-            # 转换为int16格式，确保范围正确
-            audio_float = np.clip(audio_chunk, -1.0, 1.0)
-            audio_int16 = (audio_float * 32767).astype(np.int16)
-
-            # 使用WebRTC VAD检测语音
-            return self.vad.is_speech(audio_int16.tobytes(), vad_sample_rate)
-
-        except Exception as e:
-            print(f"VAD错误: {e}")
-            # VAD失败时，回退到简单的能量检测
-            try:
-                rms = np.sqrt(np.mean(audio_chunk**2))
-                threshold = 0.001
-                return rms > threshold
-            except:
-                return False
+            self.metrics_server = MetricsServer(
+                self.metrics,
+                port=self.metrics_port,
+                profiler=self.profiler,
+                hub=self.hub,
+            ).start()
+            print(
+                f"{Fore.GREEN}✓ 指标端点: http://127.0.0.1:{self.metrics_server.port}/metrics{Style.RESET_ALL}"
+            )
+        except OSError as e:
+            print(f"{Fore.YELLOW}⚠️ 指标端点启动失败: {e}{Style.RESET_ALL}")
+            self.metrics_server = None
+
+    def detect_speech(self, frame, vad=None):
+        """使用WebRTC VAD进行语音活动检测（输入为16kHz int16帧）"""
+        vad = vad or self.vad
+        fallbacks = vad.fallbacks
+        is_speech = vad.is_speech(frame)
+        if vad.fallbacks == 1 and fallbacks == 0:
+            print(f"VAD错误，回退到能量检测: {vad.last_error}")
+        return is_speech
 
     def save_audio_segment(self, audio_data):
-        """保存音频片段为临时文件"""
+        """保存音频片段为临时文件（仅用于file交接模式）"""
         with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-            audio_int16 = (audio_data * 32767).astype(np.int16)
-
             with wave.open(f.name, "wb") as wav_file:
                 wav_file.setnchannels(1)
                 wav_file.setsampwidth(2)
-                wav_file.setframerate(self.sample_rate)
-                wav_file.writeframes(audio_int16.tobytes())
+                wav_file.setframerate(self.pipeline_rate)
+                wav_file.writeframes(audio_data.tobytes())
 
             return f.name
 
-    def transcribe_with_whisper(self, audio_file):
-        """使用Whisper进行语音识别"""
+    def whisper_cli_command(
+        self,
+        audio_input,
+        threads=None,
+        timestamps=False,
+        model_path=None,
+        language=None,
+    ):
+        """构建whisper-cli命令，audio_input为文件路径或 "-"（标准输入）"""
+        return whisper_cli_command(
+            self.whisper_cli,
+            model_path or self.whisper_model_path,
+            audio_input,
+            language=language or self.language,
+            threads=threads or self.threads,
+            timestamps=timestamps,
+        )
+
+    def language_for(self, key=None):
+        """这一路下一个片段的识别语言（未启用会话级语言时为 --source 指定的语言）"""
+        if self.language_tracker is None:
+            return self.language
+        return self.language_tracker.language_for(key)
+
+    def observe_language(self, key, language, detected, probability, text):
+        if self.language_tracker is None:
+            return
+        if language == AUTO and detected:
+            self.metrics.inc("language_detections")
+        self.language_tracker.observe(key, language, detected, probability, text)
+
+    def cli_backend(self, model_path=None):
+        """某个模型文件的whisper-cli后端（线程数从CPU预算中领取）"""
+        model_path = model_path or self.whisper_model_path
+        backend = self.cli_backends.get(model_path)
+        if backend is None:
+            backend = self.cli_backends[model_path] = WhisperCliBackend(
+                self.whisper_cli, model_path, budget=self.cpu_budget
+            )
+        return backend
+
+    def run_backend(self, backend, audio_data, language, timestamps=False):
+        """按后端接受的输入格式提交一个片段并记录耗时，返回识别结果字典"""
+        timers = self.metrics.timers
+        if backend.accepts_pcm:
+            start = time.perf_counter()
+            result = backend.transcribe_pcm(audio_data, language, timestamps)
+        else:
+            with timers["serialize"].time():
+                wav_bytes = pcm_to_wav_bytes(audio_data, self.pipeline_rate)
+            start = time.perf_counter()
+            result = backend.transcribe_wav(wav_bytes, language, timestamps)
+        self.record_timings(result.get("timings"), time.perf_counter() - start)
+        return result
+
+    def record_timings(self, timings, elapsed):
+        """记录一次后端调用的耗时；等待CPU预算的时间不计入后端耗时"""
+        timings = timings or {}
+        timers = self.metrics.timers
+        timers["backend"].observe(elapsed - timings.get("wait", 0.0))
+        if "load" in timings:
+            timers["model_load"].observe(timings["load"])
+        if "total" in timings:
+            timers["inference"].observe(timings["total"] - timings.get("load", 0.0))
+
+    def transcribe_with_backend(self, audio_data, backend, key=None):
+        """通过识别后端转录一个片段，返回 (文本, 是否失败)；没有语音时文本为None"""
+        language = self.language_for(key)
         try:
-            # 构建whisper-cli命令
-            cmd = [
-                "whisper-cli",
-                "-m",
-                self.whisper_model_path,
-                "-f",
-                audio_file,
-                "--output-json",
-                "--language",
-                "auto",
-                "--no-timestamps",
-                "--threads",
-                "4",
-            ]
+            result = self.run_backend(backend, audio_data, language)
+            with self.metrics.timers["parse"].time():
+                text = result.get("text", "").strip()
+            text = text if text and len(text) > 3 else None
+            self.observe_language(key, language, *detected_language(result), text)
+            return text, False
+
+        except (
+            OSError,
+            ValueError,
+            RuntimeError,
+            subprocess.SubprocessError,
+            WhisperWorkerError,
+        ) as e:
+            self.metrics.inc("backend_errors")
+            print(f"❌ {backend.name}转录失败: {e}")
+            return None, True
+
+    def record_cli_timings(self, stderr):
+        """从whisper-cli的耗时统计中拆出模型加载和推理时间"""
+        timings = parse_whisper_timings(stderr)
+        if "load" in timings:
+            self.metrics.timers["model_load"].observe(timings["load"])
+        if "total" in timings:
+            self.metrics.timers["inference"].observe(
+                timings["total"] - timings.get("load", 0.0)
+            )
 
-            print(cmd)
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=15)
+    def transcribe_with_whisper(
+        self, audio_file, model_path=None, worker=None, key=None
+    ):
+        """使用Whisper识别临时WAV文件（file交接模式的回退路径），返回 (文本, 是否失败)"""
+        worker = worker or self.worker
+        if worker is not None:
+            with open(audio_file, "rb") as f:
+                audio_data, _ = wav_to_pcm(f.read())
+            return self.transcribe_with_backend(audio_data, worker, key)
+
+        # whisper-cli 把JSON写到 <output-file>.json
+        output_base = os.path.splitext(audio_file)[0]
+        json_file = output_base + ".json"
+        language = self.language_for(key)
+        try:
+            with self.cpu_budget.lease() as lease:
+                cmd = self.whisper_cli_command(
+                    audio_file,
+                    threads=lease.threads,
+                    model_path=model_path,
+                    language=language,
+                ) + [
+                    "--output-json",
+                    "--output-file",
+                    output_base,
+                ]
+                start = time.perf_counter()
+                result = run_pinned(
+                    cmd, lease.cpus, capture_output=True, text=True, timeout=15
+                )
+                self.metrics.timers["backend"].observe(time.perf_counter() - start)
+            self.record_cli_timings(result.stderr)
 
             if result.returncode == 0:
+                text = None
                 # 尝试解析JSON输出
-                json_file = audio_file.replace(".wav", ".json")
-
                 if os.path.exists(json_file):
                     try:
                         with open(json_file, "r") as f:
                             data = json.load(f)
-                            if "transcription" in data and data["transcription"]:
-                                text = data["transcription"][0]["text"].strip()
-                                if text and len(text) > 3:
-                                    return text
-                        os.unlink(json_file)
-                    except Exception as e:
+                        text = " ".join(
+                            item["text"].strip()
+                            for item in data.get("transcription", [])
+                        ).strip()
+                    except (OSError, ValueError, KeyError):
                         pass
 
                 # Fallback: 解析标准输出
-                if result.stdout:
-                    lines = result.stdout.strip().split("\n")
-                    for line in lines:
-                        line = line.strip()
-                        if (
-                            line
-                            and len(line) > 3
-                            and not line.startswith("[")
-                            and "whisper" not in line.lower()
-                        ):
-                            return line
+                if not (text and len(text) > 3):
+                    text = (
+                        parse_whisper_stdout(result.stdout) if result.stdout else None
+                    )
+                self.observe_language(
+                    key, language, *parse_detected_language(result.stderr), text
+                )
+                return text, False
 
-            return None
+            self.metrics.inc("backend_errors")
+            return None, True
 
         except Exception as e:
+            self.metrics.inc("backend_errors")
             print(f"❌ Whisper转录失败: {e}")
-            return None
+            return None, True
+
+        finally:
+            # 无论是否提前返回都清理JSON，避免/tmp堆积
+            try:
+                os.unlink(json_file)
+            except OSError:
+                pass
+
+    def transcribe_segment(self, audio_data, model_path=None, worker=None, key=None):
+        """转录一个片段，返回 (文本, 是否失败)：默认在内存中交接，file模式走临时文件；
+
+        key 为采集通道（决定识别语言）。失败和“没有语音”都没有文本，失败的结果不缓存
+        """
+        serialize = self.metrics.timers["serialize"]
+        worker = worker or self.worker
+        if self.handoff == "file":
+            with serialize.time():
+                audio_file = self.save_audio_segment(audio_data)
+            try:
+                return self.transcribe_with_whisper(audio_file, model_path, worker, key)
+            finally:
+                try:
+                    os.unlink(audio_file)
+                except OSError:
+                    pass
+
+        return self.transcribe_with_backend(
+            audio_data, worker or self.cli_backend(model_path), key
+        )
 
-    def process_audio_segment(self, audio_data, segment_id):
-        """处理音频片段"""
+    def transcribe_timestamped(
+        self, audio_data, key=None, model_path=None, worker=None
+    ):
+        """流式模式和批量识别使用: 返回 ([(起始秒, 结束秒, 文本)], 是否失败)，时间相对于片段开头"""
+        backend = worker or self.worker or self.cli_backend(model_path)
+        language = self.language_for(key)
         try:
-            start_time = time.time()
+            result = self.run_backend(backend, audio_data, language, timestamps=True)
+            with self.metrics.timers["parse"].time():
+                segments = [
+                    (item["start"], item["end"], item["text"].strip())
+                    for item in result.get("segments", [])
+                    if item.get("text", "").strip()
+                ]
+            self.observe_language(key, language, *detected_language(result), segments)
+            return segments, False
+
+        except (
+            OSError,
+            ValueError,
+            KeyError,
+            RuntimeError,
+            subprocess.SubprocessError,
+            WhisperWorkerError,
+        ) as e:
+            self.metrics.inc("backend_errors")
+            print(f"❌ {backend.name}带时间戳的识别失败: {e}")
+            return [], True
+
+    def batch_backend(self, job):
+        """支持按批推理的识别后端；不支持时返回None（批量识别改为拼接后按时间戳分回）"""
+        backend = job["worker"] or self.worker
+        return backend if backend is not None and backend.batched else None
+
+    def transcribe_batch(self, jobs):
+        """一次识别同一路的几个片段，返回 (文本列表, 是否失败)
+
+        后端支持按批推理时各片段放进同一个批次；否则用静音隔开拼成一段，按时间戳分回各片段
+        """
+        first = jobs[0]
+        backend = self.batch_backend(first)
+        if backend is not None:
+            return self.transcribe_batched(jobs, backend)
+        audio, bounds = self.batcher.join([job["audio"] for job in jobs])
+        segments, failed = self.transcribe_timestamped(
+            audio, first["key"], first["model_path"], first["worker"]
+        )
+        texts = [
+            text if text and len(text) > 3 else None
+            for text in self.batcher.split(segments, bounds)
+        ]
+        return texts, failed
+
+    def transcribe_batched(self, jobs, backend):
+        """后端的一次前向计算识别几个片段（同一路，识别语言相同）"""
+        key = jobs[0]["key"]
+        language = self.language_for(key)
+        try:
+            start = time.perf_counter()
+            results = backend.transcribe_batch([job["audio"] for job in jobs], language)
+            self.record_timings(results[0].get("timings"), time.perf_counter() - start)
+        except (OSError, ValueError, RuntimeError) as e:
+            self.metrics.inc("backend_errors")
+            print(f"❌ {backend.name}批量识别失败: {e}")
+            return [None] * len(jobs), True
+
+        texts = []
+        for result in results:
+            text = result.get("text", "").strip()
+            text = text if text and len(text) > 3 else None
+            self.observe_language(key, language, *detected_language(result), text)
+            texts.append(text)
+        return texts, False
+
+    def process_audio_segment(self, segment_id, audio_data):
+        """处理音频片段（在线程池的工作线程中运行）"""
+        job = self.prepare_segment(segment_id, audio_data)
+        if job is None:
+            return None
+        if job["cached"] is not None:
+            return self.finish_segment(job, job["cached"].text)
+        return self.transcribe_job(job)
+
+    def transcribe_job(self, job):
+        """单独识别一个片段"""
+        start = time.perf_counter()
+        transcription, failed = self.transcribe_segment(
+            job["audio"], job["model_path"], job["worker"], key=job["key"]
+        )
+        if self.batcher is not None and not failed:
+            self.batcher.observe_single(time.perf_counter() - start)
+        return self.finish_segment(job, transcription, cache_empty=not failed)
+
+    def process_segment_batch(self, items):
+        """批量处理同一路排队的片段: 逐个检查是否过期、查找缓存，其余的合并成尽量少的识别调用"""
+        jobs = [self.prepare_segment(segment_id, audio) for segment_id, audio in items]
+        results = [None] * len(jobs)
+        pending = []
+        for i, job in enumerate(jobs):
+            if job is None:
+                continue
+            if job["cached"] is not None:
+                results[i] = self.finish_segment(job, job["cached"].text)
+            else:
+                pending.append(i)
+
+        for group in self.batcher.plan([jobs[i] for i in pending]):
+            indexes = [pending[j] for j in group]
+            if len(indexes) == 1:
+                results[indexes[0]] = self.transcribe_job(jobs[indexes[0]])
+                continue
+            group_jobs = [jobs[i] for i in indexes]
+            start = time.perf_counter()
+            texts, failed = self.transcribe_batch(group_jobs)
+            elapsed = time.perf_counter() - start
+            # 失败的调用耗时不代表批量识别的开销，不计入批量大小的估计
+            if not failed:
+                self.batcher.observe_batch(len(group_jobs), elapsed)
+            self.metrics.inc("batched_calls")
+            # 拼接识别时片段的文字可能按时间戳落到相邻片段里，分到空结果不能当作“没有语音”缓存
+            cache_empty = not failed and self.batch_backend(group_jobs[0]) is not None
+            total = sum(len(job["audio"]) for job in group_jobs)
+            for i, text in zip(indexes, texts):
+                # 处理时间按时长分摊，自适应分段看到的是每个片段实际占用的识别时间
+                share = elapsed * len(jobs[i]["audio"]) / total
+                results[i] = self.finish_segment(
+                    jobs[i], text, cache_empty, processing_time=share
+                )
+        return results
+
+    def prepare_segment(self, segment_id, audio_data):
+        """识别前的准备: 过期检查、选择模型、查找缓存；片段过期时返回None"""
+        start_time = time.time()
+        dispatched = self.dispatch_times.pop(segment_id, None)
+        channel = self.segment_channels.pop(segment_id, None)
+
+        model = None
+        if self.scheduler is not None:
+            # 等待太久的片段即使识别出来也已经没有意义
+            if dispatched is not None and self.scheduler.is_stale(
+                start_time - dispatched
+            ):
+                self.scheduler.skipped += 1
+                self.metrics.inc("stale_skipped")
+                print(
+                    f"\n{Fore.YELLOW}⏭️ 片段 {segment_id} 已等待 {start_time - dispatched:.1f}s，跳过{Style.RESET_ALL}"
+                )
+                return None
+            model = self.scheduler.current_model
+
+        # 使用Whisper转录；缓存中有相同音频的结果时直接复用
+        model, model_path, worker = self.backend_for(model)
+        key = channel.index if channel is not None else None
+        # 识别结果取决于送给后端的语言，缓存按 (模型, 语言) 区分
+        language = self.language_for(key)
+        cached, fingerprint = None, None
+        if self.result_cache is not None:
+            with self.metrics.timers["fingerprint"].time():
+                fingerprint = self.result_cache.fingerprint(audio_data)
+                cached = self.result_cache.get(fingerprint, model, language)
+        if cached is not None:
+            self.metrics.inc("cache_hits")
+        return {
+            "segment_id": segment_id,
+            "audio": audio_data,
+            "start_time": start_time,
+            "dispatched": dispatched,
+            "channel": channel,
+            "key": key,
+            "language": language,
+            "model": model,
+            "model_path": model_path,
+            "worker": worker,
+            "fingerprint": fingerprint,
+            "cached": cached,
+        }
+
+    def finish_segment(
+        self, job, transcription, cache_empty=True, processing_time=None
+    ):
+        """识别后的处理: 写入缓存、生成结果、交给自适应控制器
+
+        cache_empty 为False时空结果不缓存（识别失败、拼接识别分不清是否真的没有语音），下次还会重试
+        """
+        if processing_time is None:
+            processing_time = time.time() - job["start_time"]
+        if job["fingerprint"] is not None and job["cached"] is None:
+            if transcription or cache_empty:
+                self.result_cache.put(
+                    job["fingerprint"],
+                    job["model"],
+                    transcription,
+                    processing_time,
+                    job["language"],
+                )
 
-            # 保存音频文件
-            audio_file = self.save_audio_segment(audio_data)
+        audio_data = job["audio"]
+        channel = job["channel"]
+        result = {
+            "segment_id": job["segment_id"],
+            "transcription": transcription,
+            "duration": len(audio_data) / self.pipeline_rate,
+            "processing_time": processing_time,
+            "model": job["model"],
+            "dispatched": job["dispatched"],
+            "source": channel.name if channel is not None else self.source.name,
+            "channel": channel.index if channel is not None else 0,
+            "cached": job["cached"] is not None,
+        }
+        # 缓存命中几乎不花识别时间，交给控制器会低估负载
+        if self.controller is not None and job["cached"] is None:
+            self.adapt_segmentation(result)
+        return result
+
+    def adapt_segmentation(self, result):
+        """把识别耗时交给自适应控制器，需要时更新分段参数并记录决策"""
+        decision = self.controller.observe(
+            result["duration"], result["processing_time"], self.pool.queue_depth()
+        )
+        if decision is None:
+            return
+
+        frames_per_second = 1000 / self.frame_duration
+        self.min_segment_duration = decision.min_duration
+        self.max_segment_duration = decision.max_duration
+        self.silence_threshold = decision.silence_frames
+        self.min_segment_frames = int(decision.min_duration * frames_per_second)
+        self.max_segment_frames = int(decision.max_duration * frames_per_second)
+        for channel in self.channels:
+            channel.segmenter.configure(
+                self.min_segment_frames,
+                self.max_segment_frames,
+                decision.silence_frames,
+            )
+        self.metrics.inc("segmentation_changes")
+        action = "加长" if decision.reason == "grow" else "缩短"
+        print(
+            f"\n{Fore.MAGENTA}🎛️ 自适应分段{action}: {decision.min_duration}s-{decision.max_duration}s，"
+            f"静音 {decision.silence_frames} 帧（负载 {decision.utilization:.2f}，"
+            f"预计延迟 {decision.latency:.1f}s，积压 {decision.backlog}）{Style.RESET_ALL}"
+        )
 
-            # 使用Whisper转录
-            transcription = self.transcribe_with_whisper(audio_file)
+    def display_result(self, result):
+        """按segment_id顺序显示并记录转录结果"""
+        with self.metrics.timers["display"].time():
+            self._display_result(result)
+
+    def segment_skipped(self, key, segment_id, reason):
+        """片段没有结果（被丢弃、过期跳过或处理失败）: 清理分发时记录的状态，通知网络会话"""
+        self.dispatch_times.pop(segment_id, None)
+        self.segment_channels.pop(segment_id, None)
+        hook = self.result_hooks.get(key)
+        if hook is not None:
+            hook({"type": "skipped", "segment_id": segment_id, "reason": reason})
+
+    def observe_lateness(self, result):
+        """把字幕迟到时间交给调度器，需要时切换模型"""
+        if result.get("dispatched") is None:
+            return
+        lateness = time.time() - result["dispatched"]
+        self.metrics.observe("caption_lateness", lateness)
+        backlog = (
+            self.pool.queue_depth() * result["processing_time"] / self.pool.num_workers
+        )
+        switch = self.scheduler.observe(lateness, backlog)
+        if switch is None:
+            return
 
-            # 清理临时文件
-            try:
-                os.unlink(audio_file)
-            except:
-                pass
+        if switch.action == "downgrade":
+            self.metrics.inc("model_downgrades")
+            print(
+                f"\n{Fore.MAGENTA}⬇️ 字幕迟到 {switch.lateness:.1f}s，超出预算 {self.scheduler.budget}s，"
+                f"新片段改用 {switch.model}（原 {switch.previous}）{Style.RESET_ALL}"
+            )
+        else:
+            self.metrics.inc("model_upgrades")
+            print(
+                f"\n{Fore.MAGENTA}⬆️ 已追上进度，新片段换回 {switch.model}{Style.RESET_ALL}"
+            )
+        # 提前启动新模型的常驻进程
+        self.backend_for(switch.model)
+
+    def _display_result(self, result):
+        if self.scheduler is not None:
+            self.observe_lateness(result)
+        hook = self.result_hooks.get(result.get("channel"))
+        if hook is not None:
+            hook(result)
+
+        segment_id = result["segment_id"]
+        if not result["transcription"]:
+            self.metrics.inc("failed")
+            print(f"\n{Fore.RED}❌ 片段 {segment_id} 转录失败{Style.RESET_ALL}")
+            return
+
+        self.metrics.inc("transcribed")
+
+        self.startup.caption()
+        self.history.append(CaptionRecord.from_result(result))
+        self.hub.publish(self.caption_event(result))
+
+        # 显示结果（多路采集时标出来源）
+        model = result.get("model")
+        model_note = f", {model}" if model and model != self.model_name else ""
+        if result.get("cached"):
+            model_note += ", 缓存"
+        print(
+            f"\n{Fore.GREEN}📝 {self.source_label(result.get('source'))}片段 {segment_id} ({result['duration']:.1f}s{model_note}):{Style.RESET_ALL}"
+        )
+        print(f"{Fore.CYAN}{result['transcription']}{Style.RESET_ALL}")
+        print(
+            f"{Fore.YELLOW}处理时间: {result['processing_time']:.2f}s{Style.RESET_ALL}"
+        )
 
-            if transcription:
-                processing_time = time.time() - start_time
+    def source_label(self, name):
+        """多路采集（或网络会话）时字幕前的来源标签"""
+        if len(self.channels) != 1 and name:
+            return f"[{name}] "
+        return ""
+
+    def caption_event(self, result):
+        """转录结果 → 发布给订阅者的 final 事件"""
+        dispatched = result.get("dispatched")
+        return {
+            "type": "final",
+            "segment_id": result["segment_id"],
+            "source": result.get("source"),
+            "text": result["transcription"],
+            "duration": result["duration"],
+            "processing_time": result["processing_time"],
+            "latency": time.time() - dispatched if dispatched else None,
+            "model": result.get("model"),
+        }
+
+    def display_stream_event(self, event, channel=None):
+        """显示流式字幕事件: partial 在同一行原地刷新，final 换行输出"""
+        channel = channel or self.channels[0]
+        event["source"] = channel.name
+        hook = self.result_hooks.get(channel.index)
+        if hook is not None:
+            hook(event)
+        if event["type"] == "partial" or event["text"]:
+            self.startup.caption()
+            self.hub.publish(dict(event))
+        label = self.source_label(channel.name)
+        if event["type"] == "partial":
+            self.metrics.inc("partials")
+            self.metrics.observe("partial_latency", event["latency"])
+            # 只显示末尾部分，避免长句换行后无法原地刷新
+            committed, tentative = event["committed"][-60:], event["tentative"][-40:]
+            print(
+                f"\r\033[K{Fore.CYAN}💬 {label}{committed}{Style.DIM} {tentative}{Style.RESET_ALL}",
+                end="",
+                flush=True,
+            )
+            return
+
+        self.metrics.inc("finals")
+        self.metrics.observe("final_latency", event["latency"])
+        if not event["text"]:
+            print("\r\033[K", end="", flush=True)
+            return
+        self.history.append(CaptionRecord.from_event(event))
+        print(
+            f"\r\033[K{Fore.GREEN}📝 {label}[{event['start']:.1f}s-{event['end']:.1f}s]{Style.RESET_ALL} "
+            f"{Fore.CYAN}{event['text']}{Style.RESET_ALL}"
+        )
 
-                # 记录转录结果
-                result = {
-                    "segment_id": segment_id,
-                    "transcription": transcription,
-                    "duration": len(audio_data) / self.sample_rate,
-                    "processing_time": processing_time,
-                    "timestamp": time.strftime("%H:%M:%S"),
-                }
+    def stream_frame(self, channel):
+        """流式模式: 语句进行中每隔 stream_step 提交一次滑动窗口识别"""
+        segmenter = channel.segmenter
+        if not segmenter.active:
+            channel.stream_frames = 0
+            return
+        channel.stream_frames += 1
+        if channel.stream_frames % self.stream_step_frames:
+            return
+        utterance = segmenter.start
+        start = max(channel.streamer.window_start(utterance), segmenter.ring.oldest)
+        channel.streamer.request_partial(
+            utterance, start, segmenter.ring.slice(start, segmenter.ring.written)
+        )
 
-                self.transcription_history.append(result)
+    def process_block(self, block, channel=None):
+        """处理采集源的一块音频: 重采样 → VAD → 分段 → 提交线程池"""
+        channel = channel or self.channels[0]
+        timers = self.metrics.timers
+
+        # 采集后立即重采样为16kHz int16，后续各阶段共用这一份数据
+        start = time.perf_counter()
+        frame = channel.resampler.process(block)
+        if channel.journal is not None:
+            # 写入映射内存，没有系统调用
+            channel.journal.write(frame)
+        resampled = time.perf_counter()
+        is_speech = self.detect_speech(frame, channel.vad)
+        detected = time.perf_counter()
+        segment = channel.segmenter.push(frame, is_speech)
+        timers["resample"].observe(resampled - start)
+        timers["vad"].observe(detected - resampled)
+        timers["segment"].observe(time.perf_counter() - detected)
+
+        if channel.streamer is not None:
+            if segment is not None:
+                self.dispatch_segment(segment, channel)
+            self.stream_frame(channel)
+            return
+
+        # 显示进度（多路采集时各路交替输出，不显示）
+        speech_count = channel.segmenter.speech_count
+        if (
+            len(self.channels) == 1
+            and is_speech
+            and speech_count
+            and speech_count % 10 == 0
+        ):
+            duration = speech_count * self.frame_duration / 1000
+            print(
+                f"\r{Fore.CYAN}🗣️ 录音中: {duration:.1f}s{Style.RESET_ALL}",
+                end="",
+                flush=True,
+            )
 
-                # 显示结果
+        if segment is not None:
+            self.dispatch_segment(segment, channel)
+
+    def dispatch_segment(self, segment, channel=None):
+        """把切好的片段交给线程池（队列满时按溢出策略处理）；流式模式交给流式识别线程
+
+        线程池按采集通道分别排队、轮流处理，一路持续说话不会挤占其他路
+        """
+        channel = channel or self.channels[0]
+        with self._dispatch_lock:
+            self.segment_counter += 1
+            segment_id = self.segment_counter
+        channel.segments += 1
+        self.metrics.inc("segments")
+        if channel.journal is not None:
+            channel.journal.mark_segment(
+                segment_id, segment.start, segment.end, channel.index
+            )
+        if channel.streamer is not None:
+            channel.streamer.finish(segment)
+            channel.accepted += 1
+            return
+
+        audio = segment.audio
+        label = self.source_label(channel.name)
+        if self.speech_filter is not None:
+            with self.metrics.timers["speech_score"].time():
+                audio, score = self.speech_filter.check(
+                    audio, segment.speech_frames, key=channel.index
+                )
+            if audio is None:
+                self.metrics.inc("speech_filtered")
+                action = "暂缓" if self.speech_filter.policy == "defer" else "跳过"
                 print(
-                    f"\n{Fore.GREEN}📝 片段 {segment_id} ({result['duration']:.1f}s):{Style.RESET_ALL}"
+                    f"\r{Fore.YELLOW}🔇 {label}{action}片段 ({len(segment.audio) / self.pipeline_rate:.1f}s，语音评分 {score.score:.2f}){Style.RESET_ALL}"
                 )
-                print(f"{Fore.CYAN}{transcription}{Style.RESET_ALL}")
-                print(f"{Fore.YELLOW}处理时间: {processing_time:.2f}s{Style.RESET_ALL}")
-            else:
-                print(f"\n{Fore.RED}❌ 片段 {segment_id} 转录失败{Style.RESET_ALL}")
-
+                return
+
+        duration = len(audio) / self.pipeline_rate
+        print(f"\r{Fore.GREEN}📝 {label}处理片段 ({duration:.1f}s)...{Style.RESET_ALL}")
+        self.dispatch_times[segment_id] = time.time()
+        self.segment_channels[segment_id] = channel
+
+        # 超出延迟预算时把新片段并入排队的片段，减少识别调用次数
+        shedding = self.scheduler is not None and self.scheduler.shedding
+        if not self.pool.submit(segment_id, audio, merge=shedding, key=channel.index):
+            self.dispatch_times.pop(segment_id, None)
+            self.segment_channels.pop(segment_id, None)
+            if shedding:
+                self.scheduler.merged += 1
+                self.metrics.inc("shed_merged")
+            return
+        channel.accepted += 1
+
+    def capture_loop(self, channel):
+        """读取一路采集源直到输入结束或停止转录；返回True表示输入正常结束"""
+        capture_wait = self.metrics.timers["capture_wait"]
+        with channel.source:
+            blocks = channel.source.blocks(channel.frame_size)
+            while True:
+                if not self.listening:
+                    return False
+                start = time.perf_counter()
+                block = next(blocks, None)
+                if block is None:
+                    break
+                capture_wait.observe(time.perf_counter() - start)
+                if channel.index == 0:
+                    # cProfile只分析启用它的线程，由第一路采集负责
+                    self.profiler.tick()
+                self.process_block(block, channel)
+
+        # 输入结束（文件/标准输入）: 输出最后一个未完成的片段
+        self.finish_channel(channel)
+        return True
+
+    def finish_channel(self, channel):
+        """一路输入结束: 提交最后一个未完成的片段，丢弃预筛暂存的片段"""
+        segment = channel.segmenter.flush()
+        if segment is not None:
+            self.dispatch_segment(segment, channel)
+        if self.speech_filter is not None:
+            self.speech_filter.flush(channel.index)
+
+    def capture_thread(self, channel, finished):
+        """多路采集时每路一个线程；finished 记录各路是否正常结束"""
+        try:
+            finished[channel.index] = self.capture_loop(channel)
         except Exception as e:
-            print(f"❌ 处理音频片段失败: {e}")
+            print(f"\n{Fore.RED}❌ 采集源 {channel.name} 出错: {e}{Style.RESET_ALL}")
 
     def start_transcription(self):
         """开始转录"""
         print(f"{Fore.CYAN}🎤 开始音频转录...{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}💡 请播放音频或说话...{Style.RESET_ALL}")
+        if self.source.realtime:
+            print(f"{Fore.YELLOW}💡 请播放音频或说话...{Style.RESET_ALL}")
         print(f"{Fore.YELLOW}💡 按 Ctrl+C 停止转录{Style.RESET_ALL}")
         print()
 
-        # 音频缓冲
-        speech_frames = []
-        silence_count = 0
-
         self.listening = True
+        self.startup.mark("listening")
+        self.pool.start()
+        streamers = [c.streamer for c in self.channels if c.streamer is not None]
+        for streamer in streamers:
+            streamer.start()
+        self.start_metrics_server()
+        finished = False
+        threads = []
 
         try:
-            # 启动音频流 - 基于sounddevice官方示例
-            with sd.InputStream(
-                device=self.audio_device,
-                samplerate=self.sample_rate,
-                channels=1,
-                dtype=np.float32,
-                blocksize=self.frame_size,
-                callback=self.audio_callback,
-            ):
-                print(f"{Fore.GREEN}🎧 开始监听音频...{Style.RESET_ALL}")
-
-                while True:
-                    try:
-                        # 从队列获取音频数据
-                        audio_chunk = self.audio_queue.get(timeout=0.1)
-                        is_speech = self.detect_speech(audio_chunk.flatten())
-
-                        if is_speech:
-                            speech_frames.append(audio_chunk.flatten())
-                            silence_count = 0
-
-                            # 显示进度
-                            if len(speech_frames) % 10 == 0:  # 更频繁的进度显示
-                                duration = (
-                                    len(speech_frames) * self.frame_duration / 1000
-                                )
-                                print(
-                                    f"\r{Fore.CYAN}🗣️ 录音中: {duration:.1f}s{Style.RESET_ALL}",
-                                    end="",
-                                    flush=True,
-                                )
-                        else:
-                            silence_count += 1
-
-                        # 判断是否处理片段
-                        should_process = False
-
-                        if speech_frames:
-                            # 达到最小时长且有足够静音
-                            if (
-                                len(speech_frames) >= self.min_segment_frames
-                                and silence_count >= self.silence_threshold
-                            ):
-                                should_process = True
-                            # 或者达到最大时长
-                            elif len(speech_frames) >= self.max_segment_frames:
-                                should_process = True
-
-                        if should_process:
-                            duration = len(speech_frames) * self.frame_duration / 1000
-                            print(
-                                f"\r{Fore.GREEN}📝 处理片段 ({duration:.1f}s)...{Style.RESET_ALL}"
-                            )
-
-                            full_audio = np.concatenate(speech_frames)
-                            self.segment_counter += 1
-
-                            # 异步处理
-                            threading.Thread(
-                                target=self.process_audio_segment,
-                                args=(full_audio, self.segment_counter),
-                                daemon=True,
-                            ).start()
-
-                            # 重置
-                            speech_frames = []
-                            silence_count = 0
-
-                    except queue.Empty:
-                        continue
+            print(f"{Fore.GREEN}🎧 开始监听音频...{Style.RESET_ALL}")
+            if len(self.channels) == 1:
+                finished = self.capture_loop(self.channels[0])
+            else:
+                # 每路采集一个线程，各自做重采样/VAD/分段，片段交给同一个线程池
+                results = [False] * len(self.channels)
+                threads = [
+                    threading.Thread(
+                        target=self.capture_thread,
+                        args=(channel, results),
+                        name=f"capture-{channel.index}",
+                        daemon=True,
+                    )
+                    for channel in self.channels
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    # 带超时等待，主线程才能收到 Ctrl+C
+                    while thread.is_alive():
+                        thread.join(0.5)
+                finished = all(results)
 
         except KeyboardInterrupt:
             print(f"\n{Fore.CYAN}🛑 停止转录...{Style.RESET_ALL}")
-            self.listening = False
-            time.sleep(1)
-            print(f"{Fore.GREEN}👋 转录结束！{Style.RESET_ALL}")
-
-            # 显示统计信息
-            if self.transcription_history:
-                total_segments = len(self.transcription_history)
-                avg_time = (
-                    sum(item["processing_time"] for item in self.transcription_history)
-                    / total_segments
+
+        self.listening = False
+        for thread in threads:
+            thread.join(1.0)
+        for streamer in streamers:
+            streamer.stop(timeout=None if finished else 5.0)
+        self.stop_services(finished)
+        print(f"{Fore.GREEN}👋 转录结束！{Style.RESET_ALL}")
+        self.print_statistics()
+
+    def stop_services(self, finished=True):
+        """停止线程池、常驻识别进程和指标端点；finished 为True时等待所有片段转录完成"""
+        self.pool.stop(timeout=None if finished else 5.0)
+        for worker in {self.worker, *self.model_workers.values()} - {None}:
+            worker.stop()
+        self.profiler.finish()
+        if self.profiler.last_path:
+            print(
+                f"{Fore.YELLOW}📊 性能分析已写入 {self.profiler.last_path}{Style.RESET_ALL}"
+            )
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        # 等文件等订阅者写完剩余的字幕
+        self.hub.close()
+        self.history.close()
+        for channel in self.channels:
+            if channel.journal is not None:
+                channel.journal.close()
+
+    def filtered_inference_seconds(self):
+        """预筛跳过的音频按目前的识别速度（识别耗时/音频时长）折算成省下的识别时间"""
+        history = self.history.stats()
+        speech = history["duration"]["sum"]
+        if self.speech_filter is None or not speech:
+            return None
+        rtf = history["processing_time"]["sum"] / speech
+        return self.speech_filter.rejected_seconds * rtf
+
+    def print_statistics(self):
+        """显示统计信息"""
+        phases = "，".join(
+            f"{name} {seconds:.2f}s" for name, seconds in self.startup.phases()
+        )
+        first = self.startup.first_caption
+        first_note = f"，首条字幕 {first:.2f}s" if first is not None else ""
+        print(f"{Fore.YELLOW}⏱️ 启动: {phases}{first_note}{Style.RESET_ALL}")
+
+        history = self.history.stats()
+        if history["total"]:
+            processing = history["processing_time"]
+            print(
+                f"{Fore.YELLOW}📊 统计: 共处理 {history['total']} 个片段，"
+                f"语音 {history['duration']['sum']:.1f}s，"
+                f"平均处理时间 {processing['mean']:.2f}s（最长 {processing['max']:.2f}s）{Style.RESET_ALL}"
+            )
+
+        for channel in self.channels:
+            label = self.source_label(channel.name)
+            capture_stats = channel.source.stats()
+            if capture_stats:
+                print(
+                    f"{Fore.YELLOW}📊 {label}采集: 溢出 {capture_stats['overflows']} 次，"
+                    f"丢弃 {capture_stats['dropped_samples']} 样本，"
+                    f"最大积压 {capture_stats['max_lag_seconds']:.2f}s{Style.RESET_ALL}"
                 )
+
+            vad_stats = channel.vad.stats()
+            print(
+                f"{Fore.YELLOW}📊 {label}VAD: {vad_stats['frames']} 帧，语音占比 {vad_stats['speech_ratio']:.0%}，"
+                f"回退 {vad_stats['fallbacks']} 次，片段 {channel.segments}{Style.RESET_ALL}"
+            )
+            if channel.journal is not None:
+                journal_stats = channel.journal.stats()
                 print(
-                    f"{Fore.YELLOW}📊 统计: 共处理 {total_segments} 个片段，平均处理时间 {avg_time:.2f}s{Style.RESET_ALL}"
+                    f"{Fore.YELLOW}📊 {label}采集日志: 写入 {journal_stats['written_seconds']:.1f}s"
+                    f"（容量 {journal_stats['capacity_seconds']:.0f}s），"
+                    f"累计片段 {journal_stats['segments']} → {journal_stats['path']}{Style.RESET_ALL}"
                 )
 
+        pool_stats = self.pool.stats()
+        depth = f"{pool_stats['max_depth_seen']}/{pool_stats['max_queue']}"
+        if len(self.channels) != 1:
+            # 多路时队列上限按路计算，深度为各路之和
+            depth = (
+                f"{pool_stats['max_depth_seen']}（每路上限 {pool_stats['max_queue']}）"
+            )
+        print(
+            f"{Fore.YELLOW}📊 队列: 最大深度 {depth}，"
+            f"丢弃 {pool_stats['dropped']}，合并 {pool_stats['merged']}{Style.RESET_ALL}"
+        )
+
+        if self.batcher is not None and self.batcher.batches:
+            batch_stats = self.batcher.stats()
+            sizes = "，".join(
+                f"{size}个×{count}" for size, count in batch_stats["sizes"].items()
+            )
+            # 没有单独识别过的片段时无从估计节省的时间
+            saved = (
+                f"，估计节省识别 {batch_stats['saved_seconds']:.1f}s"
+                if batch_stats["single_seconds"] is not None
+                else ""
+            )
+            print(
+                f"{Fore.YELLOW}📊 批量识别: {batch_stats['batches']} 批共 {batch_stats['segments']} 个片段"
+                f"（{sizes}），省下 {batch_stats['calls_saved']} 次调用{saved}{Style.RESET_ALL}"
+            )
+
+        if self.backend == "transformers" and self.worker is not None:
+            model_stats = self.worker.stats()
+            rtf = (
+                f"，推理RTF {model_stats['rtf']:.3f}"
+                if model_stats["rtf"] is not None
+                else ""
+            )
+            print(
+                f"{Fore.YELLOW}📊 进程内模型: {model_stats['batches']} 次前向计算共 {model_stats['segments']} 个片段"
+                f"（平均每批 {model_stats['mean_batch']:.1f}，最大 {model_stats['max_batch_seen']}），"
+                f"推理 {model_stats['inference_seconds']:.1f}s{rtf}{Style.RESET_ALL}"
+            )
+
+        if self.cpu_budget.leases:
+            budget_stats = self.cpu_budget.stats()
+            print(
+                f"{Fore.YELLOW}📊 CPU预算: 共 {budget_stats['total']} 线程，{budget_stats['leases']} 次推理"
+                f"平均 {budget_stats['mean_threads']:.1f} 线程，最多同时占用 {budget_stats['max_in_use']}，"
+                f"等待线程 {budget_stats['waits']} 次（{budget_stats['wait_seconds']:.1f}s）{Style.RESET_ALL}"
+            )
+
+        if self.speech_filter is not None and self.speech_filter.scored:
+            filter_stats = self.speech_filter.stats()
+            saved = self.filtered_inference_seconds()
+            saved_note = f"，估计节省识别 {saved:.1f}s" if saved is not None else ""
+            print(
+                f"{Fore.YELLOW}📊 语音预筛: 评分 {filter_stats['scored']} 个片段，跳过 {filter_stats['rejected']} 个"
+                f"（音频 {filter_stats['rejected_seconds']:.1f}s），暂缓后识别 {filter_stats['recovered']} 个{saved_note}{Style.RESET_ALL}"
+            )
+
+        if self.result_cache is not None and self.result_cache.lookups:
+            cache_stats = self.result_cache.stats()
+            print(
+                f"{Fore.YELLOW}📊 结果缓存: 查找 {cache_stats['lookups']} 次，命中 {cache_stats['hits']} 次"
+                f"（{cache_stats['hit_rate']:.0%}，近似 {cache_stats['near_hits']}），"
+                f"节省识别 {cache_stats['saved_seconds']:.1f}s，条目 {cache_stats['entries']}/{cache_stats['capacity']}，"
+                f"淘汰 {cache_stats['evictions']}，过期 {cache_stats['expirations']}{Style.RESET_ALL}"
+            )
+
+        if self.language_tracker is not None:
+            for key, state in self.language_tracker.stats()["sessions"].items():
+                channel = next((c for c in self.channels if c.index == key), None)
+                label = self.source_label(channel.name) if channel is not None else ""
+                probability = state["probability"]
+                confidence = (
+                    f"（p={probability:.2f}）" if probability is not None else ""
+                )
+                print(
+                    f"{Fore.YELLOW}📊 {label}语言: {state['language'] or '未确定'}{confidence}，"
+                    f"语种识别 {state['detections']} 个片段，固定语言 {state['pinned']} 个，"
+                    f"复查 {state['rechecks']} 次，切换 {state['switches']} 次{Style.RESET_ALL}"
+                )
+
+        if self.scheduler is not None:
+            scheduler_stats = self.scheduler.stats()
+            print(
+                f"{Fore.YELLOW}📊 延迟预算: 当前模型 {scheduler_stats['model']}，降级 {scheduler_stats['downgrades']} 次，"
+                f"恢复 {scheduler_stats['upgrades']} 次，跳过 {scheduler_stats['skipped']}，合并 {scheduler_stats['merged']}，"
+                f"最大迟到 {scheduler_stats['max_lateness']:.1f}s{Style.RESET_ALL}"
+            )
+
+        if self.controller is not None:
+            controller_stats = self.controller.stats()
+            print(
+                f"{Fore.YELLOW}📊 自适应分段: 调整 {controller_stats['decisions']} 次，最终 "
+                f"{controller_stats['min_duration']}s-{controller_stats['max_duration']}s，"
+                f"静音 {controller_stats['silence_frames']} 帧，负载 {controller_stats['utilization']:.2f}{Style.RESET_ALL}"
+            )
+
+        if self.streamer is not None:
+            stream_stats = {}
+            for channel in self.channels:
+                for name, value in channel.streamer.stats().items():
+                    stream_stats[name] = stream_stats.get(name, 0) + value
+            print(
+                f"{Fore.YELLOW}📊 流式: {stream_stats['partials']} 次部分结果，{stream_stats['finals']} 句最终结果，"
+                f"确认 {stream_stats['committed_words']} 词，合并请求 {stream_stats['coalesced']}{Style.RESET_ALL}"
+            )
+
+        stages = self.metrics.snapshot()["stages"]
+        summary = "，".join(
+            f"{name} {stats['sum'] / stats['count'] * 1000:.2f}ms"
+            for name, stats in stages.items()
+            if stats["count"]
+        )
+        if summary:
+            print(f"{Fore.YELLOW}📊 阶段平均耗时: {summary}{Style.RESET_ALL}")
+
+    def transcribe_offline(self, jobs=None, chunk_seconds=30.0):
+        """离线模式: 读完整个输入，在静音处切块，多进程并行转录后按顺序合并"""
+        total = self.cpu_budget.total
+        jobs = jobs or max(1, total // 4)
+        threads = max(1, min(self.threads, total // jobs))
+
+        start = time.time()
+        with self.source:
+            blocks = [
+                self.resampler.process(b) for b in self.source.blocks(self.frame_size)
+            ]
+        read_time = time.time() - start
+        if not blocks or not sum(len(b) for b in blocks):
+            print(
+                f"{Fore.YELLOW}📂 离线转录: 输入为空（0.0s 音频），没有可转录的内容{Style.RESET_ALL}"
+            )
+            return []
+        pcm = np.concatenate(blocks)
+        audio_duration = len(pcm) / self.pipeline_rate
+
+        chunks = split_at_silence(
+            speech_flags(pcm, self.vad),
+            self.vad_frame_size,
+            int(chunk_seconds * 1000 / self.frame_duration),
+        )
+        print(
+            f"{Fore.CYAN}📂 离线转录: {audio_duration:.1f}s 音频，{len(chunks)} 块，"
+            f"{jobs} 个进程 x {threads} 线程{Style.RESET_ALL}"
+        )
+
+        results = run_offline(
+            pcm,
+            chunks,
+            self.whisper_cli_command("-", threads=threads),
+            self.pipeline_rate,
+            jobs=jobs,
+        )
+        for (chunk_start, _), text in zip(chunks, results):
+            if text:
+                offset = time.strftime(
+                    "%H:%M:%S", time.gmtime(chunk_start / self.pipeline_rate)
+                )
+                print(f"{Fore.GREEN}[{offset}]{Style.RESET_ALL} {text}")
+
+        elapsed = time.time() - start
+        rtf = elapsed / audio_duration if audio_duration else 0.0
+        print(
+            f"{Fore.YELLOW}📊 离线统计: 耗时 {elapsed:.1f}s（读取/重采样 {read_time:.1f}s），"
+            f"实时率 RTF {rtf:.3f}（{1 / rtf if rtf else 0:.1f}x 实时）{Style.RESET_ALL}"
+        )
+        return results
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="简化版实时转录系统")
+    parser.add_argument("--model", default="small", help="Whisper模型 (默认 small)")
+    parser.add_argument(
+        "--model-path", default=None, help="直接指定模型文件路径（跳过模型查找）"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="每次推理最多使用的线程数 (默认按CPU预算: 空闲时用满，积压时平分)",
+    )
+    parser.add_argument(
+        "--cpu-budget",
+        type=int,
+        default=None,
+        help="同时运行的推理共用的总线程数 (默认为可用核数，考虑CPU亲和性和cgroup配额)",
+    )
+    parser.add_argument(
+        "--pin-cpus",
+        action="store_true",
+        help="把每个whisper-cli进程绑定到分到的核上（仅Linux）",
+    )
+    parser.add_argument(
+        "--source", default="auto", help="源语言代码，auto为自动检测 (默认 auto)"
+    )
+    parser.add_argument("--target", default=None, help="目标语言（翻译功能开发中）")
+    parser.add_argument(
+        "--backend",
+        choices=["server", "cli", "transformers"],
+        default=None,
+        help="server: 常驻whisper-server（默认）; cli: 每个片段启动whisper-cli; "
+        "transformers: 进程内Whisper模型（int8量化，按批推理）；离线模式只支持cli",
+    )
+    parser.add_argument(
+        "--hf-model",
+        default=None,
+        help="transformers后端的模型名或本地目录 (默认 openai/whisper-<--model>)",
+    )
+    parser.add_argument(
+        "--no-quantize",
+        action="store_true",
+        help="transformers后端不做int8动态量化（float32推理）",
+    )
+    parser.add_argument(
+        "--whisper-cli", default="whisper-cli", help="whisper-cli命令（可带参数）"
+    )
+    parser.add_argument(
+        "--whisper-server",
+        default="whisper-server",
+        help="whisper-server命令（可带参数）",
+    )
+    parser.add_argument(
+        "--handoff",
+        choices=["memory", "file"],
+        default="memory",
+        help="memory: 内存中交接音频; file: 临时WAV文件（回退）",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=2, help="并发转录线程数 (默认 2)"
+    )
+    parser.add_argument(
+        "--max-queue", type=int, default=4, help="待转录片段队列上限 (默认 4)"
+    )
+    parser.add_argument(
+        "--overflow",
+        choices=OVERFLOW_POLICIES,
+        default="block",
+        help="队列满时的策略: block 阻塞, drop-oldest 丢弃最旧, merge 合并 (默认 block)",
+    )
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=None,
+        help="积压时同一路最多几个排队的片段合成一次识别调用（transformers后端按批推理，其他后端拼接后按时间戳分回）；"
+        "1 关闭 (默认 transformers后端 4，其他 1)",
+    )
+    parser.add_argument(
+        "--batch-wait",
+        type=float,
+        default=0.2,
+        help="所有转录线程都在忙时，凑批最多多等的时间（秒，默认 0.2）",
+    )
+    parser.add_argument(
+        "--vad-mode", type=int, choices=range(4), default=2, help="VAD敏感度 0-3"
+    )
+    parser.add_argument(
+        "--vad-votes", type=int, default=None, help="判为语音所需的10ms子帧票数"
+    )
+    parser.add_argument(
+        "--vad-hangover", type=int, default=0, help="语音结束后保持的帧数"
+    )
+    parser.add_argument(
+        "--preroll-frames",
+        type=int,
+        default=5,
+        help="片段开始前保留的帧数 (默认 5，即150ms)",
+    )
+    parser.add_argument(
+        "--tail-frames",
+        type=int,
+        default=5,
+        help="片段结束后保留的静音帧数 (默认 5，即150ms)",
+    )
+    parser.add_argument(
+        "--capture-buffer",
+        type=float,
+        default=10.0,
+        help="采集环形缓冲区长度（秒，默认 10）",
+    )
+    parser.add_argument(
+        "--input",
+        action="append",
+        default=None,
+        help="从音频文件读取（- 表示标准输入的s16le单声道PCM），不使用声卡；可重复指定，每个文件一路字幕",
+    )
+    parser.add_argument(
+        "--device",
+        action="append",
+        default=None,
+        help="输入设备号或名称的一部分（默认BlackHole）；可重复指定，同时采集多个设备",
+    )
+    parser.add_argument(
+        "--channels",
+        default=None,
+        help="按声道拆分采集，例如 1,2（从1开始）；每个声道一路字幕，适用于设备和WAV文件",
+    )
+    parser.add_argument(
+        "--input-rate",
+        type=int,
+        default=16000,
+        help="标准输入PCM的采样率 (默认 16000)",
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="使用指定时长的合成语音信号作为输入",
+    )
+    parser.add_argument(
+        "--synthetic-streams",
+        type=int,
+        default=1,
+        help="合成输入的路数（每路使用不同的随机种子，默认 1）",
+    )
+    parser.add_argument(
+        "--realtime", action="store_true", help="文件/合成/回放输入按实际时长节流"
+    )
+    parser.add_argument(
+        "--journal",
+        default=None,
+        metavar="PATH",
+        help="把采集的16kHz音频写入内存映射的环形日志（多路时每路一个文件），可用 --replay 重新识别",
+    )
+    parser.add_argument(
+        "--journal-minutes",
+        type=float,
+        default=60.0,
+        help="采集日志保留的分钟数，决定预分配的文件大小 (默认 60，约115MB)",
+    )
+    parser.add_argument(
+        "--replay",
+        default=None,
+        metavar="PATH",
+        help="回放采集日志作为输入（默认全速），例如换一个 --model 重新识别",
+    )
+    parser.add_argument(
+        "--replay-from",
+        default=None,
+        help="回放起点: 负数为相对日志末尾的秒数（如 -300），或日期时间/时分秒，或Unix时间戳",
+    )
+    parser.add_argument(
+        "--replay-to", default=None, help="回放终点，格式同 --replay-from"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="流式字幕: 说话过程中输出部分结果，逐步确认稳定的前缀",
+    )
+    parser.add_argument(
+        "--stream-step",
+        type=float,
+        default=0.5,
+        help="流式模式的部分结果间隔（秒，默认 0.5）",
+    )
+    parser.add_argument(
+        "--stream-window",
+        type=float,
+        default=10.0,
+        help="流式模式未确认窗口的最大长度（秒，默认 10）",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="根据识别耗时和积压自动调整片段长度和静音阈值",
+    )
+    parser.add_argument(
+        "--target-rtf",
+        type=float,
+        default=0.7,
+        help="自适应分段的目标负载（识别耗时/实时，默认 0.7）",
+    )
+    parser.add_argument(
+        "--latency-budget",
+        type=float,
+        default=5.0,
+        help="自适应分段的字幕延迟预算（秒，默认 5）",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="字幕延迟预算（秒）；超出时降级到更小的已下载模型并合并/跳过过期片段",
+    )
+    parser.add_argument(
+        "--stale-after",
+        type=float,
+        default=None,
+        help="片段等待超过该秒数即跳过（默认为延迟预算的2倍）",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="在本地端口导出指标（/metrics、/metrics.json、/profile?seconds=N、/stacks）",
+    )
+    parser.add_argument(
+        "--caption-log",
+        default=None,
+        help="把最终字幕追加写入JSONL文件（字幕事件也可通过指标端点的 /events 以SSE订阅）",
+    )
+    parser.add_argument(
+        "--speech-filter",
+        choices=("drop", "defer", "off"),
+        default="off",
+        help="识别前按语音评分预筛片段: drop 丢弃低分片段，defer 暂存并拼到同一路下一个通过的片段前，off 关闭 (默认 off；"
+        "很短的单词评分可能低于阈值)",
+    )
+    parser.add_argument(
+        "--speech-threshold",
+        type=float,
+        default=0.35,
+        help="预筛的语音评分阈值，0-1 (默认 0.35)",
+    )
+    parser.add_argument(
+        "--language-detect",
+        choices=("sticky", "segment"),
+        default="sticky",
+        help="--source auto 时的语种识别: sticky 每路只在开头几个片段识别，确定后固定语言并定期复查；"
+        "segment 每个片段都识别 (默认 sticky)",
+    )
+    parser.add_argument(
+        "--language-recheck",
+        type=int,
+        default=30,
+        help="固定语言后每隔多少个片段重新识别一次语种；0 只在连续空结果时复查 (默认 30)",
+    )
+    parser.add_argument(
+        "--result-cache",
+        type=int,
+        default=256,
+        help="按音频指纹缓存识别结果的条目数，重复的音频不再识别；0 关闭 (默认 256)",
+    )
+    parser.add_argument(
+        "--result-cache-ttl",
+        type=float,
+        default=3600.0,
+        help="缓存条目的存活时间（秒，默认 3600）",
+    )
+    parser.add_argument(
+        "--refresh-preflight",
+        action="store_true",
+        help="忽略缓存的预检结果，重新检查whisper-cli、模型文件并列出设备",
+    )
+    parser.add_argument(
+        "--history-size",
+        type=int,
+        default=10000,
+        help="内存中保留的最近字幕条数，统计仍覆盖全部字幕 (默认 10000)",
+    )
+    parser.add_argument(
+        "--history-log",
+        default=None,
+        help="完整转录历史的磁盘日志: .db/.sqlite 为带全文索引的SQLite，其他为按大小轮转的JSONL",
+    )
+    parser.add_argument(
+        "--history-rotate-mb",
+        type=float,
+        default=64,
+        help="JSONL历史日志的轮转大小（MB，默认 64，保留5个旧文件）",
+    )
+    parser.add_argument(
+        "--profile-dir", default=None, help="cProfile输出目录（默认系统临时目录）"
+    )
+    parser.add_argument(
+        "--serve",
+        type=int,
+        default=None,
+        metavar="PORT",
+        help="作为网络PCM接入服务运行（0为随机端口），每个连接一个会话，不使用本地声卡",
+    )
+    parser.add_argument(
+        "--serve-host", default="127.0.0.1", help="接入服务监听地址 (默认 127.0.0.1)"
+    )
+    parser.add_argument(
+        "--max-sessions", type=int, default=256, help="接入服务的最大会话数 (默认 256)"
+    )
+    parser.add_argument(
+        "--session-pending",
+        type=int,
+        default=2,
+        help="每个会话排队的片段上限，超出时暂停读取该连接 (默认 2)",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="离线模式: 在静音处切块，多进程并行转录（需配合 --input 或 --synthetic）",
+    )
+    parser.add_argument("--jobs", type=int, default=None, help="离线模式的并行进程数")
+    parser.add_argument(
+        "--chunk-seconds",
+        type=float,
+        default=30.0,
+        help="离线模式的目标块长（秒，默认 30）",
+    )
+    return parser.parse_args(argv)
+
+
+def parse_channels(text):
+    """解析 --channels，例如 "1,2" 或 "1-4"，返回声道号列表"""
+    if not text:
+        return None
+    channels = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        channels.extend(range(int(first), int(last or first) + 1))
+    if not channels or min(channels) < 1:
+        raise ValueError(f"无效的声道: {text}")
+    return channels
+
+
+def find_device(devices, spec):
+    """按设备号或名称（不区分大小写的子串）查找有输入声道的设备"""
+    if str(spec).isdigit():
+        index = int(spec)
+        return index if index < len(devices) else None
+    for i, device in enumerate(devices):
+        if device["max_input_channels"] > 0 and spec.lower() in device["name"].lower():
+            return i
+    return None
+
+
+def create_sources(args):
+    """根据命令行参数创建采集源列表；返回None表示使用声卡设备"""
+    channels = parse_channels(args.channels)
+    if args.replay:
+        if args.journal and os.path.abspath(args.journal) == os.path.abspath(
+            args.replay
+        ):
+            raise ValueError("回放的日志不能同时作为 --journal 写入")
+        source = JournalSource(
+            args.replay, args.replay_from, args.replay_to, realtime=args.realtime
+        )
+        print(
+            f"{Fore.GREEN}✓ 回放 {args.replay}: {source.duration:.1f}s{Style.RESET_ALL}"
+        )
+        return [source]
+    if args.synthetic is not None:
+        count = max(1, args.synthetic_streams)
+        return [
+            SyntheticSource(
+                args.synthetic,
+                seed=i,
+                realtime=args.realtime,
+                name=f"synthetic:{i}" if count > 1 else "synthetic",
+            )
+            for i in range(count)
+        ]
+    if args.input:
+        sources = []
+        for path in args.input:
+            if path == "-":
+                sources.append(StdinSource(args.input_rate))
+            elif channels:
+                sources.extend(
+                    FileSource(path, realtime=args.realtime, channel=channel)
+                    for channel in channels
+                )
+            else:
+                sources.append(FileSource(path, realtime=args.realtime))
+        return sources
+    return None
+
 
 def main():
     """主函数"""
+    args = parse_args()
+
     print("🚀 简化版实时转录系统")
     print("=" * 40)
 
+    try:
+        sources = create_sources(args)
+        device_channels = parse_channels(args.channels)
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"{Fore.RED}❌ {e}{Style.RESET_ALL}")
+        sys.exit(1)
+    if args.serve is not None:
+        # 音频来自网络会话，不打开本地设备
+        sources = []
+    if args.offline and (sources is None or len(sources) != 1):
+        print(
+            f"{Fore.RED}❌ 离线模式需要一路 --input 或 --synthetic 输入{Style.RESET_ALL}"
+        )
+        sys.exit(1)
+    if args.offline and args.backend not in (None, "cli"):
+        print(
+            f"{Fore.RED}❌ 离线模式每块启动一次whisper-cli，不支持 --backend {args.backend}{Style.RESET_ALL}"
+        )
+        sys.exit(1)
+    if args.serve is not None and args.journal:
+        print(
+            f"{Fore.RED}❌ --serve 模式的音频来自网络会话，不支持 --journal{Style.RESET_ALL}"
+        )
+        sys.exit(1)
+
     # 创建转录器
-    transcriber = SimpleTranscriber(whisper_model="small")
+    transcriber = SimpleTranscriber(
+        whisper_model=args.model,
+        # 离线模式每块启动一次whisper-cli，不需要常驻进程
+        backend="cli" if args.offline else args.backend or "server",
+        language=args.source,
+        whisper_cli=shlex.split(args.whisper_cli),
+        whisper_server=shlex.split(args.whisper_server),
+        handoff=args.handoff,
+        workers=args.workers,
+        max_queue=args.max_queue,
+        overflow=args.overflow,
+        max_batch=(
+            args.max_batch
+            if args.max_batch is not None
+            else 4 if args.backend == "transformers" else 1
+        ),
+        batch_wait=args.batch_wait,
+        vad_mode=args.vad_mode,
+        vad_votes=args.vad_votes,
+        vad_hangover=args.vad_hangover,
+        preroll_frames=args.preroll_frames,
+        tail_frames=args.tail_frames,
+        capture_buffer_seconds=args.capture_buffer,
+        sources=sources,
+        devices=args.device,
+        device_channels=device_channels,
+        threads=args.threads,
+        cpu_budget=args.cpu_budget,
+        pin_cpus=args.pin_cpus,
+        model_path=args.model_path,
+        metrics_port=args.metrics_port,
+        profile_dir=args.profile_dir,
+        stream=args.stream,
+        stream_step=args.stream_step,
+        stream_window=args.stream_window,
+        adaptive=args.adaptive,
+        target_rtf=args.target_rtf,
+        latency_budget=args.latency_budget,
+        deadline=args.deadline,
+        stale_after=args.stale_after,
+        caption_log=args.caption_log,
+        history_size=args.history_size,
+        history_log=args.history_log,
+        history_rotate_mb=args.history_rotate_mb,
+        refresh_preflight=args.refresh_preflight,
+        speech_filter=args.speech_filter,
+        speech_threshold=args.speech_threshold,
+        result_cache=args.result_cache,
+        result_cache_ttl=args.result_cache_ttl,
+        language_detect=args.language_detect,
+        language_recheck=args.language_recheck,
+        hf_model=args.hf_model,
+        quantize=not args.no_quantize,
+        journal=args.journal,
+        journal_minutes=args.journal_minutes,
+    )
+
+    if args.offline:
+        transcriber.transcribe_offline(jobs=args.jobs, chunk_seconds=args.chunk_seconds)
+        return
+
+    if args.serve is not None:
+        from pcm_server import run_server
+
+        run_server(
+            transcriber,
+            host=args.serve_host,
+            port=args.serve,
+            max_sessions=args.max_sessions,
+            max_pending=args.session_pending,
+        )
+        return
 
     # 开始转录
     transcriber.start_transcription()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+片段语音评分
+提交识别前对整个片段做一次向量化评分: VAD语音帧占比、频谱平坦度、能量包络的音节起伏。
+分数低的片段多半是噪声、持续的音乐、键盘声或系统提示音，送去识别只会得到幻觉文本
+"""
+
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+# score 在 0..1 之间；其余为各项特征，便于调整阈值
+SpeechScore = namedtuple("SpeechScore", "score speech_ratio flatness modulation level")
+
+SILENCE_DBFS = -55.0  # 整个片段最响的帧也低于这个电平时视为静音
+WHITE_NOISE_FLATNESS = 0.56  # 白噪声加汉宁窗周期图的平坦度期望值
+
+
+class SpeechScorer:
+    """无状态的片段评分器，可以被多路采集线程同时调用
+
+    score = 语音帧占比、频谱形状、音节起伏三项的加权和:
+    - 频谱形状: 平坦度除以白噪声的期望值（加窗周期图约0.56）归一化，
+      语音（浊音和辅音交替）在中间，纯音/持续和弦接近0，噪声和键盘声接近1，两端都扣分
+    - 音节起伏: 能量包络在2-8Hz的调制占比 × 起伏深度，持续的声音和单次提示音都很低
+    """
+
+    def __init__(
+        self,
+        sample_rate=16000,
+        frame_ms=30,
+        band=(200, 4000),
+        weights=(0.25, 0.25, 0.5),
+        depth_range=(2.0, 10.0),
+    ):
+        self.sample_rate = sample_rate
+        self.frame_size = sample_rate * frame_ms // 1000
+        self.frame_rate = 1000 / frame_ms
+        self.weights = weights
+        self.depth_range = depth_range
+        self._window = np.hanning(self.frame_size).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.frame_size, 1 / sample_rate)
+        self._band = (freqs >= band[0]) & (freqs <= band[1])
+
+    def score(self, audio, speech_frames=None):
+        """给int16片段打分；speech_frames 为分段器统计的VAD语音帧数（None时不计这一项）"""
+        count = len(audio) // self.frame_size
+        if count < 4:
+            return SpeechScore(0.0, 0.0, 1.0, 0.0, SILENCE_DBFS)
+        frames = audio[: count * self.frame_size].reshape(count, self.frame_size)
+        frames = frames.astype(np.float32) * (1 / 32768)
+
+        # 能量包络（dBFS）
+        power = np.einsum("ij,ij->i", frames, frames) / self.frame_size
+        energy = 10 * np.log10(power + 1e-10)
+        level = float(energy.max())
+        if level < SILENCE_DBFS:
+            return SpeechScore(0.0, 0.0, 1.0, 0.0, level)
+
+        # 频谱平坦度: 几何平均 / 算术平均，只看离峰值30dB以内的帧，取中位数
+        active = energy > level - 30
+        spectrum = np.abs(np.fft.rfft(frames[active] * self._window, axis=1))
+        spectrum = spectrum[:, self._band] ** 2 + 1e-12
+        flatness = np.exp(np.log(spectrum).mean(axis=1)) / spectrum.mean(axis=1)
+        flatness = float(min(1.0, np.median(flatness) / WHITE_NOISE_FLATNESS))
+        shape = max(0.0, 1.0 - abs(flatness - 0.5) * 2)
+
+        # 音节起伏: 包络调制谱中2-8Hz的能量占比 × 起伏深度
+        envelope = np.clip(energy, level - 40, None)
+        envelope -= envelope.mean()
+        modulation_spectrum = np.abs(np.fft.rfft(envelope))[1:] ** 2
+        rates = np.fft.rfftfreq(count, 1 / self.frame_rate)[1:]
+        syllabic = modulation_spectrum[(rates >= 2) & (rates <= 8)].sum() / (
+            modulation_spectrum.sum() + 1e-9
+        )
+        low, high = self.depth_range
+        depth = np.clip((envelope.std() - low) / (high - low), 0.0, 1.0)
+        modulation = float(syllabic * depth)
+
+        if speech_frames is None:
+            speech_ratio = 1.0
+        else:
+            speech_ratio = min(1.0, speech_frames / count)
+        w_ratio, w_shape, w_mod = self.weights
+        score = w_ratio * speech_ratio + w_shape * shape + w_mod * modulation
+        return SpeechScore(score, speech_ratio, flatness, modulation, level)
+
+
+class SpeechFilter:
+    """按分数丢弃或暂缓片段，并统计省下的识别量
+
+    policy="drop" 直接丢弃低分片段；policy="defer" 暂存低分片段，同一路的下一个片段通过时
+    拼在它前面一起识别（句首的弱音不会丢），下一个也是低分片段时丢弃暂存的那个
+    """
+
+    def __init__(self, threshold=0.35, policy="drop", scorer=None, max_defer=10.0):
+        if policy not in ("drop", "defer"):
+            raise ValueError(f"未知的预筛策略: {policy}")
+        self.threshold = threshold
+        self.policy = policy
+        self.scorer = scorer or SpeechScorer()
+        self.max_defer = max_defer  # 暂存片段的最长时长（秒）
+        self._deferred = {}  # 采集通道 -> 暂存的音频
+        self._lock = threading.Lock()  # 多路采集线程共用一个过滤器
+
+        # 统计
+        self.scored = 0
+        self.rejected = 0
+        self.rejected_seconds = 0.0
+        self.deferred = 0
+        self.recovered = 0  # 暂存后随下一个片段一起识别的片段数
+
+    def check(self, audio, speech_frames=None, key=None):
+        """返回 (要识别的音频, 评分)；不识别时音频为None，通过时可能拼上了暂存的片段
+
+        key 为采集通道，暂存的片段只和同一路的后续片段拼接
+        """
+        result = self.scorer.score(audio, speech_frames)
+        seconds = len(audio) / self.scorer.sample_rate
+        with self._lock:
+            self.scored += 1
+            if result.score >= self.threshold:
+                deferred = self._deferred.pop(key, None)
+                if deferred is None:
+                    return audio, result
+                self.recovered += 1
+                return np.concatenate((deferred, audio)), result
+
+            if self.policy == "defer" and seconds <= self.max_defer:
+                self._discard(key)
+                self._deferred[key] = audio
+                self.deferred += 1
+                return None, result
+            self.rejected += 1
+            self.rejected_seconds += seconds
+            return None, result
+
+    def _discard(self, key):
+        """丢弃一路暂存的片段（调用方持锁）"""
+        deferred = self._deferred.pop(key, None)
+        if deferred is not None:
+            self.rejected += 1
+            self.rejected_seconds += len(deferred) / self.scorer.sample_rate
+
+    def flush(self, key=None):
+        """一路输入结束: 暂存的片段不再有后续，按丢弃计"""
+        with self._lock:
+            self._discard(key)
+
+    def stats(self):
+        return {
+            "threshold": self.threshold,
+            "policy": self.policy,
+            "scored": self.scored,
+            "rejected": self.rejected,
+            "rejected_seconds": self.rejected_seconds,
+            "deferred": self.deferred,
+            "recovered": self.recovered,
+        }
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+流式字幕
+说话过程中每隔几百毫秒对滑动窗口（从上次确认点到当前）重新识别一次，
+连续两次识别结果一致且不在窗口末尾的分段被确认（LocalAgreement），
+窗口起点随之前移，只重新识别未确认的尾部；VAD切出片段时输出最终结果
+"""
+
+import threading
+import time
+from collections import deque, namedtuple
+
+# 识别任务: kind 为 "partial" 或 "final"，start 为音频在流中的绝对样本位置
+StreamTask = namedtuple("StreamTask", "kind utterance start audio requested")
+
+
+def strip_overlap(committed, words, max_words=8):
+    """去掉新窗口开头与已确认文本末尾重复的词（窗口重叠造成的重复）"""
+    for n in range(min(max_words, len(committed), len(words)), 0, -1):
+        if committed[-n:] == words[:n]:
+            return words[n:]
+    return words
+
+
+class LocalAgreement:
+    """一个语句内的确认状态
+
+    分段以 (起始样本, 结束样本, 文本) 表示，位置都是流中的绝对样本位置
+    """
+
+    def __init__(self, utterance, start):
+        self.utterance = utterance
+        self.committed = []  # 已确认的词
+        self.committed_end = start  # 已确认音频的结束位置 = 下一个窗口的起点
+        self.previous = []  # 上一次识别中未确认的分段
+        self.tentative = []  # 当前未确认的词
+
+    def update(self, segments, horizon):
+        """合并一次窗口识别结果；只确认结束位置早于 horizon 的分段
+
+        返回本次新确认的词
+        """
+        newly = []
+        remaining = list(segments)
+        while remaining and self.previous:
+            start, end, text = remaining[0]
+            if text != self.previous[0][2] or end > horizon:
+                break
+            newly.extend(strip_overlap(self.committed + newly, text.split()))
+            self.committed_end = max(self.committed_end, end)
+            remaining.pop(0)
+            self.previous.pop(0)
+        self.committed.extend(newly)
+        self.previous = remaining
+        self.tentative = strip_overlap(
+            self.committed, [w for _, _, text in remaining for w in text.split()]
+        )
+        return newly
+
+    def force_commit(self, keep_last=1):
+        """窗口过长时确认除最后几段以外的所有分段，避免窗口无限增长"""
+        if len(self.previous) <= keep_last:
+            return []
+        commit, self.previous = self.previous[:-keep_last], self.previous[-keep_last:]
+        newly = []
+        for _, end, text in commit:
+            newly.extend(strip_overlap(self.committed + newly, text.split()))
+            self.committed_end = max(self.committed_end, end)
+        self.committed.extend(newly)
+        self.tentative = strip_overlap(
+            self.committed, [w for _, _, text in self.previous for w in text.split()]
+        )
+        return newly
+
+
+class StreamingCaptioner:
+    """流式识别线程: 部分结果只保留最新的请求，最终结果按顺序全部处理
+
+    transcribe_fn(audio) 返回 [(起始秒, 结束秒, 文本)]，时间相对于传入的音频；
+    emit_fn(event) 接收 partial/final 事件
+    """
+
+    def __init__(
+        self,
+        transcribe_fn,
+        emit_fn,
+        sample_rate=16000,
+        step_seconds=0.5,
+        max_window_seconds=10.0,
+        margin_seconds=0.3,
+        min_final_seconds=0.3,
+    ):
+        self.transcribe_fn = transcribe_fn
+        self.emit_fn = emit_fn
+        self.sample_rate = sample_rate
+        self.step_seconds = step_seconds
+        self.max_window = int(max_window_seconds * sample_rate)
+        self.margin = int(margin_seconds * sample_rate)
+        self.min_final = int(min_final_seconds * sample_rate)
+
+        self.state = None  # 当前语句的 LocalAgreement
+        self._tasks = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        # 统计
+        self.partials = 0
+        self.finals = 0
+        self.coalesced = 0  # 被更新的请求替换掉的部分结果请求
+        self.committed_words = 0
+        self.forced_commits = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="streaming-captioner", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """处理完已提交的最终结果后停止"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def window_start(self, utterance):
+        """当前语句下一个窗口的起点（读取时可能略旧，只会让窗口稍长）"""
+        state = self.state
+        if state is not None and state.utterance == utterance:
+            return state.committed_end
+        return utterance
+
+    def request_partial(self, utterance, start, audio):
+        """提交一次部分结果识别；尚未开始的旧请求直接被替换"""
+        task = StreamTask("partial", utterance, start, audio, time.time())
+        with self._cond:
+            if self._tasks and self._tasks[-1].kind == "partial":
+                self._tasks.pop()
+                self.coalesced += 1
+            self._tasks.append(task)
+            self._cond.notify()
+
+    def finish(self, segment):
+        """语句结束（Segment，start/end 为绝对样本位置），识别剩余尾部并输出最终结果"""
+        task = StreamTask("final", segment.start, segment.start, segment, time.time())
+        with self._cond:
+            self._tasks.append(task)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._tasks and self._running:
+                    self._cond.wait()
+                if not self._tasks:
+                    return
+                task = self._tasks.popleft()
+            try:
+                if task.kind == "partial":
+                    self._partial(task)
+                else:
+                    self._final(task)
+            except Exception as e:
+                print(f"❌ 流式识别失败: {e}")
+
+    def _state_for(self, utterance):
+        if self.state is None or self.state.utterance != utterance:
+            self.state = LocalAgreement(utterance, utterance)
+        return self.state
+
+    def _partial(self, task):
+        state = self._state_for(task.utterance)
+        end = task.start + len(task.audio)
+        if end <= state.committed_end:
+            return
+        # 请求发出后窗口起点可能已经前移，跳过已确认的部分
+        offset = max(0, state.committed_end - task.start)
+        start = task.start + offset
+        segments = self._transcribe(task.audio[offset:], start)
+
+        newly = state.update(segments, horizon=end - self.margin)
+        if end - state.committed_end > self.max_window:
+            forced = state.force_commit()
+            if forced:
+                newly += forced
+                self.forced_commits += 1
+        self.committed_words += len(newly)
+        self.partials += 1
+        self.emit_fn(self._event("partial", state, start, end, task.requested))
+
+    def _final(self, task):
+        segment = task.audio
+        state = self._state_for(task.utterance)
+        start = max(segment.start, state.committed_end)
+        tail = segment.audio[start - segment.start :]
+        if len(tail) >= self.min_final:
+            state.previous = []
+            words = [
+                w for _, _, text in self._transcribe(tail, start) for w in text.split()
+            ]
+            state.committed.extend(strip_overlap(state.committed, words))
+        else:
+            # 尾部太短不值得再识别一次，直接确认上次的未确认部分
+            state.committed.extend(state.tentative)
+        state.tentative = []
+        self.finals += 1
+        self.emit_fn(
+            self._event("final", state, segment.start, segment.end, task.requested)
+        )
+        self.state = None
+
+    def _transcribe(self, audio, start):
+        """识别并把相对时间换算为绝对样本位置"""
+        return [
+            (
+                start + int(seg_start * self.sample_rate),
+                start + int(seg_end * self.sample_rate),
+                text,
+            )
+            for seg_start, seg_end, text in self.transcribe_fn(audio) or []
+        ]
+
+    def _event(self, kind, state, start, end, requested):
+        committed = " ".join(state.committed)
+        tentative = " ".join(state.tentative)
+        return {
+            "type": kind,
+            "utterance": state.utterance,
+            "text": " ".join(filter(None, (committed, tentative))),
+            "committed": committed,
+            "tentative": tentative,
+            "start": start / self.sample_rate,
+            "end": end / self.sample_rate,
+            "latency": time.time() - requested,
+        }
+
+    def stats(self):
+        return {
+            "partials": self.partials,
+            "finals": self.finals,
+            "coalesced": self.coalesced,
+            "committed_words": self.committed_words,
+            "forced_commits": self.forced_commits,
+            "pending": len(self._tasks),
+        }
@@ -0,0 +1,60 @@
+"""SQLite历史日志的全文查找: 中文子串、短查询和含符号的查询"""
+
+import sqlite3
+
+from history import CaptionRecord, SqliteLog
+
+TEXTS = [
+    "今天我们讨论项目进度",
+    "Learning C++ templates",
+    "100% done_ok",
+]
+
+
+def write_all(log):
+    for i, text in enumerate(TEXTS):
+        log.write(CaptionRecord(i, 1000.0 + i, "mic", text, 2.0, 0.1))
+
+
+def texts(records):
+    return [record.text for record in records]
+
+
+def test_search_substrings(tmp_path):
+    log = SqliteLog(str(tmp_path / "captions.db"))
+    write_all(log)
+    try:
+        assert texts(log.search("讨论项目")) == [TEXTS[0]]
+        assert texts(log.search("项目")) == [TEXTS[0]]
+        assert texts(log.search("C++")) == [TEXTS[1]]
+        assert texts(log.search("templ")) == [TEXTS[1]]
+        assert texts(log.search("100%")) == [TEXTS[2]]
+        assert texts(log.search("e_o")) == [TEXTS[2]]
+        assert log.search("e%o") == []
+    finally:
+        log.close()
+
+
+def test_old_index_is_rebuilt(tmp_path):
+    path = str(tmp_path / "captions.db")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE captions (id INTEGER PRIMARY KEY, segment_id INTEGER, time REAL, "
+        "source TEXT, text TEXT, duration REAL, processing_time REAL, model TEXT)"
+    )
+    db.execute(
+        "CREATE VIRTUAL TABLE captions_fts "
+        "USING fts5(text, content='captions', content_rowid='id')"
+    )
+    db.execute(
+        "INSERT INTO captions (segment_id, time, source, text) VALUES (1, 1.0, 'mic', ?)",
+        (TEXTS[0],),
+    )
+    db.commit()
+    db.close()
+
+    log = SqliteLog(path)
+    try:
+        assert texts(log.search("讨论项目")) == [TEXTS[0]]
+    finally:
+        log.close()
@@ -0,0 +1,41 @@
+"""指标端点的 /profile 参数检查"""
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from metrics import Metrics, MetricsServer, ProfileTrigger
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = MetricsServer(
+        Metrics(), port=0, profiler=ProfileTrigger(str(tmp_path))
+    ).start()
+    yield server
+    server.stop()
+
+
+def get(server, path):
+    url = f"http://127.0.0.1:{server.port}{path}"
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.mark.parametrize("seconds", ["abc", "0", "-1", "nan", "inf"])
+def test_profile_rejects_bad_seconds(server, seconds):
+    status, body = get(server, f"/profile?seconds={seconds}")
+    assert status == 400
+    assert "error" in body
+    assert server.profiler._pending is None
+
+
+def test_profile_request(server, tmp_path):
+    status, body = get(server, "/profile?seconds=0.5")
+    assert status == 202
+    assert body["path"].startswith(str(tmp_path))
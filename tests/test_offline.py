@@ -0,0 +1,39 @@
+"""离线转录: 输出解析和空输入"""
+
+import numpy as np
+
+from offline import split_at_silence
+from whisper_worker import parse_whisper_stdout
+
+
+def test_parse_joins_all_lines():
+    stdout = "\n".join(
+        [
+            " The first sentence of the chunk.",
+            " Then a second one, whispering quietly.",
+            "[BLANK_AUDIO]",
+            " And the last one.",
+            "",
+        ]
+    )
+    assert parse_whisper_stdout(stdout) == (
+        "The first sentence of the chunk. "
+        "Then a second one, whispering quietly. And the last one."
+    )
+
+
+def test_parse_timestamped_lines():
+    stdout = (
+        "[00:00:00.000 --> 00:00:04.000]   Hello there.\n"
+        "[00:00:04.000 --> 00:00:09.500]   General Kenobi.\n"
+    )
+    assert parse_whisper_stdout(stdout) == "Hello there. General Kenobi."
+
+
+def test_parse_empty_output():
+    assert parse_whisper_stdout("") is None
+    assert parse_whisper_stdout("[BLANK_AUDIO]\n") is None
+
+
+def test_split_empty_input():
+    assert split_at_silence(np.zeros(0, dtype=bool), 480, 1000) == []
@@ -0,0 +1,37 @@
+"""识别结果缓存按 (模型, 语言) 区分条目"""
+
+import numpy as np
+
+from result_cache import ResultCache
+
+
+def make_audio(seed=0, seconds=1.0, rate=16000):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(int(seconds * rate)) * 3000).astype(np.int16)
+
+
+def test_language_is_part_of_the_key():
+    cache = ResultCache()
+    fingerprint = cache.fingerprint(make_audio())
+    cache.put(fingerprint, "base", "hello", 0.5, "en")
+
+    assert cache.get(fingerprint, "base", "en").text == "hello"
+    assert cache.get(fingerprint, "base", "zh") is None
+    assert cache.get(fingerprint, "base") is None
+    assert cache.get(fingerprint, "small", "en") is None
+
+    cache.put(fingerprint, "base", "你好", 0.5, "zh")
+    assert cache.get(fingerprint, "base", "zh").text == "你好"
+    assert cache.get(fingerprint, "base", "en").text == "hello"
+
+
+def test_near_match_respects_language():
+    cache = ResultCache()
+    audio = make_audio()
+    cache.put(cache.fingerprint(audio), "base", "hello", 0.5, "en")
+    # 起点偏移5ms后指纹不完全相同，走近似匹配
+    shifted = cache.fingerprint(np.concatenate([np.zeros(80, np.int16), audio[:-80]]))
+
+    assert cache.get(shifted, "base", "zh") is None
+    assert cache.get(shifted, "base", "en").text == "hello"
+    assert cache.near_hits == 1
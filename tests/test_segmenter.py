@@ -0,0 +1,69 @@
+"""分段: 达到最大时长时的切分和丢弃"""
+
+import numpy as np
+
+from segmenter import Segmenter
+
+FRAME = 160
+
+
+def push_all(segmenter, pattern):
+    """pattern 中 1 为语音帧、0 为静音帧；返回切出的片段"""
+    segments = []
+    for is_speech in pattern:
+        segment = segmenter.push(np.full(FRAME, 100, dtype=np.int16), bool(is_speech))
+        if segment is not None:
+            segments.append(segment)
+    return segments
+
+
+def make_segmenter():
+    return Segmenter(
+        FRAME, min_segment_frames=5, max_segment_frames=20, silence_threshold=3
+    )
+
+
+def test_sparse_speech_is_discarded_at_max_duration():
+    segmenter = make_segmenter()
+    # 两个语音帧之后一直静音: 不足最小时长，到最大时长时丢弃
+    segments = push_all(segmenter, [1, 1] + [0] * 30)
+    assert segments == []
+    assert segmenter.discarded == 1
+    assert not segmenter.active
+
+    # 之后的话单独成段，不含前面零星的语音帧
+    segments = push_all(segmenter, [1] * 6 + [0] * 3)
+    assert len(segments) == 1
+    assert segments[0].speech_frames == 6
+    assert segmenter.discarded == 1
+
+
+def test_long_speech_is_cut_at_max_duration():
+    segmenter = make_segmenter()
+    segments = push_all(segmenter, [1] * 25)
+    assert len(segments) == 1
+    assert segments[0].end - segments[0].start == 20 * FRAME
+    assert segmenter.discarded == 0
+
+
+def test_preroll_does_not_overlap_previous_segment():
+    segmenter = Segmenter(
+        FRAME,
+        min_segment_frames=5,
+        max_segment_frames=20,
+        silence_threshold=3,
+        preroll_frames=5,
+        tail_frames=5,
+    )
+    # 连续说话: 每次都在最大时长处强制切分，片段首尾相接、不重叠
+    segments = push_all(segmenter, [1] * 60)
+    assert [(s.start, s.end) for s in segments] == [
+        (0, 3200),
+        (3200, 6400),
+        (6400, 9600),
+    ]
+
+    # 静音之后的新片段照常带预卷
+    segments = push_all(segmenter, [0] * 10 + [1] * 6 + [0] * 3)
+    assert len(segments) == 1
+    assert segments[0].start == (60 + 10 - 5) * FRAME
@@ -0,0 +1,79 @@
+"""没有结果的片段（被丢弃、过期跳过、处理出错）也要让网络会话收尾"""
+
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from pcm_server import Session
+from worker_pool import TranscriptionPool
+
+
+class FakeWriter:
+    def __init__(self):
+        self.lines = []
+        self.transport = SimpleNamespace(get_write_buffer_size=lambda: 0)
+
+    def is_closing(self):
+        return False
+
+    def write(self, data):
+        self.lines.append(json.loads(data))
+
+
+def test_pool_reports_dropped_stale_and_failed_segments():
+    release = threading.Event()
+    emitted, skipped = [], []
+
+    def process(segment_id, audio):
+        release.wait(5)
+        if segment_id == 3:
+            return None  # 过期跳过
+        if segment_id == 4:
+            raise RuntimeError("识别失败")
+        return segment_id
+
+    pool = TranscriptionPool(
+        process,
+        emitted.append,
+        workers=1,
+        max_queue=2,
+        overflow="drop-oldest",
+        skip_fn=lambda key, segment_id, reason: skipped.append((segment_id, reason)),
+    ).start()
+    pool.submit(1, [0], key=7)
+    while pool.queue_depth():
+        time.sleep(0.01)
+    # 片段1在处理中，2、3排队；提交4时丢弃2
+    for segment_id in (2, 3, 4):
+        pool.submit(segment_id, [0], key=7)
+    release.set()
+    pool.stop()
+
+    assert emitted == [1]
+    assert skipped == [(2, "dropped"), (3, "skipped"), (4, "failed")]
+
+
+def test_session_drains_after_skipped_segments():
+    async def run():
+        channel = SimpleNamespace(accepted=3, index=7)
+        writer = FakeWriter()
+        session = Session(None, channel, writer)
+        session.deliver(
+            {
+                "segment_id": 1,
+                "transcription": "hello",
+                "duration": 1.0,
+                "processing_time": 0.1,
+            }
+        )
+        session.deliver({"type": "skipped", "segment_id": 2, "reason": "dropped"})
+        assert session.outstanding == 1
+        session.deliver({"type": "skipped", "segment_id": 3, "reason": "skipped"})
+        return session, writer, await session.drain(1.0)
+
+    session, writer, drained = asyncio.run(run())
+    assert drained
+    assert session.skipped == 2
+    assert [line["type"] for line in writer.lines] == ["caption", "skipped", "skipped"]
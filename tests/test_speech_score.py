@@ -0,0 +1,63 @@
+"""片段语音评分: 类语音信号高于默认阈值，纯音、和弦和噪声低于阈值"""
+
+import numpy as np
+import pytest
+
+from audio_sources import synth_speech
+from speech_score import SpeechFilter, SpeechScorer
+
+SAMPLE_RATE = 16000
+THRESHOLD = SpeechFilter().threshold
+
+
+def to_int16(audio):
+    return (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+
+
+def score(audio):
+    # 最坏情况: VAD把每一帧都当作语音
+    scorer = SpeechScorer(SAMPLE_RATE)
+    return scorer.score(audio, speech_frames=len(audio) // scorer.frame_size)
+
+
+def test_default_threshold():
+    assert THRESHOLD == 0.35
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_speech_like_passes(seed):
+    result = score(to_int16(synth_speech(3.0, SAMPLE_RATE, seed=seed)))
+    assert result.score > THRESHOLD + 0.2
+    assert result.modulation > 0.5
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_short_word_in_silence_passes(seed):
+    audio = np.zeros(SAMPLE_RATE, dtype=np.int16)
+    word = to_int16(synth_speech(0.5, SAMPLE_RATE, seed=seed))
+    audio[4000 : 4000 + len(word)] = word
+    assert score(audio).score > THRESHOLD
+
+
+def test_tone_is_rejected():
+    t = np.arange(3 * SAMPLE_RATE) / SAMPLE_RATE
+    result = score(to_int16(0.3 * np.sin(2 * np.pi * 440 * t)))
+    assert result.score < THRESHOLD
+    assert result.flatness < 0.05
+
+
+def test_chord_is_rejected():
+    t = np.arange(3 * SAMPLE_RATE) / SAMPLE_RATE
+    chord = sum(0.1 * np.sin(2 * np.pi * f * t) for f in (261.6, 329.6, 392.0))
+    assert score(to_int16(chord)).score < THRESHOLD
+
+
+def test_noise_is_rejected():
+    noise = np.random.default_rng(0).normal(0, 0.1, 3 * SAMPLE_RATE)
+    result = score(to_int16(noise))
+    assert result.score < THRESHOLD
+    assert result.flatness > 0.9
+
+
+def test_silence_scores_zero():
+    assert score(np.zeros(SAMPLE_RATE, dtype=np.int16)).score == 0.0
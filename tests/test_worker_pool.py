@@ -0,0 +1,63 @@
+"""转录线程池: 停止后的提交和统计"""
+
+import threading
+import time
+
+from worker_pool import TranscriptionPool
+
+
+def make_pool(skipped, **kwargs):
+    return TranscriptionPool(
+        lambda segment_id, audio: segment_id,
+        lambda result: None,
+        skip_fn=lambda key, segment_id, reason: skipped.append((segment_id, reason)),
+        **kwargs,
+    )
+
+
+def test_submit_after_stop_is_dropped():
+    skipped = []
+    pool = make_pool(skipped, workers=1, max_queue=1).start()
+    pool.stop()
+    pool.submit(1, [0], key=0)
+    assert pool.queue_depth() == 0
+    assert pool.dropped == 1
+    assert skipped == [(1, "dropped")]
+
+
+def test_block_without_workers_does_not_exceed_max_queue():
+    skipped = []
+    pool = make_pool(skipped, workers=1, max_queue=2)  # 未启动
+    for segment_id in range(1, 5):
+        pool.submit(segment_id, [0], key=0)
+    assert pool.queue_depth() == 2
+    assert pool.dropped == 2
+    # 丢弃的片段按顺序排在已排队的片段之后通知
+    pool.start().stop()
+    assert skipped == [(3, "dropped"), (4, "dropped")]
+
+
+def test_blocked_submit_is_released_by_stop():
+    skipped = []
+    release = threading.Event()
+    pool = TranscriptionPool(
+        lambda segment_id, audio: release.wait(5) and segment_id,
+        lambda result: None,
+        workers=1,
+        max_queue=1,
+        skip_fn=lambda key, segment_id, reason: skipped.append((segment_id, reason)),
+    ).start()
+    pool.submit(1, [0])
+    while pool.queue_depth():
+        time.sleep(0.01)
+    pool.submit(2, [0])
+    blocked = threading.Thread(target=pool.submit, args=(3, [0]))
+    blocked.start()
+    stopper = threading.Thread(target=pool.stop)
+    stopper.start()
+    blocked.join(5)
+    assert not blocked.is_alive()
+    release.set()
+    stopper.join(5)
+    assert (3, "dropped") in skipped
+    assert pool.completed == 2
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+进程内Whisper识别后端
+用transformers在本进程中加载Whisper模型（只加载一次），不需要whisper.cpp和ggml模型文件。
+CPU上对线性层做int8动态量化（权重预先量化，激活值按批动态量化），
+积压的几个片段各自补齐到30秒窗口后放进同一个批次，编码器和解码器一次前向计算完成。
+torch和transformers只在启动这个后端时导入
+"""
+
+import re
+import threading
+import time
+
+import numpy as np
+
+from asr_backend import AsrBackend, wav_to_pcm
+from audio_utils import PIPELINE_SAMPLE_RATE
+
+# 解码结果中的语言标记，例如 <|en|>、<|haw|>（任务和时间戳标记不匹配）
+LANGUAGE_TOKEN = re.compile(r"<\|([a-z]{2,3})\|>")
+
+
+def default_model(whisper_model):
+    """whisper.cpp的模型名对应的Hugging Face模型，例如 small → openai/whisper-small"""
+    return f"openai/whisper-{whisper_model}"
+
+
+class TransformersWhisperBackend(AsrBackend):
+    """进程内的transformers Whisper模型
+
+    model 为Hugging Face模型名或本地目录；quantize 为True时在CPU上做int8动态量化；
+    threads 为PyTorch的计算线程数。同一时间只运行一个批次，其他调用等待
+    """
+
+    name = "transformers"
+    accepts_pcm = True
+    batched = True
+
+    def __init__(
+        self,
+        model="openai/whisper-small",
+        threads=None,
+        quantize=True,
+        max_new_tokens=224,
+    ):
+        self.model_name = model
+        self.threads = threads
+        self.quantize = quantize
+        self.max_new_tokens = max_new_tokens
+        self.model = None
+        self.processor = None
+        self.startup_time = None
+        self._torch = None
+        self._lock = threading.Lock()
+
+        # 统计
+        self.batches = 0
+        self.segments = 0
+        self.max_batch_seen = 0
+        self.inference_seconds = 0.0
+        self.audio_seconds = 0.0
+
+    def start(self):
+        """导入torch/transformers并加载模型；缺少依赖时抛出 ImportError"""
+        started = time.perf_counter()
+        import torch
+        from transformers import WhisperForConditionalGeneration, WhisperProcessor
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        processor = WhisperProcessor.from_pretrained(self.model_name)
+        model = WhisperForConditionalGeneration.from_pretrained(self.model_name)
+        model.eval()
+        if self.quantize:
+            model = torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        self._torch = torch
+        self.processor = processor
+        self.model = model
+        self.startup_time = time.perf_counter() - started
+        return self
+
+    def stop(self):
+        self.model = None
+        self.processor = None
+
+    def transcribe_wav(self, wav_bytes, language="auto", timestamps=False):
+        audio, sample_rate = wav_to_pcm(wav_bytes)
+        if sample_rate != PIPELINE_SAMPLE_RATE:
+            raise ValueError(f"只支持 {PIPELINE_SAMPLE_RATE} Hz 的WAV: {sample_rate}")
+        return self.transcribe_pcm(audio, language, timestamps)
+
+    def transcribe_pcm(self, audio, language="auto", timestamps=False):
+        return self.transcribe_batch([audio], language, timestamps)[0]
+
+    def transcribe_batch(self, audios, language="auto", timestamps=False):
+        """一次前向计算识别几段16kHz int16音频；language 为 auto 时每段各自做语种识别"""
+        if self.model is None:
+            raise RuntimeError("transformers后端未启动")
+        torch = self._torch
+        features = self.processor.feature_extractor(
+            [np.asarray(audio, dtype=np.float32) / 32768.0 for audio in audios],
+            sampling_rate=PIPELINE_SAMPLE_RATE,
+            return_tensors="pt",
+        ).input_features
+        options = {
+            "task": "transcribe",
+            "max_new_tokens": self.max_new_tokens,
+            "return_timestamps": timestamps,
+        }
+        if language and language != "auto":
+            options["language"] = language
+
+        with self._lock, torch.inference_mode():
+            started = time.perf_counter()
+            tokens = self.model.generate(features, **options)
+            elapsed = time.perf_counter() - started
+        self.batches += 1
+        self.segments += len(audios)
+        self.max_batch_seen = max(self.max_batch_seen, len(audios))
+        self.inference_seconds += elapsed
+        self.audio_seconds += sum(len(a) for a in audios) / PIPELINE_SAMPLE_RATE
+
+        tokenizer = self.processor.tokenizer
+        results = []
+        for sequence, audio in zip(tokens, audios):
+            raw = tokenizer.decode(sequence, skip_special_tokens=False)
+            match = LANGUAGE_TOKEN.search(raw)
+            result = {
+                "detected_language": match.group(1) if match else None,
+                "detected_language_probability": None,
+                "timings": {"total": elapsed},
+            }
+            if timestamps:
+                decoded = tokenizer.decode(
+                    sequence, skip_special_tokens=True, output_offsets=True
+                )
+                duration = len(audio) / PIPELINE_SAMPLE_RATE
+                result["segments"] = [
+                    {
+                        "start": offset["timestamp"][0],
+                        "end": (
+                            offset["timestamp"][1]
+                            if offset["timestamp"][1] is not None
+                            else duration
+                        ),
+                        "text": offset["text"].strip(),
+                    }
+                    for offset in decoded["offsets"]
+                    if offset["text"].strip()
+                ]
+                result["text"] = decoded["text"].strip()
+            else:
+                result["text"] = tokenizer.decode(
+                    sequence, skip_special_tokens=True
+                ).strip()
+            results.append(result)
+        return results
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "quantized": self.quantize,
+            "threads": self.threads,
+            "startup_time": self.startup_time,
+            "batches": self.batches,
+            "segments": self.segments,
+            "mean_batch": self.segments / self.batches if self.batches else 0.0,
+            "max_batch_seen": self.max_batch_seen,
+            "inference_seconds": self.inference_seconds,
+            "rtf": (
+                self.inference_seconds / self.audio_seconds
+                if self.audio_seconds
+                else None
+            ),
+        }
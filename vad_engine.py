@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+语音活动检测引擎
+帧几何只计算一次，检测时复用预分配的缓冲区；
+每个30ms帧拆成合法的WebRTC VAD子帧分别判断，再按多数投票和拖尾决定结果
+"""
+
+import numpy as np
+
+VALID_SAMPLE_RATES = (8000, 16000, 32000, 48000)
+VALID_SUBFRAME_MS = (10, 20, 30)
+
+
+class VadEngine:
+    """WebRTC VAD + 子帧投票 + 拖尾"""
+
+    def __init__(
+        self,
+        sample_rate=16000,
+        frame_ms=30,
+        subframe_ms=10,
+        aggressiveness=2,
+        min_votes=None,
+        hangover_frames=0,
+        energy_threshold=0.001,
+    ):
+        if sample_rate not in VALID_SAMPLE_RATES:
+            raise ValueError(f"WebRTC VAD不支持采样率 {sample_rate}")
+        if subframe_ms not in VALID_SUBFRAME_MS or frame_ms % subframe_ms:
+            raise ValueError(f"帧长 {frame_ms}ms 不能拆分为 {subframe_ms}ms 子帧")
+
+        # 帧几何
+        self.sample_rate = sample_rate
+        self.frame_size = sample_rate * frame_ms // 1000
+        self.subframe_size = sample_rate * subframe_ms // 1000
+        self.num_subframes = frame_ms // subframe_ms
+        # 默认多数投票: 3个子帧中至少2个为语音
+        self.min_votes = min_votes or self.num_subframes // 2 + 1
+        if not 1 <= self.min_votes <= self.num_subframes:
+            raise ValueError(f"min_votes 必须在 1..{self.num_subframes} 之间")
+        self.hangover_frames = hangover_frames
+        self.energy_threshold = energy_threshold
+
+        # webrtcvad 导入时会加载 pkg_resources（约0.1s），用到时才导入
+        import webrtcvad
+
+        self.vad = webrtcvad.Vad(aggressiveness)
+
+        # 预分配缓冲区: 输入帧复制到 _frame，子帧直接是其字节视图的切片
+        self._frame = np.zeros(self.frame_size, dtype=np.int16)
+        self._scaled = np.zeros(self.frame_size, dtype=np.float32)
+        frame_bytes = memoryview(self._frame).cast("B")
+        step = self.subframe_size * 2
+        self._subframes = [
+            frame_bytes[i * step : (i + 1) * step] for i in range(self.num_subframes)
+        ]
+
+        self._hangover_left = 0
+
+        # 统计
+        self.frames = 0
+        self.speech_frames = 0
+        self.fallbacks = 0
+        self.hangover_hits = 0
+        self.last_error = None
+
+    def reset(self):
+        self._hangover_left = 0
+
+    def is_speech(self, frame):
+        """判断一帧int16音频是否为语音；长度不足时补零，超出时截断"""
+        n = len(frame)
+        if n >= self.frame_size:
+            np.copyto(self._frame, frame[: self.frame_size])
+        else:
+            self._frame[:n] = frame
+            self._frame[n:] = 0
+
+        try:
+            votes = 0
+            for subframe in self._subframes:
+                if self.vad.is_speech(subframe, self.sample_rate):
+                    votes += 1
+            voiced = votes >= self.min_votes
+        except Exception as e:
+            # VAD失败时，回退到简单的能量检测
+            self.fallbacks += 1
+            self.last_error = e
+            voiced = self._energy_detect()
+
+        # 拖尾: 语音结束后再保持若干帧，避免在词间短暂停顿处切断
+        if voiced:
+            self._hangover_left = self.hangover_frames
+        elif self._hangover_left > 0:
+            self._hangover_left -= 1
+            self.hangover_hits += 1
+            voiced = True
+
+        self.frames += 1
+        if voiced:
+            self.speech_frames += 1
+        return voiced
+
+    def _energy_detect(self):
+        np.multiply(self._frame, 1.0 / 32768, out=self._scaled)
+        rms = np.sqrt(np.dot(self._scaled, self._scaled) / self.frame_size)
+        return rms > self.energy_threshold
+
+    def stats(self):
+        frames = max(1, self.frames)
+        return {
+            "frames": self.frames,
+            "speech_ratio": self.speech_frames / frames,
+            "fallbacks": self.fallbacks,
+            "fallback_rate": self.fallbacks / frames,
+            "hangover_hits": self.hangover_hits,
+        }
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Whisper工作进程
+启动一次whisper-server（模型只加载一次），通过本地HTTP套接字提交音频片段，
+带健康检查和崩溃自动重启；每个片段启动一次whisper-cli的后端；
+另有whisper-cli命令构建和输出解析的公共函数
+"""
+
+import http.client
+import json
+import re
+import socket
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+
+from asr_backend import AsrBackend
+from cpu_budget import Lease, run_pinned
+
+
+class WhisperWorkerError(Exception):
+    """常驻工作进程不可用或请求失败"""
+
+
+def whisper_cli_command(
+    cli,
+    model_path,
+    audio_input,
+    language="auto",
+    threads=4,
+    extra_args=(),
+    timestamps=False,
+):
+    """构建whisper-cli命令，audio_input为文件路径或 "-"（标准输入）"""
+    return list(cli) + [
+        "-m",
+        model_path,
+        "-f",
+        audio_input,
+        "--language",
+        language,
+        *(() if timestamps else ("--no-timestamps",)),
+        "--threads",
+        str(threads),
+        *extra_args,
+    ]
+
+
+def parse_whisper_stdout(stdout):
+    """从whisper-cli标准输出中提取转录文本（所有行合并）
+
+    带时间戳的行只取文本；跳过 [BLANK_AUDIO] 之类的标记和whisper的日志行
+    """
+    lines = []
+    for line in stdout.splitlines():
+        line = line.strip()
+        match = SEGMENT_PATTERN.match(line)
+        if match:
+            line = match.group(7).strip()
+        if not line or line.startswith(WHISPER_LOG_PREFIXES):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            continue
+        lines.append(line)
+    text = " ".join(lines)
+    return text if len(text) > 3 else None
+
+
+SEGMENT_PATTERN = re.compile(
+    r"^\[(\d+):(\d+):([\d.]+) --> (\d+):(\d+):([\d.]+)\]\s*(.*)$"
+)
+# whisper-cli写到标准输出的日志行（不是转录文本）
+WHISPER_LOG_PREFIXES = ("whisper_", "main:", "system_info:", "output_")
+
+
+def parse_timestamped_output(stdout):
+    """解析带时间戳的whisper-cli输出，返回 [(起始秒, 结束秒, 文本)]"""
+    segments = []
+    for line in stdout.splitlines():
+        match = SEGMENT_PATTERN.match(line.strip())
+        if not match:
+            continue
+        h1, m1, s1, h2, m2, s2, text = match.groups()
+        text = text.strip()
+        if text:
+            segments.append(
+                (
+                    int(h1) * 3600 + int(m1) * 60 + float(s1),
+                    int(h2) * 3600 + int(m2) * 60 + float(s2),
+                    text,
+                )
+            )
+    return segments
+
+
+TIMING_PATTERN = re.compile(r"whisper_print_timings:\s+(\w+) time =\s+([\d.]+) ms")
+
+
+def parse_whisper_timings(stderr):
+    """解析whisper-cli在标准错误输出的耗时统计，返回 {名称: 秒}，例如 load/total"""
+    return {name: float(ms) / 1000 for name, ms in TIMING_PATTERN.findall(stderr or "")}
+
+
+LANGUAGE_PATTERN = re.compile(r"auto-detected language: (\w+) \(p = ([\d.]+)\)")
+
+
+def parse_detected_language(stderr):
+    """解析whisper-cli语种识别的日志，返回 (语言, 置信度)；没有做语种识别时返回 (None, None)"""
+    match = LANGUAGE_PATTERN.search(stderr or "")
+    if not match:
+        return None, None
+    return match.group(1), float(match.group(2))
+
+
+def detected_language(result):
+    """whisper-server verbose_json 结果中的 (语言, 置信度)；语言为全称（例如 english）"""
+    language = result.get("detected_language") or result.get("language")
+    probability = result.get("detected_language_probability")
+    return (language or None), probability
+
+
+def find_free_port(host="127.0.0.1"):
+    """向系统申请一个空闲的本地端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+def encode_multipart(fields, files):
+    """编码multipart/form-data请求体
+
+    fields: {名称: 字符串值}
+    files: {名称: (文件名, 字节内容, content-type)}
+    """
+    boundary = uuid.uuid4().hex
+    chunks = []
+    for name, value in fields.items():
+        chunks.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n".encode()
+        )
+    for name, (filename, content, content_type) in files.items():
+        chunks.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+            f'filename="{filename}"\r\nContent-Type: {content_type}\r\n\r\n'.encode()
+        )
+        chunks.append(content)
+        chunks.append(b"\r\n")
+    chunks.append(f"--{boundary}--\r\n".encode())
+    return b"".join(chunks), f"multipart/form-data; boundary={boundary}"
+
+
+class WhisperServerWorker(AsrBackend):
+    """管理一个常驻的whisper-server进程"""
+
+    name = "whisper-server"
+
+    def __init__(
+        self,
+        model_path,
+        command="whisper-server",
+        host="127.0.0.1",
+        port=None,
+        threads=4,
+        startup_timeout=60.0,
+        request_timeout=15.0,
+        health_interval=5.0,
+        max_restarts=5,
+    ):
+        # command 可以是字符串或参数列表（例如 [python, fake_whisper.py, --server]）
+        self.command = [command] if isinstance(command, str) else list(command)
+        self.model_path = model_path
+        self.host = host
+        self.fixed_port = port
+        self.port = None
+        self.threads = threads
+        self.startup_timeout = startup_timeout
+        self.request_timeout = request_timeout
+        self.health_interval = health_interval
+        self.max_restarts = max_restarts
+
+        self.process = None
+        self.restarts = 0
+        self.requests = 0
+        self.failures = 0
+        self.startup_time = None
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._monitor_thread = None
+
+    # ---- 生命周期 ----
+
+    def start(self):
+        """启动工作进程并等待模型加载完成"""
+        with self._lock:
+            self._spawn()
+        self._stop_event.clear()
+        if self.health_interval and self._monitor_thread is None:
+            self._monitor_thread = threading.Thread(
+                target=self._monitor, name="whisper-worker-monitor", daemon=True
+            )
+            self._monitor_thread.start()
+        return self
+
+    def stop(self):
+        """停止监控线程和工作进程"""
+        self._stop_event.set()
+        if self._monitor_thread is not None:
+            self._monitor_thread.join(timeout=1.0)
+            self._monitor_thread = None
+        with self._lock:
+            self._terminate()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _spawn(self):
+        """启动进程（调用方需持有锁）"""
+        self._terminate()
+        self.port = self.fixed_port or find_free_port(self.host)
+        cmd = self.command + [
+            "-m",
+            self.model_path,
+            "-t",
+            str(self.threads),
+            "--host",
+            self.host,
+            "--port",
+            str(self.port),
+        ]
+        start = time.time()
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self._wait_ready()
+        self.startup_time = time.time() - start
+
+    def _terminate(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+    def _wait_ready(self):
+        deadline = time.time() + self.startup_timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise WhisperWorkerError(
+                    f"whisper-server 启动失败，退出码 {self.process.returncode}"
+                )
+            if self._probe():
+                return
+            time.sleep(0.05)
+        raise WhisperWorkerError(f"whisper-server 在 {self.startup_timeout}s 内未就绪")
+
+    # ---- 健康检查 ----
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _probe(self):
+        """探测HTTP端点；旧版本没有/health时，能连接即视为就绪"""
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=1.0)
+        try:
+            conn.request("GET", "/health")
+            response = conn.getresponse()
+            response.read()
+            return response.status in (200, 404)
+        except (OSError, http.client.HTTPException):
+            return False
+        finally:
+            conn.close()
+
+    def is_healthy(self):
+        return self.is_alive() and self._probe()
+
+    def ensure_running(self):
+        """进程退出时自动重启"""
+        with self._lock:
+            if self.is_alive():
+                return
+            if self.restarts >= self.max_restarts:
+                raise WhisperWorkerError(
+                    f"whisper-server 已重启 {self.restarts} 次，放弃重启"
+                )
+            self.restarts += 1
+            self._spawn()
+
+    def _monitor(self):
+        while not self._stop_event.wait(self.health_interval):
+            if self.is_alive():
+                continue
+            try:
+                self.ensure_running()
+            except WhisperWorkerError:
+                # 下次提交请求时再报告错误
+                pass
+
+    # ---- 推理 ----
+
+    def transcribe_wav(self, wav_bytes, language="auto", timestamps=False):
+        """提交一段WAV数据，返回whisper-server的JSON结果
+
+        timestamps=True 时请求verbose_json，结果中的 segments 带起止时间；
+        language="auto" 时也请求verbose_json，结果中带语种识别的语言和置信度
+        """
+        self.ensure_running()
+        try:
+            return self._request(wav_bytes, language, timestamps)
+        except (OSError, http.client.HTTPException):
+            # 进程可能在请求过程中崩溃，重启后重试一次
+            self.failures += 1
+            self.ensure_running()
+            return self._request(wav_bytes, language, timestamps)
+
+    def _request(self, wav_bytes, language, timestamps=False):
+        body, content_type = encode_multipart(
+            {
+                "response_format": (
+                    "verbose_json" if timestamps or language == "auto" else "json"
+                ),
+                "language": language,
+                "temperature": "0.0",
+                "no_timestamps": "false" if timestamps else "true",
+            },
+            {"file": ("segment.wav", wav_bytes, "audio/wav")},
+        )
+        conn = http.client.HTTPConnection(
+            self.host, self.port, timeout=self.request_timeout
+        )
+        try:
+            conn.request(
+                "POST", "/inference", body=body, headers={"Content-Type": content_type}
+            )
+            response = conn.getresponse()
+            payload = response.read()
+        finally:
+            conn.close()
+
+        self.requests += 1
+        if response.status != 200:
+            raise WhisperWorkerError(
+                f"whisper-server 返回 {response.status}: {payload[:200]!r}"
+            )
+        return json.loads(payload)
+
+    def stats(self):
+        return {
+            "alive": self.is_alive(),
+            "port": self.port,
+            "requests": self.requests,
+            "failures": self.failures,
+            "restarts": self.restarts,
+            "startup_time": self.startup_time,
+        }
+
+
+class WhisperCliBackend(AsrBackend):
+    """每个片段启动一次whisper-cli，WAV从标准输入传入
+
+    给定CPU预算时线程数从预算中领取（可能等待其他任务结束），否则固定使用 threads 个线程
+    """
+
+    name = "whisper-cli"
+
+    def __init__(self, cli, model_path, budget=None, threads=4, timeout=15.0):
+        self.cli = [cli] if isinstance(cli, str) else list(cli)
+        self.model_path = model_path
+        self.budget = budget
+        self.threads = threads
+        self.timeout = timeout
+        self.requests = 0
+        self.failures = 0
+
+    def transcribe_wav(self, wav_bytes, language="auto", timestamps=False):
+        """运行一次whisper-cli；退出码不为0时抛出 WhisperWorkerError，超时抛出 TimeoutExpired
+
+        timings 中的 wait 为等待CPU预算的时间，load/total 为whisper-cli报告的耗时
+        """
+        started = time.perf_counter()
+        with (
+            self.budget.lease()
+            if self.budget is not None
+            else nullcontext(Lease(self.threads))
+        ) as lease:
+            waited = time.perf_counter() - started
+            result = run_pinned(
+                whisper_cli_command(
+                    self.cli,
+                    self.model_path,
+                    "-",
+                    language=language,
+                    threads=lease.threads,
+                    timestamps=timestamps,
+                ),
+                lease.cpus,
+                input=wav_bytes,
+                capture_output=True,
+                timeout=self.timeout,
+            )
+        self.requests += 1
+        stdout = result.stdout.decode(errors="replace")
+        stderr = result.stderr.decode(errors="replace")
+        if result.returncode != 0:
+            self.failures += 1
+            raise WhisperWorkerError(f"whisper-cli 退出码 {result.returncode}")
+
+        detected, probability = parse_detected_language(stderr)
+        response = {
+            "detected_language": detected,
+            "detected_language_probability": probability,
+            "timings": {**parse_whisper_timings(stderr), "wait": waited},
+        }
+        if timestamps:
+            segments = parse_timestamped_output(stdout)
+            response["segments"] = [
+                {"start": start, "end": end, "text": text}
+                for start, end, text in segments
+            ]
+            response["text"] = " ".join(text for _, _, text in segments)
+        else:
+            response["text"] = parse_whisper_stdout(stdout) or ""
+        return response
+
+    def stats(self):
+        return {"requests": self.requests, "failures": self.failures}
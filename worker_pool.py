@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+转录线程池
+固定数量的工作线程 + 有界队列，队列满时按溢出策略处理，
+结果经过重排序缓冲区按segment_id顺序输出。
+多路采集时每个来源（key）有自己的队列和输出顺序，工作线程轮流从各队列取片段；
+设置 batch_fn 后，同一来源排队的多个片段一次交给 batch_fn 处理；
+没有结果的片段（被丢弃、过期跳过或处理失败）按顺序交给 skip_fn
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+OVERFLOW_POLICIES = ("block", "drop-oldest", "merge")
+
+
+class _Skipped:
+    """重排序缓冲区中没有结果的片段；reason 为 dropped / merged / skipped / failed"""
+
+    __slots__ = ("segment_id", "reason")
+
+    def __init__(self, segment_id, reason):
+        self.segment_id = segment_id
+        self.reason = reason
+
+
+class TranscriptionPool:
+    """固定大小的转录线程池"""
+
+    def __init__(
+        self,
+        process_fn,
+        emit_fn,
+        workers=2,
+        max_queue=4,
+        overflow="block",
+        merge_fn=None,
+        batch_fn=None,
+        max_batch=1,
+        max_wait=0.0,
+        skip_fn=None,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {overflow}")
+        if workers < 1 or max_queue < 1:
+            raise ValueError("workers 和 max_queue 必须大于0")
+
+        # process_fn(segment_id, audio) -> 结果；emit_fn(结果) 按顺序调用
+        self.process_fn = process_fn
+        self.emit_fn = emit_fn
+        self.num_workers = workers
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.merge_fn = merge_fn or (lambda a, b: np.concatenate((a, b)))
+        # batch_fn([(segment_id, audio), ...]) -> [结果, ...]；max_wait 为凑批最多多等的时间
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch if batch_fn is not None else 1
+        self.max_wait = max_wait
+        # skip_fn(key, segment_id, reason): 片段没有结果时按顺序调用，调用方据此清理该片段的状态
+        self.skip_fn = skip_fn
+
+        # 每个来源一个队列: key -> deque[(segment_id, audio, 来源内序号)]
+        self._queues = {}
+        self._turn = deque()  # 轮询顺序: 有待处理片段的key
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+        self._stopped = False  # stop() 之后不再接收新片段
+        self._active = 0
+
+        # 重排序缓冲区（按来源）: key -> {来源内序号: 结果}；没有结果的片段记为 _Skipped
+        self._reorder_lock = threading.Lock()
+        self._results = {}
+        self._next_seq = {}
+        self._seq = {}  # key -> 下一个来源内序号
+
+        # 统计
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.merged = 0
+        self.failed = 0
+        self.max_depth_seen = 0
+        self.batches = 0  # 多于一个片段的批次数
+        self.batched = 0  # 这些批次中的片段数
+        self.max_batch_seen = 1
+
+    # ---- 生命周期 ----
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+            self._stopped = False
+        for i in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._worker, name=f"transcribe-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=5.0):
+        """停止接收新片段，在超时时间内处理完队列中的片段（timeout=None 一直等待）"""
+        deadline = None if timeout is None else time.time() + timeout
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - time.time())
+
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            while (self._turn or self._active) and remaining() != 0.0:
+                self._cond.wait(timeout=remaining())
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=remaining())
+        self._threads = []
+
+    # ---- 提交 ----
+
+    def submit(self, segment_id, audio, merge=False, key=None):
+        """提交片段；返回False表示片段被合并到已排队的片段中
+
+        merge=True 时只要有片段在排队就合并（过载降级时减少识别调用次数）；
+        key 为来源标识，队列上限和输出顺序都按来源分别计算；
+        线程池已停止（或 block 策略下未启动、队列已满）时丢弃新片段，交给 skip_fn
+        """
+        skipped = None
+        with self._cond:
+            self.submitted += 1
+            queue = self._queues.setdefault(key, deque())
+            seq = self._seq.get(key, 0)
+            self._seq[key] = seq + 1
+
+            if self._stopped:
+                policy = "reject"
+            elif merge and queue:
+                policy = "merge"
+            elif len(queue) >= self.max_queue:
+                policy = self.overflow
+            else:
+                policy = None
+
+            if policy is not None:
+                if policy == "block":
+                    while (
+                        len(queue) >= self.max_queue
+                        and self._running
+                        and not self._stopped
+                    ):
+                        self._cond.wait()
+                    if len(queue) >= self.max_queue or self._stopped:
+                        policy = "reject"
+                if policy == "reject":
+                    skipped = (seq, _Skipped(segment_id, "dropped"))
+                    self.dropped += 1
+                elif policy == "drop-oldest":
+                    dropped_id, _, dropped_seq = queue.popleft()
+                    skipped = (dropped_seq, _Skipped(dropped_id, "dropped"))
+                    self.dropped += 1
+                elif policy == "merge":  # 追加到最新排队的片段，保留其segment_id
+                    queued_id, queued_audio, queued_seq = queue[-1]
+                    queue[-1] = (
+                        queued_id,
+                        self.merge_fn(queued_audio, audio),
+                        queued_seq,
+                    )
+                    self.merged += 1
+                    # 合并的片段由调用方在 submit 返回False时处理
+                    skipped = (seq, _Skipped(None, "merged"))
+                    segment_id = None
+
+            if segment_id is not None and policy != "reject":
+                queue.append((segment_id, audio, seq))
+                if key not in self._turn:
+                    self._turn.append(key)
+                self.max_depth_seen = max(self.max_depth_seen, self._depth())
+                self._cond.notify_all()
+
+        if skipped is not None:
+            self._deliver(key, *skipped)
+        return segment_id is not None
+
+    def _depth(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _pop_next(self):
+        """轮询各来源的队列（调用方需持有锁），保证每个来源都能轮到"""
+        key = self._turn.popleft()
+        queue = self._queues[key]
+        item = queue.popleft()
+        if queue:
+            self._turn.append(key)
+        return key, item
+
+    def _take_batch(self, key, batch):
+        """从同一来源的队列中继续取片段凑成一批（调用方需持有锁）
+
+        其他工作线程都在忙时最多再等 max_wait 秒；有空闲线程时不等，新片段由它们并行处理
+        """
+        queue = self._queues[key]
+        deadline = None
+        if self.max_wait and self._active >= self.num_workers:
+            deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            if queue:
+                batch.append(queue.popleft())
+                continue
+            remaining = deadline - time.monotonic() if deadline is not None else 0
+            if remaining <= 0 or not self._running:
+                break
+            self._cond.wait(timeout=remaining)
+        if not queue and key in self._turn:
+            self._turn.remove(key)
+        self._cond.notify_all()
+        return batch
+
+    # ---- 工作线程 ----
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._turn and self._running:
+                    self._cond.wait()
+                if not self._turn:
+                    return
+                key, item = self._pop_next()
+                self._active += 1
+                batch = [item]
+                if self.max_batch > 1:
+                    batch = self._take_batch(key, batch)
+                self._cond.notify_all()
+
+            if len(batch) > 1:
+                results = self._process_batch(batch)
+            else:
+                segment_id, audio, _ = item
+                try:
+                    results = [self.process_fn(segment_id, audio)]
+                except Exception as e:
+                    print(f"❌ 处理音频片段失败: {e}")
+                    results = [_Skipped(segment_id, "failed")]
+                    with self._cond:
+                        self.failed += 1
+
+            for (segment_id, _, seq), result in zip(batch, results):
+                if result is None:
+                    result = _Skipped(segment_id, "skipped")
+                self._deliver(key, seq, result)
+
+            with self._cond:
+                self._active -= 1
+                self.completed += len(batch)
+                self._cond.notify_all()
+
+    def _process_batch(self, batch):
+        with self._cond:
+            self.batches += 1
+            self.batched += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        try:
+            return self.batch_fn(
+                [(segment_id, audio) for segment_id, audio, _ in batch]
+            )
+        except Exception as e:
+            print(f"❌ 批量处理音频片段失败: {e}")
+            with self._cond:
+                self.failed += len(batch)
+            return [_Skipped(segment_id, "failed") for segment_id, _, _ in batch]
+
+    def _deliver(self, key, seq, result):
+        """放入该来源的重排序缓冲区，并按顺序输出所有已就绪的结果"""
+        with self._reorder_lock:
+            results = self._results.setdefault(key, {})
+            results[seq] = result
+            while self._next_seq.get(key, 0) in results:
+                ready = results.pop(self._next_seq.get(key, 0))
+                self._next_seq[key] = self._next_seq.get(key, 0) + 1
+                try:
+                    if not isinstance(ready, _Skipped):
+                        self.emit_fn(ready)
+                    elif ready.segment_id is not None and self.skip_fn is not None:
+                        self.skip_fn(key, ready.segment_id, ready.reason)
+                except Exception as e:
+                    print(f"❌ 输出转录结果失败: {e}")
+
+    # ---- 统计 ----
+
+    def queue_depth(self, key=None):
+        """排队的片段数；指定key时只统计该来源"""
+        if key is not None:
+            return len(self._queues.get(key, ()))
+        return self._depth()
+
+    def stats(self):
+        with self._cond:
+            depth = self._depth()
+            active = self._active
+        return {
+            "workers": self.num_workers,
+            "active": active,
+            "queue_depth": depth,
+            "max_queue": self.max_queue,
+            "max_depth_seen": self.max_depth_seen,
+            "pending_reorder": sum(len(r) for r in self._results.values()),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "merged": self.merged,
+            "failed": self.failed,
+            "overflow": self.overflow,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "batched": self.batched,
+            "max_batch_seen": self.max_batch_seen,
+        }